@@ -1,10 +1,14 @@
 from app.models.schemas import (
     ClusterRequest, ClusterResponse, MetricAnalysisRequest, MetricAnalysisResponse,
-    ClusterNode, MetricNode, ClusteringMethod, MetricType, ClusterStatistics
+    ClusterNode, MetricNode, ClusteringMethod, MetricType, ClusterStatistics,
+    CombinedAnalysisRequest, CombinedAnalysisResponse, CombinedNode, MetricAccuracy
 )
 from app.core.context.analysis_context import AnalysisContext
 from app.core.context.metric_calculation_context import MetricCalculationContext
+from app.core.services.analysis_executor import AnalysisQueueFull, analysis_executor
 from app.core.services.analysis_manager import AnalysisManager
+from app.core.services.coordination import analysis_flights
+from app.core.services.result_cache import result_cache
 from app.core.storage import active_datasets
 
 from fastapi import APIRouter, HTTPException
@@ -13,7 +17,49 @@ import copy
 
 router = APIRouter()
 
-@router.post("/cluster", response_model=ClusterResponse)
+# Ответ при переполненной очереди анализов (см. _run_analysis)
+QUEUE_FULL_RESPONSES = {
+    503: {
+        "description": "Очередь анализов переполнена, запрос стоит повторить позже",
+        "headers": {
+            "Retry-After": {
+                "description": "Через сколько секунд повторить запрос",
+                "schema": {"type": "integer"},
+            }
+        },
+    }
+}
+
+
+async def _run_analysis(analysis_context: AnalysisContext) -> dict:
+    """Запускает анализ через очередь; одинаковые одновременные запросы
+    разделяют одно выполнение и не занимают лишних мест в очереди.
+    Готовый результат из result_cache отдаётся сразу, без места в очереди."""
+    cache_key = result_cache.key_for(analysis_context)
+    if not analysis_context.need_create_graph:
+        result = result_cache.get(cache_key)
+        if result is not None:
+            return result
+
+    manager = AnalysisManager()
+    try:
+        return await analysis_flights.run(
+            cache_key, analysis_executor.run, manager.process_async, analysis_context
+        )
+    except AnalysisQueueFull as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Analysis queue is full",
+            headers={"Retry-After": str(e.retry_after)}
+        ) from e
+    except Exception as e:
+        raise HTTPException(
+            status_code=502,
+            detail="External service error"
+        ) from e
+
+
+@router.post("/cluster", response_model=ClusterResponse, responses=QUEUE_FULL_RESPONSES)
 async def cluster_analysis(req: ClusterRequest):
     """Выполняет кластеризацию графа для датасета.
 
@@ -28,19 +74,13 @@ async def cluster_analysis(req: ClusterRequest):
     analysis_context = copy.deepcopy(dataset["analysis_context"])
     analysis_context.metric_calculation_context = MetricCalculationContext(
         need_leiden_clusterization=(req.method == ClusteringMethod.LEIDEN),
-        need_louvain_clusterization=(req.method == ClusteringMethod.LOUVAIN)
+        need_louvain_clusterization=(req.method == ClusteringMethod.LOUVAIN),
+        weight_transform=req.weight_transform.value
     )
     analysis_context.need_prepare_data = True
     analysis_context.need_create_graph = False
 
-    manager = AnalysisManager()
-    try:
-        result = manager.process(analysis_context)
-    except Exception as e:
-        raise HTTPException(
-            status_code=502,
-            detail="External service error"
-        ) from e
+    result = await _run_analysis(analysis_context)
 
     try:
         cluster_nodes = [ClusterNode(**n) for n in result["nodes"]]
@@ -56,12 +96,14 @@ async def cluster_analysis(req: ClusterRequest):
     )
 
 
-@router.post("/metric", response_model=MetricAnalysisResponse)
+@router.post("/metric", response_model=MetricAnalysisResponse, responses=QUEUE_FULL_RESPONSES)
 async def metric_analysis(req: MetricAnalysisRequest):
     """Рассчитывает выбранную метрику графа для датасета.
 
     Поддерживает метрики PageRank и Betweenness, возвращает список
-    узлов с значениями метрик.
+    узлов с значениями метрик. Betweenness можно считать по выборке
+    исходных узлов (sampling_size или target_latency_ms); режим расчёта
+    возвращается в поле accuracy.
     """
     if req.dataset_id not in active_datasets:
         raise HTTPException(status_code=404, detail="Dataset not found")
@@ -71,22 +113,69 @@ async def metric_analysis(req: MetricAnalysisRequest):
     analysis_context = copy.deepcopy(dataset["analysis_context"])
     analysis_context.metric_calculation_context = MetricCalculationContext(
         need_pagerank=(req.metric_type == MetricType.PAGERANK),
-        need_betweenness=(req.metric_type == MetricType.BETWEENNESS_CENTRALITY)
+        need_betweenness=(req.metric_type == MetricType.BETWEENNESS_CENTRALITY),
+        weight_transform=req.weight_transform.value,
+        betweenness_sampling_size=req.sampling_size,
+        betweenness_sampling_seed=req.sampling_seed,
+        betweenness_target_ms=req.target_latency_ms,
     )
     analysis_context.need_prepare_data = True
     analysis_context.need_create_graph = False
 
-    manager = AnalysisManager()
-    try:
-        result = manager.process(analysis_context)
-    except Exception as e:
-        raise HTTPException(
-            status_code=502,
-            detail="External service error"
-        ) from e
+    result = await _run_analysis(analysis_context)
 
     try:
         metric_nodes = [MetricNode(**n) for n in result["nodes"]]
     except KeyError as e:
         raise HTTPException(status_code=500, detail=f"Invalid response structure") from e
-    return MetricAnalysisResponse(dataset_id=req.dataset_id, metric_type=req.metric_type, nodes=metric_nodes)
+    response = MetricAnalysisResponse(dataset_id=req.dataset_id, metric_type=req.metric_type, nodes=metric_nodes)
+    if result.get("accuracy"):
+        response.accuracy = MetricAccuracy(**result["accuracy"])
+    return response
+
+
+
+@router.post("/combined", response_model=CombinedAnalysisResponse, responses=QUEUE_FULL_RESPONSES)
+async def combined_analysis(req: CombinedAnalysisRequest):
+    """Рассчитывает несколько метрик и кластеризаций за один запрос.
+
+    Все алгоритмы работают с одной проекцией, узлы читаются один раз;
+    каждый узел содержит значения всех запрошенных метрик и сообществ.
+    """
+    if req.dataset_id not in active_datasets:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+    if not req.metrics and not req.clusterings:
+        raise HTTPException(status_code=422, detail="No metrics or clusterings requested")
+
+    dataset = active_datasets[req.dataset_id]
+
+    analysis_context = copy.deepcopy(dataset["analysis_context"])
+    analysis_context.metric_calculation_context = MetricCalculationContext(
+        need_leiden_clusterization=(ClusteringMethod.LEIDEN in req.clusterings),
+        need_louvain_clusterization=(ClusteringMethod.LOUVAIN in req.clusterings),
+        need_betweenness=(MetricType.BETWEENNESS_CENTRALITY in req.metrics),
+        need_pagerank=(MetricType.PAGERANK in req.metrics),
+        combined=True,
+        weight_transform=req.weight_transform.value
+    )
+    analysis_context.need_prepare_data = True
+    analysis_context.need_create_graph = False
+
+    result = await _run_analysis(analysis_context)
+
+    try:
+        nodes = [CombinedNode(**n) for n in result["nodes"]]
+        statistics = {
+            ClusteringMethod(method): ClusterStatistics(**values)
+            for method, values in result.get("statistics", {}).items()
+        }
+    except KeyError as e:
+        raise HTTPException(status_code=500, detail=f"Invalid response structure") from e
+
+    return CombinedAnalysisResponse(
+        dataset_id=req.dataset_id,
+        metrics=list(dict.fromkeys(req.metrics)),
+        clusterings=list(dict.fromkeys(req.clusterings)),
+        nodes=nodes,
+        statistics=statistics
+    )
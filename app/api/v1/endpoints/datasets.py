@@ -1,40 +1,33 @@
 from app.models.schemas import (
-    DatasetUploadRequest, DatasetUploadResponse, DatasetListResponse, DatasetInfo
+    DatasetUploadRequest, DatasetUploadResponse, DatasetListResponse, DatasetInfo, IngestJobResponse
 )
-from app.models.graph_types import GraphTypes
-from app.core.context.analysis_context import AnalysisContext
-from app.core.context.metric_calculation_context import MetricCalculationContext
 from app.core.context.user_context import UserContext
-from app.core.services.analysis_manager import AnalysisManager
+from app.core.services.ingest_jobs import ingest_jobs
+from app.core.services.projection_manager import projection_manager
 from app.core.services.user_manager import UserManager
 from app.core.storage import active_datasets
+from app.database.neo4j_connection import AsyncNeo4jConnection
 from app.database.postgres import postgres_manager
 
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
 from uuid import UUID
 from datetime import datetime, timezone
-import uuid
 
 router = APIRouter()
 user_manager = UserManager()
 
-TRANSPORT_TO_GRAPH = {
-    "bus": GraphTypes.BUS_GRAPH,
-    "tram": GraphTypes.TRAM_GRAPH,
-    "trolleybus": GraphTypes.TROLLEY_GRAPH,
-    "minibus": GraphTypes.MINIBUS_GRAPH,
-}
 
-@router.post("/", response_model=DatasetUploadResponse)
+@router.post("/", response_model=DatasetUploadResponse, status_code=202)
 async def upload_dataset(
     data: DatasetUploadRequest,
     user_ctx: UserContext = Depends(user_manager.get_context),
-    db = Depends(postgres_manager.get_db)
 ):
-    """Загружает новый датасет маршрутов для города.
+    """Запускает загрузку нового датасета маршрутов для города.
 
-    Строит граф в Neo4j/GDS на основе выбранного типа
-    транспорта и возвращает идентификатор полученного датасета.
+    Граф строится в Neo4j в фоновой задаче; ответ содержит идентификатор
+    будущего датасета и задачи, ход которой доступен через
+    /datasets/jobs/{job_id} и /datasets/jobs/{job_id}/events.
     """
     # Проверяем дубликаты через active_datasets
     for dataset in active_datasets.values():
@@ -46,45 +39,59 @@ async def upload_dataset(
         elif user_ctx.type == "guest" and dataset.get("guest_token") == user_ctx.guest_token:
             if dataset.get("city_name") == data.city and dataset.get("transport_type") == data.transport_type:
                 raise HTTPException(status_code=409, detail="Dataset with this city and transport type already exists")
-    
-    graph_type = TRANSPORT_TO_GRAPH[data.transport_type]
+    # ... и среди ещё не завершённых загрузок
+    if ingest_jobs.find_active(data.city, data.transport_type, user_ctx):
+        raise HTTPException(status_code=409, detail="Dataset with this city and transport type is already loading")
 
-    dataset_id = uuid.uuid4()
     dataset_name = f"{data.transport_type.capitalize()} routes — {data.city}"
 
     try:
-        # Создаём граф в Neo4j — для всех (и гостей, и пользователей)
-        analysis_context = AnalysisContext(
-            city_name=data.city,
-            graph_name=dataset_id,
-            graph_type=graph_type,
-            metric_calculation_context=MetricCalculationContext(),
-            need_create_graph=True
+        job = await ingest_jobs.submit(
+            data.city,
+            data.transport_type,
+            dataset_name,
+            user_id=user_ctx.user_id if user_ctx.type == "user" else None,
+            guest_token=user_ctx.guest_token if user_ctx.type == "guest" else None,
         )
-
-        manager = AnalysisManager()
-        manager.process(analysis_context)
-
-        # Сохраняем в active_datasets с контекстом
-        active_datasets[dataset_id] = {
-            "name": dataset_name,
-            "city_name": data.city,
-            "transport_type": data.transport_type,
-            "analysis_context": analysis_context,
-            "user_id": user_ctx.user_id if user_ctx.type == "user" else None,
-            "guest_token": user_ctx.guest_token if user_ctx.type == "guest" else None,
-        }
-
-        # Только пользователи → сохраняются в PostgreSQL
-        if user_ctx.type == "user":
-            await db.execute(
-                "INSERT INTO datasets (id, user_id, city, transport_type, name) VALUES ($1, $2, $3, $4, $5)",
-                dataset_id, user_ctx.user_id, data.city, data.transport_type, dataset_name
-            )
-        return DatasetUploadResponse(dataset_id=dataset_id)
-
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create dataset: {str(e)}")
+    return DatasetUploadResponse(dataset_id=job.dataset_id, job_id=job.id)
+
+
+async def _get_own_job(job_id: UUID, user_ctx: UserContext):
+    job = await ingest_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not job.owned_by(user_ctx):
+        raise HTTPException(status_code=403, detail="Access denied")
+    return job
+
+
+@router.get("/jobs/{job_id}", response_model=IngestJobResponse)
+async def get_ingest_job(job_id: UUID, user_ctx: UserContext = Depends(user_manager.get_context)):
+    """Возвращает состояние и прогресс задачи загрузки датасета."""
+    job = await _get_own_job(job_id, user_ctx)
+    return IngestJobResponse(**job.to_dict())
+
+
+@router.get(
+    "/jobs/{job_id}/events",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"text/event-stream": {"schema": {"type": "string"}}}}},
+)
+async def stream_ingest_job(job_id: UUID, user_ctx: UserContext = Depends(user_manager.get_context)):
+    """
+    Поток SSE с состоянием задачи загрузки; закрывается после её
+    завершения. Каждое событие progress содержит IngestJobResponse.
+    """
+    job = await _get_own_job(job_id, user_ctx)
+
+    async def events():
+        async for snapshot in ingest_jobs.subscribe(job):
+            payload = IngestJobResponse(**snapshot).model_dump_json()
+            yield f"event: progress\ndata: {payload}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
 
 
 @router.get("/", response_model=DatasetListResponse)
@@ -103,6 +110,14 @@ async def list_datasets(user_ctx: UserContext = Depends(user_manager.get_context
         ))
     return DatasetListResponse(datasets=datasets)
 
+async def _drop_projection(dataset_id: UUID):
+    """Удаляет проекцию GDS датасета, чтобы она не занимала память Neo4j."""
+    connection = AsyncNeo4jConnection()
+    try:
+        await projection_manager.drop_async(connection, str(dataset_id))
+    finally:
+        await connection.close()
+
 @router.delete("/{dataset_id}")
 async def delete_dataset(
     dataset_id: UUID,
@@ -117,6 +132,7 @@ async def delete_dataset(
         if dataset.get("guest_token") != user_ctx.guest_token:
             raise HTTPException(status_code=403, detail="Access denied")
         active_datasets.pop(dataset_id, None)
+        await _drop_projection(dataset_id)
         return {"message": f"Dataset {dataset_id} deleted"}
 
     # Пользователи
@@ -131,6 +147,7 @@ async def delete_dataset(
             raise HTTPException(status_code=403, detail="Access denied")
 
         active_datasets.pop(dataset_id, None)
+        await _drop_projection(dataset_id)
 
         await db.execute("DELETE FROM datasets WHERE id = $1", dataset_id)
         return {"message": f"Dataset {dataset_id} deleted"}
@@ -0,0 +1,57 @@
+from app.core.context.user_context import UserContext
+from app.core.services.analysis_executor import analysis_executor, ingest_executor
+from app.core.services.coordination import analysis_flights, graph_locks
+from app.core.services.projection_manager import projection_manager
+from app.core.services.result_cache import result_cache
+from app.core.services.user_manager import UserManager
+from app.database.neo4j_connection import pool_stats
+
+from fastapi import APIRouter, Depends, HTTPException
+
+user_manager = UserManager()
+
+
+async def require_token(user_ctx: UserContext = Depends(user_manager.get_context)) -> UserContext:
+    """Пропускает только запросы с действующим токеном пользователя или гостя."""
+    if user_ctx.type == "anonymous":
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return user_ctx
+
+
+router = APIRouter(dependencies=[Depends(require_token)])
+
+
+@router.get("/neo4j-pool")
+async def neo4j_pool_stats():
+    """Возвращает настройки пула соединений Neo4j и число открытых через него сессий."""
+    return pool_stats()
+
+
+@router.get("/analysis-queue")
+async def analysis_queue_stats():
+    """Возвращает глубину очереди анализов, время ожидания и число отказов."""
+    return analysis_executor.stats()
+
+
+@router.get("/ingest-queue")
+async def ingest_queue_stats():
+    """Возвращает загрузку очереди задач загрузки датасетов."""
+    return ingest_executor.stats()
+
+
+@router.get("/result-cache")
+async def result_cache_stats():
+    """Возвращает размер и число попаданий кеша результатов анализа."""
+    return result_cache.stats()
+
+
+@router.get("/projections")
+async def projection_stats():
+    """Возвращает число и суммарный размер проекций GDS относительно бюджета памяти."""
+    return projection_manager.stats()
+
+
+@router.get("/coordination")
+async def coordination_stats():
+    """Возвращает число объединённых запросов и время ожидания блокировок графов."""
+    return {"single_flight": analysis_flights.stats(), "graph_locks": graph_locks.stats()}
@@ -9,8 +9,22 @@ class MetricCalculationContext:
             need_louvain_clusterization: bool = False,
             need_betweenness: bool = False,
             need_pagerank: bool = False,
+            combined: bool = False,
+            weight_transform: str = "log1p",
+            betweenness_sampling_size: int | None = None,
+            betweenness_sampling_seed: int | None = None,
+            betweenness_target_ms: float | None = None,
     ):
         self.need_leiden_clusterization = need_leiden_clusterization
         self.need_louvain_clusterization = need_louvain_clusterization
         self.need_betweenness = need_betweenness
         self.need_pagerank = need_pagerank
+        # Одна запись на узел со всеми значениями и статистика по каждому методу
+        self.combined = combined
+        # Преобразование весов рёбер: log1p, inverse, raw или distance
+        self.weight_transform = weight_transform
+        # Betweenness по выборке исходных узлов: размер задаётся явно
+        # или подбирается под целевую задержку (см. betweenness_sampling)
+        self.betweenness_sampling_size = betweenness_sampling_size
+        self.betweenness_sampling_seed = betweenness_sampling_seed
+        self.betweenness_target_ms = betweenness_target_ms
@@ -0,0 +1,75 @@
+import os
+import threading
+
+"""
+    Выборочный расчёт промежуточности (Betweenness)
+
+    Точный расчёт запускает поиск кратчайших путей из каждого узла, поэтому
+    его время растёт как узлы × узлы. GDS умеет считать по выборке из
+    samplingSize исходных узлов (samplingSeed делает выборку
+    воспроизводимой). Размер выборки задаётся явно или подбирается под
+    целевую задержку: время прогона оценивается как
+    источники × узлы × BETWEENNESS_SECONDS_PER_SOURCE_NODE, а коэффициент
+    уточняется по фактическому времени выполненных расчётов.
+
+    Точность выборки на кешах городов: python -m benchmarks.betweenness_sampling
+"""
+
+BETWEENNESS_SECONDS_PER_SOURCE_NODE = float(os.environ.get("BETWEENNESS_SECONDS_PER_SOURCE_NODE", "0.0000002"))
+
+DEFAULT_SAMPLING_SEED = 42
+MIN_SAMPLING_SIZE = 32
+# Вес последнего замера при уточнении коэффициента
+SMOOTHING = 0.3
+
+
+class BetweennessSampling:
+    """Подбор samplingSize по целевой задержке и числу узлов проекции."""
+
+    def __init__(self, seconds_per_source_node: float = BETWEENNESS_SECONDS_PER_SOURCE_NODE):
+        self.seconds_per_source_node = seconds_per_source_node
+        self._lock = threading.Lock()
+
+    def sampling_size(self, node_count, target_seconds: float):
+        """Возвращает размер выборки или None, если точный расчёт укладывается в бюджет."""
+        if not node_count or target_seconds is None:
+            return None
+        sources = int(target_seconds / (node_count * self.seconds_per_source_node))
+        if sources >= node_count:
+            return None
+        return min(max(sources, MIN_SAMPLING_SIZE), node_count)
+
+    def observe(self, node_count, sources, elapsed: float):
+        """Уточняет коэффициент по времени выполненного расчёта."""
+        if not node_count or not sources or elapsed <= 0:
+            return
+        measured = elapsed / (node_count * sources)
+        with self._lock:
+            self.seconds_per_source_node += SMOOTHING * (measured - self.seconds_per_source_node)
+
+    def resolve(self, metric_context, node_count) -> dict:
+        """Выбирает режим расчёта для MetricCalculationContext.
+
+        Явный betweenness_sampling_size важнее целевой задержки. Возвращает
+        словарь mode/sampling_size/sampling_seed/node_count, который
+        попадает в ответ как accuracy.
+        """
+        size = metric_context.betweenness_sampling_size
+        if size is None and metric_context.betweenness_target_ms is not None:
+            size = self.sampling_size(node_count, metric_context.betweenness_target_ms / 1000)
+        if size is not None and node_count and size >= node_count:
+            size = None
+
+        if size is None:
+            return {"mode": "exact", "sampling_size": None, "sampling_seed": None, "node_count": node_count}
+
+        seed = metric_context.betweenness_sampling_seed
+        return {
+            "mode": "sampled",
+            "sampling_size": size,
+            "sampling_seed": DEFAULT_SAMPLING_SEED if seed is None else seed,
+            "node_count": node_count,
+        }
+
+
+betweenness_sampling = BetweennessSampling()
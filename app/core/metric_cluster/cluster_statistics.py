@@ -0,0 +1,71 @@
+import numpy as np
+
+"""
+    Показатели качества кластеризации за один проход по рёбрам графа
+
+    На вход — номера сообществ узлов (результат алгоритма) и список рёбер
+    датасета. Формула проводимости и покрытия та же, что в прежних
+    Cypher-запросах: каждое ребро учитывается со стороны обоих концов, для
+    сообщества берётся доля внешних (внутренних) рёбер среди инцидентных
+    его узлам, затем среднее по сообществам. Модульность, если её не
+    вернул сам алгоритм, считается по весам рёбер.
+
+    Рёбра берутся из проекции GDS (см. MetricClusterPreparer._edges_query),
+    то есть из графа, который видел алгоритм: параллельные сегменты разных
+    маршрутов между двумя остановками сведены в одно ребро с минимальным
+    весом, петель нет. Прежние запросы считали каждый сегмент маршрута в
+    хранилище, поэтому у остановок со многими маршрутами значения
+    отличаются от старых.
+"""
+
+
+def cluster_statistics(communities: dict, edges: list[dict], modularity: float | None = None) -> dict:
+    """Возвращает modularity, conductance и coverage разбиения.
+
+    :param communities: номер сообщества для id узла
+    :param edges: строки с source, target (id узлов) и weight, каждое ребро один раз
+    :param modularity: модульность из результата алгоритма, если известна
+    """
+    codes = {}
+    labels = {node: codes.setdefault(c, len(codes)) for node, c in communities.items() if c is not None}
+    if not labels or not edges:
+        raise ValueError("Metric query returned empty result")
+
+    count = len(edges)
+    source = np.fromiter((labels.get(e["source"], -1) for e in edges), dtype=np.int64, count=count)
+    target = np.fromiter((labels.get(e["target"], -1) for e in edges), dtype=np.int64, count=count)
+    weight = np.fromiter(
+        (1.0 if e["weight"] is None else e["weight"] for e in edges), dtype=np.float64, count=count
+    )
+
+    own = np.concatenate([source, target])
+    other = np.concatenate([target, source])
+    weights = np.concatenate([weight, weight])
+    known = own >= 0
+    internal = known & (own == other)
+
+    total = np.bincount(own[known], minlength=len(codes))
+    external = total - np.bincount(own[internal], minlength=len(codes))
+    present = total > 0
+    if not present.any():
+        raise ValueError("Metric query returned empty result")
+
+    conductance = float(np.mean(external[present] / total[present]))
+
+    if modularity is None:
+        modularity = _modularity(own, weights, known, internal, len(codes))
+
+    return {
+        "modularity": float(modularity),
+        "conductance": conductance,
+        "coverage": 1.0 - conductance,
+    }
+
+
+def _modularity(own, weights, known, internal, community_count) -> float:
+    total_weight = weights.sum()
+    if total_weight <= 0:
+        return 0.0
+    degree = np.bincount(own[known], weights=weights[known], minlength=community_count)
+    inside = np.bincount(own[internal], weights=weights[internal], minlength=community_count)
+    return float(np.sum(inside / total_weight - (degree / total_weight) ** 2))
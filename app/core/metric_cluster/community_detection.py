@@ -1,7 +1,6 @@
-from app.database.neo4j_connection import Neo4jConnection
+from app.core.metric_cluster.cluster_statistics import cluster_statistics
+from app.database.neo4j_connection import AsyncNeo4jConnection, Neo4jConnection
 import logging
-from collections import defaultdict
-from math import sqrt
 
 logger = logging.getLogger(__name__)
 
@@ -9,16 +8,18 @@ logger = logging.getLogger(__name__)
 class CommunityDetection:
     """Базовый класс для детекции сообществ и расчёта метрик качества кластеризации."""
 
-    def __init__(self, algorithm_name: str, property_name: str):
+    def __init__(self, algorithm_name: str, property_name: str, connection=None):
         """Инициализирует детектор сообществ.
 
         :param algorithm_name: имя алгоритма GDS (leiden / louvain)
         :param property_name: имя свойства узла для записи идентификатора сообщества
+        :param connection: подключение к Neo4j (по умолчанию новое Neo4jConnection)
         """
         self.algorithm_name = algorithm_name
         self.property_name = property_name
-        self.connection = Neo4jConnection()
+        self.connection = connection or Neo4jConnection()
         self.graph_name: str | None = None
+        self.modularity: float | None = None
 
     def detect_communities(
         self,
@@ -38,8 +39,16 @@ class CommunityDetection:
         graph_name: str,
         relationship_weight_property: str
     ) -> None:
-        """Записывает идентификаторы сообществ в узлы графа."""
-        query = f"""
+        """Записывает идентификаторы сообществ в узлы графа и запоминает модульность."""
+        try:
+            result = self.connection.run(self._write_query(graph_name, relationship_weight_property))
+            self.modularity = self._result_modularity(result)
+        except Exception:
+            logger.exception("Error writing communities")
+            raise
+
+    def _write_query(self, graph_name: str, relationship_weight_property: str) -> str:
+        return f"""
             CALL gds.{self.algorithm_name}.write(
                 '{graph_name}',
                 {{
@@ -47,121 +56,133 @@ class CommunityDetection:
                     writeProperty: '{self.property_name}'
                 }}
             )
+            YIELD modularity
+            RETURN modularity
         """
+
+    @classmethod
+    def _result_modularity(cls, result) -> float | None:
+        try:
+            return cls._metric_value(result)
+        except (ValueError, TypeError):
+            return None
+
+    def stream_communities(
+        self,
+        graph_name: str,
+        relationship_weight_property: str
+    ) -> list[dict]:
+        """Возвращает сообщества узлов без записи в граф.
+
+        Каждая строка содержит id, имя и координаты узла и номер
+        сообщества под именем property_name.
+        """
+        self.graph_name = graph_name
+        self.modularity = None
         try:
-            self.connection.run(query)
+            return self.connection.read_all(self._stream_query(graph_name, relationship_weight_property))
         except Exception:
-            logger.exception("Error writing communities")
+            logger.exception("Error streaming communities")
             raise
 
-    def _get_metric(self, query: str) -> float:
-        """Выполняет запрос метрики и возвращает значение.
+    def _stream_query(self, graph_name: str, relationship_weight_property: str) -> str:
+        return f"""
+            CALL gds.{self.algorithm_name}.stream(
+                '{graph_name}',
+                {{
+                    relationshipWeightProperty: '{relationship_weight_property}'
+                }}
+            )
+            YIELD nodeId, communityId
+            WITH gds.util.asNode(nodeId) AS n, communityId
+            RETURN
+                elementId(n) AS id,
+                n.name AS name,
+                n.location.longitude AS lon,
+                n.location.latitude AS lat,
+                communityId AS {self.property_name}
+        """
+
+    def cluster_statistics(self, nodes: list[dict], edges: list[dict]) -> dict:
+        """Модульность, проводимость и покрытие без повторного запуска алгоритма.
 
-        Бросает исключение при отсутствии graph_name, пустом результате
-        или ошибке выполнения запроса.
+        :param nodes: строки узлов с id и номером сообщества (property_name)
+        :param edges: рёбра проекции датасета (source, target, weight),
+            параллельные сегменты сведены в одно ребро
         """
-        if not self.graph_name:
-            raise ValueError("graph_name is not set; run detect_communities first")
+        communities = {row["id"]: row[self.property_name] for row in nodes}
+        return cluster_statistics(communities, edges, self.modularity)
 
-        try:
-            result = self.connection.run(query)
+    @staticmethod
+    def _metric_value(result) -> float:
+        if (
+            isinstance(result, (list, tuple))
+            and result
+            and isinstance(result[0], (list, tuple))
+            and result[0]
+            and result[0][0] is not None
+        ):
+            return float(result[0][0])
 
-            if (
-                isinstance(result, (list, tuple))
-                and result
-                and isinstance(result[0], (list, tuple))
-                and result[0]
-                and result[0][0] is not None
-            ):
-                return float(result[0][0])
+        raise ValueError("Metric query returned empty result")
 
-            raise ValueError("Metric query returned empty result")
 
-        except Exception:
-            logger.exception("Error executing metric query")
-            raise
+class Leiden(CommunityDetection):
+    """Алгоритм Leiden для детекции сообществ."""
 
-    def calculate_modularity(self) -> float:
-        """Возвращает значение модульности кластеризации."""
-        try:
-            query = (
-                f"CALL gds.{self.algorithm_name}.stats('{self.graph_name}') "
-                f"YIELD modularity RETURN modularity"
-            )
-            return self._get_metric(query)
-        except Exception:
-            logger.exception("Error calculating modularity")
-            raise
+    def __init__(self):
+        super().__init__("leiden", "leiden_community")
 
-    def calculate_conductance(self) -> float:
-        """Возвращает оценку проводимости сообществ.
 
-        Рассчитывает как отношение внешних рёбер к общему числу рёбер.
-        """
+class Louvain(CommunityDetection):
+    """Алгоритм Louvain для детекции сообществ."""
+
+    def __init__(self):
+        super().__init__("louvain", "louvain_community")
+
+
+class AsyncCommunityDetection(CommunityDetection):
+    """Асинхронный вариант CommunityDetection поверх AsyncNeo4jConnection."""
+
+    def __init__(self, algorithm_name: str, property_name: str):
+        super().__init__(algorithm_name, property_name, AsyncNeo4jConnection())
+
+    async def detect_communities(
+        self,
+        graph_name: str,
+        relationship_weight_property: str
+    ) -> None:
+        self.graph_name = graph_name
         try:
-            query = f"""
-                MATCH (n)-[r]-(m)
-                WHERE n.{self.property_name} IS NOT NULL
-                WITH
-                    n.{self.property_name} AS community,
-                    CASE
-                        WHEN n.{self.property_name} = m.{self.property_name}
-                        THEN 0 ELSE 1
-                    END AS is_external,
-                    r
-                WITH
-                    community,
-                    sum(is_external) AS external_edges,
-                    count(r) AS total_edges
-                WHERE total_edges > 0
-                RETURN
-                    AVG(toFloat(external_edges) / total_edges) AS avg_conductance
-            """
-            return self._get_metric(query)
+            result = await self.connection.run(self._write_query(graph_name, relationship_weight_property))
+            self.modularity = self._result_modularity(result)
         except Exception:
-            logger.exception("Error calculating conductance")
+            logger.exception("Error writing communities")
             raise
 
-    def calculate_coverage(self) -> float:
-        """Возвращает среднее значение coverage по сообществам.
-
-        Coverage определяется как отношение числа внутренних рёбер
-        сообщества к общему числу рёбер, инцидентных его вершинам.
-        """
+    async def stream_communities(
+        self,
+        graph_name: str,
+        relationship_weight_property: str
+    ) -> list[dict]:
+        self.graph_name = graph_name
+        self.modularity = None
         try:
-            query = f"""
-                MATCH (n)-[r]-(m)
-                WHERE n.{self.property_name} IS NOT NULL
-                WITH
-                    n.{self.property_name} AS community,
-                    CASE
-                        WHEN n.{self.property_name} = m.{self.property_name}
-                        THEN 1 ELSE 0
-                    END AS is_internal,
-                    r
-                WITH
-                    community,
-                    sum(is_internal) AS internal_edges,
-                    count(r) AS total_edges
-                WHERE total_edges > 0
-                RETURN
-                    AVG(toFloat(internal_edges) / total_edges) AS avg_coverage
-            """
-            return self._get_metric(query)
+            return await self.connection.read_all(self._stream_query(graph_name, relationship_weight_property))
         except Exception:
-            logger.exception("Error calculating coverage")
+            logger.exception("Error streaming communities")
             raise
 
 
-class Leiden(CommunityDetection):
-    """Алгоритм Leiden для детекции сообществ."""
+class AsyncLeiden(AsyncCommunityDetection):
+    """Асинхронный Leiden."""
 
     def __init__(self):
         super().__init__("leiden", "leiden_community")
 
 
-class Louvain(CommunityDetection):
-    """Алгоритм Louvain для детекции сообществ."""
+class AsyncLouvain(AsyncCommunityDetection):
+    """Асинхронный Louvain."""
 
     def __init__(self):
-        super().__init__("louvain", "louvain_community")
\ No newline at end of file
+        super().__init__("louvain", "louvain_community")
@@ -1,28 +1,62 @@
 import logging
+import os
+import time
 
 from app.core.context.analysis_context import AnalysisContext
-from app.core.metric_cluster.community_detection import Leiden, Louvain
-from app.core.metric_cluster.metrics_calculate import Betweenness, PageRank
-from app.database.neo4j_connection import Neo4jConnection
+from app.core.metric_cluster.betweenness_sampling import betweenness_sampling
+from app.core.metric_cluster.community_detection import AsyncLeiden, AsyncLouvain, Leiden, Louvain
+from app.core.metric_cluster.metrics_calculate import AsyncBetweenness, AsyncPageRank, Betweenness, PageRank
+from app.core.services.projection_manager import projection_manager
+from app.database.neo4j_connection import AsyncNeo4jConnection, Neo4jConnection
+
+"""
+    При GDS_STREAM_MODE=1 алгоритмы запускаются через gds.*.stream: значения
+    метрик и номера сообществ приходят вместе с id, именем и координатами
+    узлов и сразу попадают в ответ. Свойства pagerank, betweenness и
+    *_community в узлах не пишутся, поэтому параллельные анализы одного
+    города не перетирают результаты друг друга.
+
+    Betweenness считается точно или по выборке исходных узлов (см.
+    betweenness_sampling); выбранный режим возвращается в поле accuracy.
+"""
+
+GDS_STREAM_MODE = os.environ.get("GDS_STREAM_MODE", "0") == "1"
+
+RESULT_COLUMNS = ("leiden_community", "louvain_community", "betweenness", "pagerank")
+CLUSTER_METHODS = ("leiden", "louvain")
 
 
 class MetricClusterPreparer:
     """Готовит метрики и кластеры для анализа графа."""
 
-    def __init__(self, analysis_context: AnalysisContext):
-        """Инициализирует подготовку метрик на основе контекста анализа."""
+    stream = GDS_STREAM_MODE
+
+    def __init__(self, analysis_context: AnalysisContext, stream: bool = GDS_STREAM_MODE, connection=None):
+        """Инициализирует подготовку метрик на основе контекста анализа.
+
+        stream — получать результаты через gds.*.stream без записи в узлы.
+        """
         self.ctx = analysis_context
-        self.conn = Neo4jConnection()
+        self.conn = connection or Neo4jConnection()
+        self.stream = stream
+        self.node_rows = []
+        self.edge_rows = None
+        self.accuracy = None
 
         self.mc = analysis_context.metric_calculation_context
+        self._create_algorithms()
 
+    def _create_algorithms(self):
+        """Создаёт выбранные в контексте алгоритмы."""
         self.leiden = Leiden() if self.mc.need_leiden_clusterization else None
         self.louvain = Louvain() if self.mc.need_louvain_clusterization else None
-        self.betweenness = Betweenness() if self.mc.need_betweenness else None
+        self.betweenness = self._create_betweenness(Betweenness) if self.mc.need_betweenness else None
         self.pagerank = PageRank() if self.mc.need_pagerank else None
 
     def prepare_metrics(self) -> dict:
         """Запускает расчёт выбранных метрик и кластеризаций и возвращает результат."""
+        if self.stream:
+            return self._prepare_metrics_stream()
 
         if self.leiden:
             self._run_leiden()
@@ -42,6 +76,9 @@ class MetricClusterPreparer:
         
         if self.leiden or self.louvain:
             result["statistics"] = self._calculate_cluster_statistics()
+
+        if self.betweenness:
+            result["accuracy"] = self.accuracy
         
         return result
 
@@ -63,10 +100,12 @@ class MetricClusterPreparer:
 
     def _run_betweenness(self):
         """Вычисляет метрику промежуточности (Betweenness)."""
+        started = time.perf_counter()
         self.betweenness.metric_calculate(
             self.ctx.graph_name,
             self.ctx.db_graph_parameters.weight
         )
+        self._observe_betweenness(started)
 
     def _run_pagerank(self):
         """Вычисляет метрику PageRank."""
@@ -75,14 +114,74 @@ class MetricClusterPreparer:
             self.ctx.db_graph_parameters.weight
         )
 
+    def _create_betweenness(self, constructor):
+        """Создаёт расчёт Betweenness в режиме, выбранном по контексту и размеру проекции."""
+        node_count = projection_manager.node_count(str(self.ctx.graph_name))
+        self.accuracy = betweenness_sampling.resolve(self.mc, node_count)
+        if self.accuracy["mode"] == "exact":
+            return constructor()
+        return constructor(
+            sampling_size=self.accuracy["sampling_size"],
+            sampling_seed=self.accuracy["sampling_seed"],
+        )
+
+    def _observe_betweenness(self, started: float):
+        """Передаёт время расчёта Betweenness для подбора размера выборки."""
+        node_count = self.accuracy["node_count"]
+        sources = self.accuracy["sampling_size"] or node_count
+        betweenness_sampling.observe(node_count, sources, time.perf_counter() - started)
+
+    # -------------------- Потоковый режим --------------------
+
+    def _prepare_metrics_stream(self) -> dict:
+        graph_name = self.ctx.graph_name
+        weight = self.ctx.db_graph_parameters.weight
+
+        merged = {}
+        for detector in (self.leiden, self.louvain):
+            if detector:
+                self._merge_stream_rows(merged, detector.stream_communities(graph_name, weight))
+        if self.betweenness:
+            started = time.perf_counter()
+            self._merge_stream_rows(merged, self.betweenness.metric_stream(graph_name, weight))
+            self._observe_betweenness(started)
+        if self.pagerank:
+            self._merge_stream_rows(merged, self.pagerank.metric_stream(graph_name, weight))
+
+        self.node_rows = list(merged.values()) if self._has_algorithms() else self.conn.read_all(self._nodes_query())
+        result = {"nodes": self._format_nodes(self.node_rows)}
+
+        if self.leiden or self.louvain:
+            result["statistics"] = self._calculate_cluster_statistics()
+
+        if self.betweenness:
+            result["accuracy"] = self.accuracy
+
+        return result
+
+    def _has_algorithms(self) -> bool:
+        return any((self.leiden, self.louvain, self.betweenness, self.pagerank))
+
+    @staticmethod
+    def _merge_stream_rows(merged: dict, rows: list[dict]):
+        """Собирает строки разных алгоритмов в одну строку на узел."""
+        for row in rows:
+            node = merged.get(row["id"])
+            if node is None:
+                node = merged[row["id"]] = dict.fromkeys(RESULT_COLUMNS)
+            node.update(row)
+
     # -------------------- Получение узлов --------------------
 
     def _load_nodes_with_metrics(self) -> list[dict]:
         """Загружает узлы с рассчитанными метриками и метками кластеров."""
+        self.node_rows = self.conn.read_all(self._nodes_query())
+        return self._format_nodes(self.node_rows)
 
+    def _nodes_query(self) -> str:
         node_label = self.ctx.db_graph_parameters.main_node_name
 
-        query = f"""
+        return f"""
             MATCH (n:`{node_label}`)
             RETURN
                 elementId(n) AS id,
@@ -95,8 +194,41 @@ class MetricClusterPreparer:
                 n.pagerank AS pagerank
         """
 
-        rows = self.conn.read_all(query)
+    def _format_nodes(self, rows: list[dict]) -> list[dict]:
+        if self.mc.combined:
+            return self._rows_to_records(rows)
+        return self._rows_to_nodes(rows)
 
+    def _rows_to_records(self, rows: list[dict]) -> list[dict]:
+        """Одна запись на узел со всеми запрошенными значениями.
+
+        Узлы, для которых какое-то из значений не рассчитано,
+        пропускаются, как и в _rows_to_nodes.
+        """
+        columns = self._requested_columns()
+        result = []
+        for r in rows:
+            if any(r[column] is None for column in columns):
+                continue
+            node = {
+                "id": r["id"],
+                "name": r["name"],
+                "coordinates": [r["lon"], r["lat"]],
+            }
+            node.update((column, r[column]) for column in columns)
+            result.append(node)
+        return result
+
+    def _requested_columns(self) -> list[str]:
+        flags = (
+            self.mc.need_leiden_clusterization,
+            self.mc.need_louvain_clusterization,
+            self.mc.need_betweenness,
+            self.mc.need_pagerank,
+        )
+        return [column for column, needed in zip(RESULT_COLUMNS, flags) if needed]
+
+    def _rows_to_nodes(self, rows: list[dict]) -> list[dict]:
         result = []
         for r in rows:
             node = {
@@ -143,22 +275,156 @@ class MetricClusterPreparer:
         """Рассчитывает агрегированные показатели качества кластеризации.
 
         Возвращает словарь с метриками: модульность, проводимость и покрытие. 
-        При ошибке возвращает -1.0 для каждой метрики.
+        При ошибке возвращает -1.0 для каждой метрики. Для объединённого
+        анализа (mc.combined) — словарь таких показателей по методам.
+
+        Показатели считаются по уже прочитанным узлам и одному списку
+        рёбер проекции датасета, без повторного запуска алгоритма.
         """
+        return self._collect_statistics(self._detector_statistics)
+
+    def _detector_statistics(self, detector) -> dict:
+        try:
+            return detector.cluster_statistics(self.node_rows, self._load_edges())
+        except Exception:
+            logger = logging.getLogger(__name__)
+            logger.exception("Error calculating cluster statistics")
+            raise
+
+    def _load_edges(self) -> list[dict]:
+        if self.edge_rows is None:
+            self.edge_rows = self.conn.read_all(self._edges_query())
+        return self.edge_rows
+
+    def _edges_query(self) -> str:
+        weight = self.ctx.db_graph_parameters.weight
+
+        # Рёбра проекции этого датасета с теми же весами, что видел алгоритм;
+        # проекция неориентированная, поэтому каждое ребро берётся один раз.
+        # Параллельные сегменты маршрутов в проекции сведены в одно ребро
+        # (MIN по весу), петель нет — статистика считается по этому графу,
+        # а не по каждому сегменту в хранилище, как прежние Cypher-запросы
+        return f"""
+            CALL gds.graph.relationshipProperty.stream('{self.ctx.graph_name}', '{weight}')
+            YIELD sourceNodeId, targetNodeId, propertyValue
+            WHERE sourceNodeId < targetNodeId
+            RETURN
+                elementId(gds.util.asNode(sourceNodeId)) AS source,
+                elementId(gds.util.asNode(targetNodeId)) AS target,
+                propertyValue AS weight
+        """
+
+    def _collect_statistics(self, compute) -> dict:
+        if not self.mc.combined:
+            return compute(self._statistics_detector())
+        return {method: compute(detector) for method, detector in self._cluster_detectors()}
+
+    def _cluster_detectors(self) -> list:
+        detectors = [
+            (method, detector)
+            for method, detector in zip(CLUSTER_METHODS, (self.leiden, self.louvain))
+            if detector
+        ]
+        for _, detector in detectors:
+            detector.graph_name = self.ctx.graph_name
+        return detectors
+
+    def _statistics_detector(self):
         detector = self.leiden if self.leiden else self.louvain
 
         if not detector:
             raise ValueError("Cluster detector is not initialized; run clustering first")
 
         detector.graph_name = self.ctx.graph_name
+        return detector
+
+
+class AsyncMetricClusterPreparer(MetricClusterPreparer):
+    """Асинхронный вариант MetricClusterPreparer.
+
+    Алгоритмы запускаются по очереди, как и в синхронном варианте, но
+    ожидание ответа Neo4j не занимает цикл событий.
+    """
+
+    def __init__(self, analysis_context: AnalysisContext, stream: bool = GDS_STREAM_MODE):
+        super().__init__(analysis_context, stream, AsyncNeo4jConnection())
+
+    def _create_algorithms(self):
+        self.leiden = AsyncLeiden() if self.mc.need_leiden_clusterization else None
+        self.louvain = AsyncLouvain() if self.mc.need_louvain_clusterization else None
+        self.betweenness = self._create_betweenness(AsyncBetweenness) if self.mc.need_betweenness else None
+        self.pagerank = AsyncPageRank() if self.mc.need_pagerank else None
+
+    async def prepare_metrics(self) -> dict:
+        if self.stream:
+            return await self._prepare_metrics_stream()
+
+        graph_name = self.ctx.graph_name
+        weight = self.ctx.db_graph_parameters.weight
+
+        for detector in (self.leiden, self.louvain):
+            if detector:
+                await detector.detect_communities(graph_name, weight)
+        if self.betweenness:
+            started = time.perf_counter()
+            await self.betweenness.metric_calculate(graph_name, weight)
+            self._observe_betweenness(started)
+        if self.pagerank:
+            await self.pagerank.metric_calculate(graph_name, weight)
+
+        self.node_rows = await self.conn.read_all(self._nodes_query())
+        result = {"nodes": self._format_nodes(self.node_rows)}
 
+        if self.leiden or self.louvain:
+            result["statistics"] = await self._calculate_cluster_statistics()
+
+        if self.betweenness:
+            result["accuracy"] = self.accuracy
+
+        return result
+
+    async def _calculate_cluster_statistics(self) -> dict:
+        return await self._collect_statistics_async(self._detector_statistics)
+
+    async def _collect_statistics_async(self, compute) -> dict:
+        if not self.mc.combined:
+            return await compute(self._statistics_detector())
+        return {method: await compute(detector) for method, detector in self._cluster_detectors()}
+
+    async def _detector_statistics(self, detector) -> dict:
         try:
-            return {
-                "modularity": detector.calculate_modularity(),
-                "conductance": detector.calculate_conductance(),
-                "coverage": detector.calculate_coverage()
-            }
+            if self.edge_rows is None:
+                self.edge_rows = await self.conn.read_all(self._edges_query())
+            return detector.cluster_statistics(self.node_rows, self.edge_rows)
         except Exception:
             logger = logging.getLogger(__name__)
             logger.exception("Error calculating cluster statistics")
             raise
+
+    async def _prepare_metrics_stream(self) -> dict:
+        graph_name = self.ctx.graph_name
+        weight = self.ctx.db_graph_parameters.weight
+
+        merged = {}
+        for detector in (self.leiden, self.louvain):
+            if detector:
+                self._merge_stream_rows(merged, await detector.stream_communities(graph_name, weight))
+        if self.betweenness:
+            started = time.perf_counter()
+            self._merge_stream_rows(merged, await self.betweenness.metric_stream(graph_name, weight))
+            self._observe_betweenness(started)
+        if self.pagerank:
+            self._merge_stream_rows(merged, await self.pagerank.metric_stream(graph_name, weight))
+
+        self.node_rows = (
+            list(merged.values()) if self._has_algorithms() else await self.conn.read_all(self._nodes_query())
+        )
+        result = {"nodes": self._format_nodes(self.node_rows)}
+
+        if self.leiden or self.louvain:
+            result["statistics"] = await self._calculate_cluster_statistics()
+
+        if self.betweenness:
+            result["accuracy"] = self.accuracy
+
+        return result
@@ -1,4 +1,4 @@
-from app.database.neo4j_connection import Neo4jConnection
+from app.database.neo4j_connection import AsyncNeo4jConnection, Neo4jConnection
 
 """
     Класс содержащий query для вычисления метрик сети 
@@ -6,37 +6,102 @@ from app.database.neo4j_connection import Neo4jConnection
 
 class MetricsCalculate:
     """Базовый класс для запуска вычисления метрик GDS."""
-    def __init__(self, metric_name, write_property):
+    def __init__(self, metric_name, write_property, connection=None, config=None):
         """Инициализирует калькулятор метрики.
 
         metric_name — имя процедуры GDS,
-        write_property — свойство записи значения метрики.
+        write_property — свойство записи значения метрики,
+        connection — подключение (по умолчанию новое Neo4jConnection),
+        config — дополнительные параметры процедуры GDS.
         """
         self.metric_name = metric_name
         self.write_property = write_property
-        self.connection = Neo4jConnection()
+        self.connection = connection or Neo4jConnection()
+        self.config = config or {}
 
     def metric_calculate(self, graph_name, weight_property):
         """Выполняет запись метрики в узлы графа."""
-        query = f'''
+        return self.connection.run(self._write_query(graph_name, weight_property))
+
+    def metric_stream(self, graph_name, weight_property):
+        """Возвращает значения метрики без записи в узлы.
+
+        Каждая строка содержит id, имя и координаты узла и значение
+        метрики под именем write_property.
+        """
+        return self.connection.read_all(self._stream_query(graph_name, weight_property))
+
+    def _write_query(self, graph_name, weight_property):
+        return f'''
             CALL gds.{self.metric_name}.write(
                 '{graph_name}',
                 {{
                     relationshipWeightProperty: '{weight_property}',
-                    writeProperty: '{self.write_property}'
+                    writeProperty: '{self.write_property}'{self._config_entries()}
                 }}
             )
         '''
-        return self.connection.run(query)
+
+    def _stream_query(self, graph_name, weight_property):
+        return f'''
+            CALL gds.{self.metric_name}.stream(
+                '{graph_name}',
+                {{
+                    relationshipWeightProperty: '{weight_property}'{self._config_entries()}
+                }}
+            )
+            YIELD nodeId, score
+            WITH gds.util.asNode(nodeId) AS n, score
+            RETURN
+                elementId(n) AS id,
+                n.name AS name,
+                n.location.longitude AS lon,
+                n.location.latitude AS lat,
+                score AS {self.write_property}
+        '''
+
+    def _config_entries(self) -> str:
+        return "".join(f",\n                    {key}: {value}" for key, value in self.config.items())
+
+
+def sampling_config(sampling_size=None, sampling_seed=None) -> dict:
+    """Параметры выборочного расчёта Betweenness (без заданных None)."""
+    config = {"samplingSize": sampling_size, "samplingSeed": sampling_seed}
+    return {key: int(value) for key, value in config.items() if value is not None}
 
 
 class Betweenness(MetricsCalculate):
-    def __init__(self):
-        """Калькулятор метрики промежуточности (Betweenness)."""
-        super().__init__("betweenness", "betweenness")
+    def __init__(self, sampling_size=None, sampling_seed=None):
+        """Калькулятор метрики промежуточности (Betweenness).
+
+        sampling_size/sampling_seed — расчёт по выборке исходных узлов.
+        """
+        super().__init__("betweenness", "betweenness", config=sampling_config(sampling_size, sampling_seed))
 
 
 class PageRank(MetricsCalculate):
     def __init__(self):
         """Калькулятор метрики PageRank."""
         super().__init__("pageRank", "pagerank")
+
+
+class AsyncMetricsCalculate(MetricsCalculate):
+    """Асинхронный запуск метрики через AsyncNeo4jConnection."""
+    def __init__(self, metric_name, write_property, config=None):
+        super().__init__(metric_name, write_property, AsyncNeo4jConnection(), config)
+
+    async def metric_calculate(self, graph_name, weight_property):
+        return await self.connection.run(self._write_query(graph_name, weight_property))
+
+    async def metric_stream(self, graph_name, weight_property):
+        return await self.connection.read_all(self._stream_query(graph_name, weight_property))
+
+
+class AsyncBetweenness(AsyncMetricsCalculate):
+    def __init__(self, sampling_size=None, sampling_seed=None):
+        super().__init__("betweenness", "betweenness", sampling_config(sampling_size, sampling_seed))
+
+
+class AsyncPageRank(AsyncMetricsCalculate):
+    def __init__(self):
+        super().__init__("pageRank", "pagerank")
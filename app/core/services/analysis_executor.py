@@ -0,0 +1,115 @@
+import asyncio
+import math
+import os
+import time
+
+"""
+    Ограничение числа одновременных анализов
+
+    Тяжёлые запросы (загрузка графа, кластеризация, метрики GDS) проходят
+    через AnalysisExecutor: одновременно выполняется не больше
+    `max_concurrency` задач, ещё `max_queue` ждут своей очереди. Когда и
+    очередь заполнена, задача сразу отклоняется с AnalysisQueueFull, а API
+    отвечает 503 с заголовком Retry-After.
+
+    Загрузка датасетов идёт через отдельный ingest_executor со своими
+    лимитами: долгий парсинг города не занимает слоты анализов.
+"""
+
+ANALYSIS_MAX_CONCURRENCY = int(os.environ.get("ANALYSIS_MAX_CONCURRENCY", "2"))
+ANALYSIS_MAX_QUEUE = int(os.environ.get("ANALYSIS_MAX_QUEUE", "8"))
+INGEST_MAX_CONCURRENCY = int(os.environ.get("INGEST_MAX_CONCURRENCY", "1"))
+INGEST_MAX_QUEUE = int(os.environ.get("INGEST_MAX_QUEUE", "16"))
+DEFAULT_RUN_SECONDS = 5.0
+RUN_TIME_SMOOTHING = 0.2
+
+
+class AnalysisQueueFull(Exception):
+    """Очередь анализов заполнена; `retry_after` — рекомендуемая пауза в секундах."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Analysis queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AnalysisExecutor:
+    """Ограниченная очередь асинхронных задач анализа.
+
+    Счётчики меняются только из цикла событий, поэтому блокировки не нужны.
+    Семафор создаётся заново при смене цикла событий (например, в тестах).
+    """
+
+    def __init__(self, max_concurrency: int = ANALYSIS_MAX_CONCURRENCY, max_queue: int = ANALYSIS_MAX_QUEUE):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.running = 0
+        self.waiting = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.avg_run_seconds = None
+        self._semaphore = None
+        self._loop = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def retry_after(self) -> int:
+        """Оценка времени до освобождения места в очереди, в секундах."""
+        run_seconds = self.avg_run_seconds or DEFAULT_RUN_SECONDS
+        rounds = math.ceil((self.waiting + 1) / max(1, self.max_concurrency))
+        return max(1, math.ceil(run_seconds * rounds))
+
+    async def run(self, func, *args, **kwargs):
+        """Выполняет корутинную функцию `func` в свободном слоте или ставит в очередь."""
+        if self.running + self.waiting >= self.max_concurrency + self.max_queue:
+            self.rejected += 1
+            raise AnalysisQueueFull(self.retry_after())
+
+        semaphore = self._get_semaphore()
+        queued_at = time.monotonic()
+        self.waiting += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        waited = time.monotonic() - queued_at
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        self.running += 1
+        started = time.monotonic()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            elapsed = time.monotonic() - started
+            self.running -= 1
+            self.completed += 1
+            if self.avg_run_seconds is None:
+                self.avg_run_seconds = elapsed
+            else:
+                self.avg_run_seconds += RUN_TIME_SMOOTHING * (elapsed - self.avg_run_seconds)
+            semaphore.release()
+
+    def stats(self) -> dict:
+        admitted = self.completed + self.running
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "queue_depth": self.waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_seconds": round(self.wait_seconds_total / admitted, 3) if admitted else 0.0,
+            "max_wait_seconds": round(self.wait_seconds_max, 3),
+            "avg_run_seconds": round(self.avg_run_seconds, 3) if self.avg_run_seconds is not None else None,
+        }
+
+
+analysis_executor = AnalysisExecutor()
+ingest_executor = AnalysisExecutor(INGEST_MAX_CONCURRENCY, INGEST_MAX_QUEUE)
@@ -1,6 +1,11 @@
+import asyncio
+
 from app.core.context.analysis_context import AnalysisContext
-from app.core.metric_cluster.metric_cluster_preparer import MetricClusterPreparer
-from app.core.services.analysis_preparer import AnalysisPreparer
+from app.core.metric_cluster.metric_cluster_preparer import AsyncMetricClusterPreparer, MetricClusterPreparer
+from app.core.services.analysis_preparer import AnalysisPreparer, AsyncAnalysisPreparer
+from app.core.services.coordination import graph_locks
+from app.core.services.projection_manager import projection_manager
+from app.core.services.result_cache import result_cache
 
 class AnalysisManager:
 
@@ -9,7 +14,8 @@ class AnalysisManager:
 
         В зависимости от флагов в `analysis_context` строит граф
         в БД, подготавливает данные и рассчитывает метрики/кластеры.
-        Возвращает результаты расчётов при необходимости.
+        Возвращает результаты расчётов при необходимости; повторный расчёт
+        для той же версии графа берётся из result_cache.
         """
 
         if analysis_context.need_create_graph:
@@ -20,9 +26,78 @@ class AnalysisManager:
             db_manager.update_db(ru_city_name)
 
         if analysis_context.need_prepare_data:
+            cache_key = result_cache.key_for(analysis_context)
+            result = result_cache.get(cache_key)
+            if result is not None:
+                return result
+
             analysis_preparer = AnalysisPreparer(analysis_context)
             analysis_preparer.prepare()
 
             metric_data_preparer = MetricClusterPreparer(analysis_context)
-            return metric_data_preparer.prepare_metrics()
-            
+            projection_name = str(analysis_context.graph_name)
+            # Проекция закреплена на время расчёта: вытеснение по бюджету её не удалит
+            projection_manager.add_reader(projection_name)
+            try:
+                result = metric_data_preparer.prepare_metrics()
+            finally:
+                projection_manager.release_reader(projection_name)
+            result_cache.put(cache_key, analysis_context.db_graph_parameters.main_node_name, result)
+            return result
+
+    async def process_async(self, analysis_context: AnalysisContext, on_progress=None):
+        """Асинхронный вариант process для обработчиков FastAPI.
+
+        Загрузка графа (парсинг и пакетная запись) выполняется в потоке,
+        подготовка и расчёт метрик — через асинхронный драйвер Neo4j,
+        поэтому цикл событий остаётся свободным для других запросов.
+        `on_progress` передаётся менеджеру БД (вызывается из потока загрузки).
+        Операции, меняющие граф или его проекцию, идут под graph_locks;
+        при загрузке графа блокировка берётся только на запись в Neo4j,
+        парсинг идёт без неё.
+        """
+
+        if analysis_context.need_create_graph:
+            ru_city_name = analysis_context.city_name
+            db_manager_constructor = analysis_context.graph_type.value
+            db_manager = db_manager_constructor(analysis_context)
+            db_manager.on_progress = on_progress
+            loop = asyncio.get_running_loop()
+            label = analysis_context.db_graph_parameters.main_node_name
+            db_manager.write_lock = lambda: graph_locks.hold_from_thread(label, loop)
+
+            await asyncio.to_thread(db_manager.update_db, ru_city_name)
+
+        if analysis_context.need_prepare_data:
+            cache_key = result_cache.key_for(analysis_context)
+            result = result_cache.get(cache_key)
+            if result is not None:
+                return result
+
+            result = await self._prepare_and_calculate(analysis_context)
+            result_cache.put(cache_key, analysis_context.db_graph_parameters.main_node_name, result)
+            return result
+
+    async def _prepare_and_calculate(self, analysis_context: AnalysisContext) -> dict:
+        projection_name = str(analysis_context.graph_name)
+        pinned = False
+        try:
+            async with graph_locks.hold(analysis_context.db_graph_parameters.main_node_name):
+                analysis_preparer = AsyncAnalysisPreparer(analysis_context)
+                await analysis_preparer.prepare()
+                # Проекция закрепляется до конца расчёта в обоих режимах: пока идут
+                # gds.*.write/stream и чтение рёбер для статистики, её не удалят
+                # ни вытеснение по бюджету, ни ensure после снятия блокировки
+                projection_manager.add_reader(projection_name)
+                pinned = True
+                # Размер выборки Betweenness зависит от числа узлов готовой проекции
+                metric_data_preparer = AsyncMetricClusterPreparer(analysis_context)
+                if not metric_data_preparer.stream:
+                    # gds.*.write пишет свойства в общие узлы метки
+                    return await metric_data_preparer.prepare_metrics()
+
+            # В потоковом режиме расчёт только читает проекцию
+            return await metric_data_preparer.prepare_metrics()
+        finally:
+            if pinned:
+                projection_manager.release_reader(projection_name)
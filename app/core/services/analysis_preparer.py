@@ -1,64 +1,131 @@
-from app.database.neo4j_connection import Neo4jConnection
+from app.database.neo4j_connection import AsyncNeo4jConnection, Neo4jConnection
 from app.core.context.analysis_context import AnalysisContext
+from app.core.services.projection_manager import projection_manager
+from app.core.services.result_cache import result_cache
+
+"""
+    Преобразования весов рёбер
+
+    Веса преобразуются при построении проекции GDS (Cypher-агрегация),
+    в самом графе ничего не записывается. В проекцию попадают все
+    преобразования сразу, а анализ выбирает нужное через
+    MetricCalculationContext.weight_transform.
+
+    Имя преобразования: (свойство в проекции, выражение над r, source, target).
+"""
+
+DEFAULT_WEIGHT_TRANSFORM = "log1p"
+
+WEIGHT_TRANSFORMS = {
+    "log1p": ("norm_{weight}", "log(1 + r.`{weight}`)"),
+    "inverse": ("inv_{weight}", "CASE WHEN r.`{weight}` > 0 THEN 1.0 / r.`{weight}` END"),
+    "raw": ("{weight}", "toFloat(r.`{weight}`)"),
+    "distance": ("distance", "point.distance(source.location, target.location)"),
+}
+
 
 class AnalysisPreparer:
-    def __init__(self, analysis_context: AnalysisContext):
-        self.connection = Neo4jConnection()
+    def __init__(self, analysis_context: AnalysisContext, connection=None):
+        self.connection = connection or Neo4jConnection()
         self.graph_db_parameters = analysis_context.db_graph_parameters
         self.graph_name = analysis_context.graph_name
+        self.weight_transform = analysis_context.metric_calculation_context.weight_transform
 
     def prepare(self):
         """Готовит данные графа к анализу.
 
-        Нормализует веса отношений и строит проекцию GDS
-        c использованием нормализованного свойства веса.
+        Строит проекцию GDS с преобразованными весами отношений и
+        переключает вес на выбранное преобразование. Проекция строится
+        один раз на версию графа и затем переиспользуется
+        (см. projection_manager).
         """
-        rel_name = self.graph_db_parameters.main_rels_name
         weight_prop = self.graph_db_parameters.weight
+        self._use_transformed_weight()
+        projection_manager.ensure(
+            self.connection, str(self.graph_name), self._graph_version(),
+            lambda: self._build_projection(weight_prop)
+        )
 
-        # Нормализация весов
-        normalize_query = f"""
-            MATCH ()-[r:`{rel_name}`]->()
-            WHERE r.{weight_prop} IS NOT NULL
-            SET r.norm_{weight_prop} = log(1 + r.{weight_prop})
-            RETURN count(r) AS normalized_count
-        """
+    def _build_projection(self, weight_prop) -> bool:
+        graph_project_query = self._projection_query(weight_prop)
         try:
-            self.connection.run(normalize_query)
+            self.connection.run(graph_project_query)
+            return True
         except Exception as e:
-            print(f"Warning: normalization query failed for {rel_name}.{weight_prop}: {e}")
+            print(f"Warning: GDS graph projection failed for {self.graph_name}: {e}")
+            return False
+
+    def _graph_version(self):
+        return result_cache.graph_version(self.graph_db_parameters.main_node_name)
 
-        # Используем нормализованное свойство для построения проекции GDS
-        normalized_prop = f"norm_{weight_prop}"
-        self.graph_db_parameters.weight = normalized_prop
+    def _use_transformed_weight(self):
+        """Переключает вес на свойство проекции выбранного преобразования."""
+        if self.weight_transform not in WEIGHT_TRANSFORMS:
+            raise ValueError(f"Unknown weight transform '{self.weight_transform}'.")
+
+        property_template, _ = WEIGHT_TRANSFORMS[self.weight_transform]
+        self.graph_db_parameters.weight = property_template.format(weight=self.graph_db_parameters.weight)
 
         if not self.graph_db_parameters.main_node_name or not self.graph_db_parameters.main_rels_name:
             raise ValueError("Graph parameters 'main_node_name' or 'main_rels_name' are not set.")
 
-        print(f"Preparing graph with nodes: {self.graph_db_parameters.main_node_name}, relationships: {rel_name}")
-        print(f"Normalized weight property: {normalized_prop}")
+    def _projection_query(self, weight_prop):
+        node_name = self.graph_db_parameters.main_node_name
+        rel_name = self.graph_db_parameters.main_rels_name
+
+        print(f"Preparing graph with nodes: {node_name}, relationships: {rel_name}")
+        print(f"Weight property: {self.graph_db_parameters.weight} ({self.weight_transform} of {weight_prop})")
 
-        graph_project_query = f"""
-            CALL gds.graph.project(
+        # Как в нативной проекции UNDIRECTED с aggregation: 'MIN' и defaultValue: 1.0:
+        # пара узлов упорядочивается, параллельные рёбра сводятся к минимуму
+        aggregates = ",\n                ".join(
+            f"min(coalesce({expression.format(weight=weight_prop)}, 1.0)) AS `{prop.format(weight=weight_prop)}`"
+            for prop, expression in WEIGHT_TRANSFORMS.values()
+        )
+        properties = ", ".join(
+            f"`{prop.format(weight=weight_prop)}`: `{prop.format(weight=weight_prop)}`"
+            for prop, _ in WEIGHT_TRANSFORMS.values()
+        )
+
+        return f"""
+            MATCH (u:`{node_name}`)
+            OPTIONAL MATCH (u)-[r:`{rel_name}`]->(v:`{node_name}`)
+            WITH
+                CASE WHEN v IS NULL OR elementId(u) <= elementId(v) THEN u ELSE v END AS source,
+                CASE WHEN v IS NULL OR elementId(u) <= elementId(v) THEN v ELSE u END AS target,
+                r
+            WITH source, target,
+                {aggregates}
+            WITH gds.graph.project(
                 '{self.graph_name}',
-                '{self.graph_db_parameters.main_node_name}',
-                {{
-                    {rel_name}: {{
-                        orientation: 'UNDIRECTED',
-                        properties: {{
-                            {normalized_prop}: {{
-                                property: '{normalized_prop}',
-                                defaultValue: 1.0,
-                                aggregation: 'MIN'
-                            }}
-                        }}
-                    }}
-                }}
-            )
+                source,
+                target,
+                {{relationshipProperties: CASE WHEN target IS NULL THEN null ELSE {{{properties}}} END}},
+                {{undirectedRelationshipTypes: ['*']}}
+            ) AS g
+            RETURN g.graphName AS graphName, g.nodeCount AS nodeCount, g.relationshipCount AS relationshipCount
         """
+
+
+class AsyncAnalysisPreparer(AnalysisPreparer):
+    """AnalysisPreparer, выполняющий запросы через AsyncNeo4jConnection."""
+
+    def __init__(self, analysis_context: AnalysisContext):
+        super().__init__(analysis_context, AsyncNeo4jConnection())
+
+    async def prepare(self):
+        weight_prop = self.graph_db_parameters.weight
+        self._use_transformed_weight()
+        await projection_manager.ensure_async(
+            self.connection, str(self.graph_name), self._graph_version(),
+            lambda: self._build_projection_async(weight_prop)
+        )
+
+    async def _build_projection_async(self, weight_prop) -> bool:
+        graph_project_query = self._projection_query(weight_prop)
         try:
-            print(f"Graph projection query: {graph_project_query}")
-            print(f"Graph parameters: {self.graph_db_parameters}")
-            self.connection.run(graph_project_query)
+            await self.connection.run(graph_project_query)
+            return True
         except Exception as e:
             print(f"Warning: GDS graph projection failed for {self.graph_name}: {e}")
+            return False
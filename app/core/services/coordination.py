@@ -0,0 +1,108 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+"""
+    Согласование одновременных анализов
+
+    SingleFlight объединяет одинаковые одновременные запросы: первый
+    запускает расчёт, остальные ждут его результат (или исключение).
+    Расчёт идёт в отдельной задаче, поэтому отключение первого клиента
+    не отменяет его для остальных.
+
+    GraphLocks — блокировки по метке графа в Neo4j. Под ними идут операции,
+    которые меняют граф или его проекции (загрузка, построение проекции,
+    запись метрик в узлы), чтобы параллельные анализы одного города
+    не мешали друг другу. Время ожидания блокировок учитывается в stats().
+    hold_from_thread берёт ту же блокировку из рабочего потока (например,
+    на время записи внутри update_db, выполняемого через asyncio.to_thread).
+"""
+
+
+class SingleFlight:
+    """Одно выполнение на ключ среди одновременных вызовов."""
+
+    def __init__(self):
+        self._inflight = {}
+        self.started = 0
+        self.shared = 0
+
+    async def run(self, key, func, *args, **kwargs):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+            self.started += 1
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def _finished(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Исключение получают ожидающие; если их не осталось, не шумим в лог
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._inflight),
+            "started": self.started,
+            "shared": self.shared,
+        }
+
+
+class GraphLocks:
+    """asyncio.Lock на каждый ключ; блокировка удаляется, когда не нужна."""
+
+    def __init__(self):
+        self._locks = {}
+        self.acquired = 0
+        self.contended = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    @asynccontextmanager
+    async def hold(self, key):
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = {"lock": asyncio.Lock(), "users": 0}
+        entry["users"] += 1
+        try:
+            if entry["lock"].locked():
+                self.contended += 1
+            queued_at = time.monotonic()
+            async with entry["lock"]:
+                waited = time.monotonic() - queued_at
+                self.acquired += 1
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+                yield
+        finally:
+            entry["users"] -= 1
+            if entry["users"] == 0 and self._locks.get(key) is entry:
+                del self._locks[key]
+
+    @contextmanager
+    def hold_from_thread(self, key, loop):
+        """Синхронный hold для рабочего потока; блокировка берётся в цикле `loop`."""
+        holder = self.hold(key)
+        asyncio.run_coroutine_threadsafe(holder.__aenter__(), loop).result()
+        try:
+            yield
+        finally:
+            asyncio.run_coroutine_threadsafe(holder.__aexit__(None, None, None), loop).result()
+
+    def stats(self) -> dict:
+        return {
+            "held_or_waiting": sum(entry["users"] for entry in self._locks.values()),
+            "acquired": self.acquired,
+            "contended": self.contended,
+            "avg_wait_seconds": round(self.wait_seconds_total / self.acquired, 3) if self.acquired else 0.0,
+            "max_wait_seconds": round(self.wait_seconds_max, 3),
+        }
+
+
+analysis_flights = SingleFlight()
+graph_locks = GraphLocks()
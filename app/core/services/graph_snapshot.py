@@ -0,0 +1,212 @@
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+"""
+    Снимок графа города в колоночном виде (.npy), открываемый через mmap
+
+    Снимок хранится в cache/snapshots/<город>/<транспорт>/<версия>/, файл
+    current.json указывает на актуальную версию. Версия — отпечаток кеша
+    маршрутов (RouteStore.version), поэтому снимок пересобирается только
+    при изменении индекса или записей маршрутов.
+"""
+
+SNAPSHOT_FORMAT = 2
+CURRENT_FILE = "current.json"
+
+NODE_KEYS = {"name", "routeList", "xCoordinate", "yCoordinate", "isCoordinateApproximate"}
+RELATIONSHIP_KEYS = {"startStop", "endStop", "name", "route", "duration"}
+
+ARRAYS = (
+    "strings",
+    "node_name",
+    "node_x",
+    "node_y",
+    "node_approx",
+    "node_route_offsets",
+    "node_routes",
+    "rel_start",
+    "rel_end",
+    "rel_route",
+    "rel_duration",
+)
+
+
+def relationship_name(start, end, route):
+    """Имя связи в формате парсера."""
+    return f"{start} -> {end}; route_name: {route}"
+
+
+class GraphSnapshot:
+    """Колоночное представление узлов и связей графа.
+
+    Строки (названия остановок и номера маршрутов) хранятся один раз в
+    массиве `strings`, остальные массивы ссылаются на них индексами.
+    Маршруты узла — срез node_routes[node_route_offsets[i]:node_route_offsets[i + 1]].
+    """
+
+    def __init__(self, arrays, meta):
+        self.arrays = arrays
+        self.meta = meta
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__["arrays"][name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    @property
+    def version(self):
+        return self.meta["version"]
+
+    @classmethod
+    def from_graph(cls, nodes, relationships, version, oldest_fetched_at):
+        """Строит снимок из результата парсинга.
+
+        Возвращает None, если данные не укладываются в колоночную схему
+        (лишние ключи, нечисловые координаты, нестандартные имена связей).
+        """
+        strings = {}
+
+        def intern(value):
+            index = strings.get(value)
+            if index is None:
+                index = strings[value] = len(strings)
+            return index
+
+        node_name, node_x, node_y, node_approx = [], [], [], []
+        offsets, node_routes = [0], []
+        for key, node in nodes.items():
+            if set(node) != NODE_KEYS or node["name"] != key:
+                return None
+            if not all(
+                type(node[axis]) in (int, float) for axis in ("xCoordinate", "yCoordinate")
+            ) or not isinstance(node["isCoordinateApproximate"], bool):
+                return None
+            node_name.append(intern(key))
+            node_x.append(node["xCoordinate"])
+            node_y.append(node["yCoordinate"])
+            node_approx.append(node["isCoordinateApproximate"])
+            node_routes.extend(intern(route) for route in node["routeList"])
+            offsets.append(len(node_routes))
+
+        rel_start, rel_end, rel_route, rel_duration = [], [], [], []
+        for rel in relationships:
+            if set(rel) != RELATIONSHIP_KEYS or type(rel["duration"]) is not int:
+                return None
+            if rel["name"] != relationship_name(rel["startStop"], rel["endStop"], rel["route"]):
+                return None
+            rel_start.append(intern(rel["startStop"]))
+            rel_end.append(intern(rel["endStop"]))
+            rel_route.append(intern(rel["route"]))
+            rel_duration.append(rel["duration"])
+
+        arrays = {
+            "strings": np.array(list(strings), dtype=str) if strings else np.array([], dtype="<U1"),
+            "node_name": np.array(node_name, dtype=np.int32),
+            "node_x": np.array(node_x, dtype=np.float64),
+            "node_y": np.array(node_y, dtype=np.float64),
+            "node_approx": np.array(node_approx, dtype=bool),
+            "node_route_offsets": np.array(offsets, dtype=np.int64),
+            "node_routes": np.array(node_routes, dtype=np.int32),
+            "rel_start": np.array(rel_start, dtype=np.int32),
+            "rel_end": np.array(rel_end, dtype=np.int32),
+            "rel_route": np.array(rel_route, dtype=np.int32),
+            "rel_duration": np.array(rel_duration, dtype=np.int64),
+        }
+        meta = {
+            "format": SNAPSHOT_FORMAT,
+            "version": version,
+            "oldestFetchedAt": oldest_fetched_at,
+            "nodes": len(node_name),
+            "relationships": len(rel_start),
+        }
+        return cls(arrays, meta)
+
+    def to_graph(self):
+        """Восстанавливает словарь узлов и список связей в формате парсера."""
+        strings = self.strings.tolist()
+        names = [strings[i] for i in self.node_name.tolist()]
+        xs, ys = self.node_x.tolist(), self.node_y.tolist()
+        approx = self.node_approx.tolist()
+        offsets = self.node_route_offsets.tolist()
+        routes = [strings[i] for i in self.node_routes.tolist()]
+
+        nodes = {}
+        for i, name in enumerate(names):
+            nodes[name] = {
+                "name": name,
+                "routeList": routes[offsets[i]:offsets[i + 1]],
+                "xCoordinate": xs[i],
+                "yCoordinate": ys[i],
+                "isCoordinateApproximate": approx[i],
+            }
+
+        relationships = []
+        for start, end, route, duration in zip(
+            self.rel_start.tolist(),
+            self.rel_end.tolist(),
+            self.rel_route.tolist(),
+            self.rel_duration.tolist(),
+        ):
+            start, end, route = strings[start], strings[end], strings[route]
+            relationships.append(
+                {
+                    "startStop": start,
+                    "endStop": end,
+                    "name": relationship_name(start, end, route),
+                    "route": route,
+                    "duration": duration,
+                }
+            )
+        return nodes, relationships
+
+    # === Storage ===
+    def save(self, snapshot_dir):
+        """Записывает снимок в новую версию и атомарно переключает current.json."""
+        os.makedirs(snapshot_dir, exist_ok=True)
+        version_dir = tempfile.mkdtemp(dir=snapshot_dir, prefix=f"{self.version[:12]}-")
+        for name in ARRAYS:
+            np.save(os.path.join(version_dir, f"{name}.npy"), self.arrays[name])
+        with open(os.path.join(version_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+
+        current = {"dir": os.path.basename(version_dir), "version": self.version}
+        fd, tmp_path = tempfile.mkstemp(dir=snapshot_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(current, f)
+        os.replace(tmp_path, os.path.join(snapshot_dir, CURRENT_FILE))
+
+        # Уже открытые через mmap файлы старых версий остаются доступны
+        for entry in os.listdir(snapshot_dir):
+            path = os.path.join(snapshot_dir, entry)
+            if entry != current["dir"] and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    @classmethod
+    def load(cls, snapshot_dir, version=None):
+        """Открывает актуальный снимок через mmap.
+
+        Возвращает None, если снимка нет, он другого формата или его версия
+        не совпадает с `version`.
+        """
+        try:
+            with open(os.path.join(snapshot_dir, CURRENT_FILE), "r", encoding="utf-8") as f:
+                current = json.load(f)
+            if version is not None and current["version"] != version:
+                return None
+            version_dir = os.path.join(snapshot_dir, current["dir"])
+            with open(os.path.join(version_dir, "meta.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("format") != SNAPSHOT_FORMAT:
+                return None
+            arrays = {
+                name: np.load(os.path.join(version_dir, f"{name}.npy"), mmap_mode="r")
+                for name in ARRAYS
+            }
+        except (OSError, ValueError, KeyError):
+            return None
+        return cls(arrays, meta)
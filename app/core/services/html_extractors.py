@@ -0,0 +1,462 @@
+import os
+import re
+from abc import ABC, abstractmethod
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup
+
+"""
+    Бэкенды извлечения данных из HTML-страниц kudikina.ru
+
+    BeautifulSoupExtractor строит полное дерево документа (эталонная
+    реализация). StreamingExtractor разбирает страницу потоково на
+    html.parser без построения дерева, а координаты ищет регулярным
+    выражением прямо в тексте страницы; результаты обоих бэкендов совпадают.
+"""
+
+COORDINATE_PATTERN = re.compile(
+    r'{"name":\s*"(.*?)",\s*"lat":\s*(-?\d+\.?\d*),\s*"long":\s*(-?\d+\.?\d*)}'
+)
+STOP_NUMBER_PATTERN = re.compile(r"\d+\) ")
+# Комментарии в той же альтернативе: закомментированный <script> не считается скриптом
+SCRIPT_PATTERN = re.compile(
+    r"<!--.*?(?:-->|$)|<script\b([^>]*)>(.*?)</script\s*>", re.IGNORECASE | re.DOTALL
+)
+SCRIPT_TYPE_PATTERN = re.compile(r"""\btype\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""", re.IGNORECASE)
+
+# Теги без закрывающей пары — их BeautifulSoup не держит открытыми
+VOID_TAGS = {
+    "area", "base", "basefont", "bgsound", "br", "col", "command", "embed",
+    "frame", "hr", "image", "img", "input", "isindex", "keygen", "link",
+    "menuitem", "meta", "nextid", "param", "source", "spacer", "track", "wbr",
+}
+# Текст внутри этих тегов BeautifulSoup не включает в .text
+NON_TEXT_TAGS = {"script", "style", "template"}
+
+
+class HtmlExtractor(ABC):
+    """Интерфейс извлечения маршрутов, расписаний, координат и городов."""
+
+    name = None
+
+    @abstractmethod
+    def route_links(self, html, transport_class):  # pragma: no cover
+        """Возвращает [[номер, название, href], ...] из списка маршрутов."""
+
+    @abstractmethod
+    def timetable(self, html):  # pragma: no cover
+        """Возвращает [{"stopName", "timePoint"}, ...] одного направления."""
+
+    @abstractmethod
+    def stop_coordinates(self, html):  # pragma: no cover
+        """Возвращает {название: (долгота, широта)} из скрипта drawMap."""
+
+    @abstractmethod
+    def city_blocks(self, html, list_class):  # pragma: no cover
+        """Возвращает ссылки городов [[(название, href), ...], ...] по блокам `ul`."""
+
+
+class BeautifulSoupExtractor(HtmlExtractor):
+    """Эталонный бэкенд на полном дереве BeautifulSoup."""
+
+    name = "bs4"
+
+    def route_links(self, html, transport_class):
+        soup = BeautifulSoup(html, "html.parser")
+        items = soup.find_all("a", class_=transport_class)
+        return [[i.text.strip(), i.find("span").text.strip(), i["href"]] for i in items]
+
+    def timetable(self, html):
+        soup = BeautifulSoup(html, "html.parser")
+        stops = []
+        for s in soup.find_all("div", class_="bus-stop"):
+            name_tag = s.find("a")
+            next_div = s.find_next_sibling("div", class_="col-xs-12")
+            time_tag = next_div.find("span") if next_div else None
+            if not name_tag or not time_tag:
+                continue
+            name = STOP_NUMBER_PATTERN.sub("", name_tag.text.strip())
+            stops.append(
+                {"stopName": name, "timePoint": time_tag.text.strip().rstrip("K")}
+            )
+        return stops
+
+    def stop_coordinates(self, html):
+        soup = BeautifulSoup(html, "html.parser")
+        script_tag = next(
+            (
+                s
+                for s in soup.find_all("script", type="text/javascript")
+                if "drawMap" in s.text
+            ),
+            None,
+        )
+        if not script_tag:
+            return {}
+        return _coordinates_from_script(script_tag.text)
+
+    def city_blocks(self, html, list_class):
+        soup = BeautifulSoup(html, "html.parser")
+        return [
+            [
+                (a.find("span", class_="city-name").text.strip(), a["href"])
+                for a in ul.find_all("a")
+            ]
+            for ul in soup.find_all("ul", class_=list_class)
+        ]
+
+
+class StreamingExtractor(HtmlExtractor):
+    """Быстрый бэкенд: потоковый разбор без дерева и regex для координат."""
+
+    name = "streaming"
+
+    def route_links(self, html, transport_class):
+        scanner = _RouteLinkScanner(transport_class)
+        scanner.run(html)
+        return scanner.routes
+
+    def timetable(self, html):
+        scanner = _TimetableScanner()
+        scanner.run(html)
+        return scanner.stops()
+
+    def stop_coordinates(self, html):
+        if isinstance(html, bytes):
+            html = html.decode("utf-8", errors="replace")
+        for match in SCRIPT_PATTERN.finditer(html):
+            attrs, body = match.groups()
+            if body is not None and _script_type(attrs) == "text/javascript" and "drawMap" in body:
+                return _coordinates_from_script(body)
+        return {}
+
+    def city_blocks(self, html, list_class):
+        scanner = _CityBlockScanner(list_class)
+        scanner.run(html)
+        return scanner.blocks
+
+
+EXTRACTORS = {
+    BeautifulSoupExtractor.name: BeautifulSoupExtractor,
+    StreamingExtractor.name: StreamingExtractor,
+}
+DEFAULT_EXTRACTOR = os.environ.get("HTML_EXTRACTOR", StreamingExtractor.name)
+
+
+def get_extractor(name=None):
+    """Возвращает экземпляр бэкенда по имени (`bs4` или `streaming`)."""
+    name = name or DEFAULT_EXTRACTOR
+    try:
+        return EXTRACTORS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown HTML extractor: {name}") from None
+
+
+def extract_route_pages(extractor, forward_html, backward_html, map_html):
+    """Стадия разбора страниц маршрута, не зависящая от состояния парсера.
+
+    Принимает бэкенд (экземпляр или имя — для запуска в ProcessPoolExecutor)
+    и HTML расписаний A/B и карты (None — страница не загружена).
+    Возвращает (timetable, coordinates): объединённое расписание обоих
+    направлений или None, если оно пустое, и {название: (долгота, широта)}.
+    """
+    if isinstance(extractor, str):
+        extractor = get_extractor(extractor)
+
+    directions = [
+        extractor.timetable(html)
+        for html in (forward_html, backward_html)
+        if html is not None
+    ]
+    timetable = [row for rows in directions for row in rows] or None
+    coordinates = extractor.stop_coordinates(map_html) if map_html is not None else {}
+    return timetable, coordinates
+
+
+# === Helpers ===
+def _coordinates_from_script(text):
+    """Достаёт координаты остановок из текста скрипта drawMap."""
+    return {
+        m[0].replace("\\", ""): (float(m[2]), float(m[1]))
+        for m in COORDINATE_PATTERN.findall(text)
+    }
+
+
+def _script_type(attrs):
+    """Значение атрибута type тега script (последнее, как у BeautifulSoup)."""
+    matches = SCRIPT_TYPE_PATTERN.findall(attrs)
+    if not matches:
+        return None
+    return next((v for v in matches[-1] if v), "")
+
+
+def _has_class(attrs, wanted):
+    """Совпадение class по правилам BeautifulSoup.
+
+    Одиночное имя ищется среди классов элемента, а строка с пробелами
+    сравнивается со всем значением атрибута целиком.
+    """
+    value = attrs.get("class")
+    if value is None:
+        return False
+    classes = value.split()
+    return wanted in classes or " ".join(classes) == wanted
+
+
+class _Element:
+    """Открытый элемент в стеке потокового разбора."""
+
+    __slots__ = ("tag", "attrs", "parent")
+
+    def __init__(self, tag, attrs, parent):
+        self.tag = tag
+        self.attrs = attrs
+        self.parent = parent
+
+
+class _TextCapture:
+    """Накапливает текст всех потомков элемента до его закрытия."""
+
+    __slots__ = ("element", "parts")
+
+    def __init__(self, element):
+        self.element = element
+        self.parts = []
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+
+class _StreamScanner(HTMLParser):
+    """Базовый потоковый сканер, повторяющий модель вложенности BeautifulSoup.
+
+    Закрывающий тег снимает со стека все элементы до ближайшего открытого
+    элемента с тем же именем; закрывающие теги без пары игнорируются.
+    Текст script/style/template и комментарии в собранный текст не попадают.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack = []
+        self.captures = []  # активные сборщики текста
+        self._non_text_depth = 0  # открытых script/style/template
+
+    def run(self, html):
+        if isinstance(html, bytes):
+            html = html.decode("utf-8", errors="replace")
+        self.feed(html)
+        self.close()
+        while self.stack:
+            self._pop()
+
+    def capture(self, element):
+        """Начинает сбор текста элемента."""
+        capture = _TextCapture(element)
+        self.captures.append(capture)
+        return capture
+
+    # --- HTMLParser callbacks ---
+    def handle_starttag(self, tag, attrs):
+        parent = self.stack[-1] if self.stack else None
+        element = _Element(tag, {k: v if v is not None else "" for k, v in attrs}, parent)
+        self.on_start(element)
+        if tag in VOID_TAGS:
+            self.on_end(element)
+        else:
+            self.stack.append(element)
+            if tag in NON_TEXT_TAGS:
+                self._non_text_depth += 1
+
+    def handle_startendtag(self, tag, attrs):
+        parent = self.stack[-1] if self.stack else None
+        element = _Element(tag, {k: v if v is not None else "" for k, v in attrs}, parent)
+        self.on_start(element)
+        self.on_end(element)
+
+    def handle_endtag(self, tag):
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i].tag == tag:
+                while len(self.stack) > i:
+                    self._pop()
+                return
+
+    def handle_data(self, data):
+        if self._non_text_depth:
+            return
+        for capture in self.captures:
+            capture.parts.append(data)
+
+    def _pop(self):
+        element = self.stack.pop()
+        if element.tag in NON_TEXT_TAGS:
+            self._non_text_depth -= 1
+        if self.captures:
+            self.captures = [c for c in self.captures if c.element is not element]
+        self.on_end(element)
+
+    # --- hooks ---
+    def on_start(self, element):  # pragma: no cover
+        pass
+
+    def on_end(self, element):  # pragma: no cover
+        pass
+
+
+class _RouteLinkScanner(_StreamScanner):
+    """Собирает ссылки маршрутов `a.<transport_class>` и их `span`."""
+
+    def __init__(self, transport_class):
+        super().__init__()
+        self.transport_class = transport_class
+        self.routes = []
+        self._open = []
+
+    def on_start(self, element):
+        for link in self._open:
+            if link["span"] is None and element.tag == "span":
+                link["span"] = self.capture(element)
+        if element.tag == "a" and _has_class(element.attrs, self.transport_class):
+            link = {
+                "element": element,
+                "text": self.capture(element),
+                "span": None,
+                "href": element.attrs.get("href"),
+            }
+            self._open.append(link)
+            self.routes.append(link)
+
+    def on_end(self, element):
+        self._open = [link for link in self._open if link["element"] is not element]
+
+    def run(self, html):
+        super().run(html)
+        self.routes = [
+            [link["text"].text.strip(), link["span"].text.strip(), link["href"]]
+            for link in self.routes
+        ]
+
+
+class _TimetableScanner(_StreamScanner):
+    """Сопоставляет `div.bus-stop` с ближайшим соседним `div.col-xs-12`."""
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self._inside = []  # div.bus-stop, внутри которых сейчас разбор
+        self._waiting = []  # закрытые div.bus-stop без найденного соседа
+        self._time_divs = []  # открытые div.col-xs-12 с привязанными записями
+
+    def on_start(self, element):
+        if element.tag == "a":
+            for record in self._inside:
+                if record["name"] is None:
+                    record["name"] = self.capture(element)
+
+        if element.tag == "span":
+            for time_div in self._time_divs:
+                if time_div["span"] is None:
+                    time_div["span"] = self.capture(element)
+
+        if element.tag == "div" and _has_class(element.attrs, "col-xs-12"):
+            bound = [r for r in self._waiting if r["element"].parent is element.parent]
+            if bound:
+                self._waiting = [r for r in self._waiting if r not in bound]
+                time_div = {"element": element, "span": None, "records": bound}
+                for record in bound:
+                    record["time_div"] = time_div
+                self._time_divs.append(time_div)
+
+        if element.tag == "div" and _has_class(element.attrs, "bus-stop"):
+            record = {"element": element, "name": None, "time_div": None}
+            self.records.append(record)
+            self._inside.append(record)
+
+    def on_end(self, element):
+        closed = [r for r in self._inside if r["element"] is element]
+        if closed:
+            self._inside = [r for r in self._inside if r["element"] is not element]
+            self._waiting.extend(closed)
+        self._time_divs = [t for t in self._time_divs if t["element"] is not element]
+        # Сосед ищется только среди детей того же родителя
+        self._waiting = [r for r in self._waiting if r["element"].parent is not element]
+
+    def stops(self):
+        stops = []
+        for record in self.records:
+            time_div = record["time_div"]
+            if record["name"] is None or time_div is None or time_div["span"] is None:
+                continue
+            name = STOP_NUMBER_PATTERN.sub("", record["name"].text.strip())
+            time_text = time_div["span"].text.strip().rstrip("K")
+            stops.append({"stopName": name, "timePoint": time_text})
+        return stops
+
+
+class _CityBlockScanner(_StreamScanner):
+    """Собирает ссылки городов из блоков `ul.<list_class>`."""
+
+    def __init__(self, list_class):
+        super().__init__()
+        self.list_class = list_class
+        self._blocks = []
+        self._open_blocks = []
+        self._open_links = []
+
+    def on_start(self, element):
+        if element.tag == "span" and _has_class(element.attrs, "city-name"):
+            for link in self._open_links:
+                if link["name"] is None:
+                    link["name"] = self.capture(element)
+        if element.tag == "a":
+            for block in self._open_blocks:
+                link = {"element": element, "name": None, "href": element.attrs.get("href")}
+                block["links"].append(link)
+                self._open_links.append(link)
+        if element.tag == "ul" and _has_class(element.attrs, self.list_class):
+            block = {"element": element, "links": []}
+            self._blocks.append(block)
+            self._open_blocks.append(block)
+
+    def on_end(self, element):
+        self._open_blocks = [b for b in self._open_blocks if b["element"] is not element]
+        self._open_links = [l for l in self._open_links if l["element"] is not element]
+
+    @property
+    def blocks(self):
+        return [
+            [(link["name"].text.strip(), link["href"]) for link in block["links"] if link["name"]]
+            for block in self._blocks
+        ]
+
+
+def compare_backends(pages, reference=None, candidate=None):
+    """Сравнивает бэкенды на страницах расписаний и карт.
+
+    :param pages: итерируемые пары (url, html)
+    :return: список url, на которых результаты бэкендов различаются
+    """
+    reference = reference or BeautifulSoupExtractor()
+    candidate = candidate or StreamingExtractor()
+    mismatches = []
+    for url, html in pages:
+        if url.endswith("/map"):
+            same = reference.stop_coordinates(html) == candidate.stop_coordinates(html)
+        elif url.endswith(("/A", "/B")):
+            same = reference.timetable(html) == candidate.timetable(html)
+        else:
+            continue
+        if not same:
+            mismatches.append(url)
+    return mismatches
+
+
+if __name__ == "__main__":
+    # Проверка совпадения бэкендов на всех страницах из http_cache
+    from app.core.services.parsers import session
+
+    cached_pages = ((r.url, r.text) for r in session.cache.responses.values())
+    diff = compare_backends(cached_pages)
+    print(f"[INFO] Extractor mismatches: {len(diff)}")
+    for url in diff:
+        print(f"[WARN] {url}")
@@ -0,0 +1,339 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Dict, Optional
+from uuid import UUID
+
+from app.core.context.analysis_context import AnalysisContext
+from app.core.context.metric_calculation_context import MetricCalculationContext
+from app.core.services.analysis_executor import AnalysisQueueFull, ingest_executor
+from app.core.services.analysis_manager import AnalysisManager
+from app.core.storage import active_datasets
+from app.database.postgres import postgres_manager
+from app.models.graph_types import GraphTypes
+
+"""
+    Фоновые задачи загрузки датасетов
+
+    POST /datasets/ создаёт задачу и сразу возвращает её id, а парсинг и
+    запись графа идут в фоне через ingest_executor — отдельную от анализов
+    очередь (INGEST_MAX_CONCURRENCY, INGEST_MAX_QUEUE). Ход загрузки
+    (маршруты в индексе, загруженные из сети, взятые из кеша, записанные
+    в БД и неудачные) доступен опросом или потоком SSE. Состояние задач
+    хранится в таблице ingest_jobs: после перезапуска незавершённые задачи
+    запускаются заново (загрузка продолжится с контрольных точек и кеша
+    маршрутов) или, при INGEST_RESUME_ON_START=0, помечаются прерванными.
+"""
+
+INGEST_RESUME_ON_START = os.environ.get("INGEST_RESUME_ON_START", "1") == "1"
+PROGRESS_PERSIST_SECONDS = 2.0
+# Сколько завершённых задач держать в памяти для опроса; остальные читаются из PostgreSQL
+FINISHED_JOBS_KEPT = 256
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+INTERRUPTED = "interrupted"
+FINISHED_STATUSES = (COMPLETED, FAILED, INTERRUPTED)
+
+PROGRESS_EVENTS = ("total", "fetched", "cached", "written", "failed")
+
+TRANSPORT_TO_GRAPH = {
+    "bus": GraphTypes.BUS_GRAPH,
+    "tram": GraphTypes.TRAM_GRAPH,
+    "trolleybus": GraphTypes.TROLLEY_GRAPH,
+    "minibus": GraphTypes.MINIBUS_GRAPH,
+}
+
+
+class IngestJob:
+    """Состояние одной задачи загрузки датасета."""
+
+    def __init__(self, job_id: UUID, dataset_id: UUID, city: str, transport_type: str, name: str,
+                 user_id: Optional[UUID] = None, guest_token: Optional[str] = None,
+                 status: str = QUEUED, progress: Optional[dict] = None, error: Optional[str] = None):
+        self.id = job_id
+        self.dataset_id = dataset_id
+        self.city = city
+        self.transport_type = transport_type
+        self.name = name
+        self.user_id = user_id
+        self.guest_token = guest_token
+        self.status = status
+        self.progress = {event: 0 for event in PROGRESS_EVENTS}
+        self.progress.update(progress or {})
+        self.error = error
+        self.persisted_at = 0.0
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def owned_by(self, user_ctx) -> bool:
+        if user_ctx.type == "user":
+            return self.user_id == user_ctx.user_id
+        if user_ctx.type == "guest":
+            return self.guest_token == user_ctx.guest_token
+        return self.user_id is None and self.guest_token is None
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "dataset_id": self.dataset_id,
+            "city": self.city,
+            "transport_type": self.transport_type,
+            "status": self.status,
+            "progress": dict(self.progress),
+            "error": self.error,
+        }
+
+    @classmethod
+    def from_row(cls, row) -> "IngestJob":
+        progress = row["progress"]
+        if isinstance(progress, str):
+            progress = json.loads(progress)
+        return cls(
+            row["id"], row["dataset_id"], row["city"], row["transport_type"], row["name"],
+            user_id=row["user_id"], guest_token=row["guest_token"],
+            status=row["status"], progress=progress, error=row["error"],
+        )
+
+
+class IngestJobManager:
+    """Запускает задачи загрузки, хранит их состояние и рассылает обновления.
+
+    Прогресс приходит из потока, где идёт update_db, и переносится в цикл
+    событий через call_soon_threadsafe; подписчики SSE получают снимки
+    состояния через свои asyncio.Queue.
+    """
+
+    def __init__(self, postgres=postgres_manager, executor=ingest_executor,
+                 persist_interval: float = PROGRESS_PERSIST_SECONDS):
+        self.postgres = postgres
+        self.executor = executor
+        self.persist_interval = persist_interval
+        self.jobs: Dict[UUID, IngestJob] = {}
+        self._finished = deque()
+        self._subscribers: Dict[UUID, set] = {}
+        self._tasks = set()
+        self._lock = threading.Lock()
+
+    # -------------------- Запуск --------------------
+
+    async def submit(self, city: str, transport_type: str, name: str,
+                     user_id: Optional[UUID] = None, guest_token: Optional[str] = None) -> IngestJob:
+        """Создаёт задачу загрузки и запускает её в фоне."""
+        job = IngestJob(uuid.uuid4(), uuid.uuid4(), city, transport_type, name, user_id, guest_token)
+        self.jobs[job.id] = job
+        await self._insert(job)
+        self._start(job)
+        return job
+
+    def find_active(self, city: str, transport_type: str, user_ctx) -> Optional[IngestJob]:
+        """Незавершённая задача того же владельца для того же города и транспорта."""
+        for job in self.jobs.values():
+            if not job.finished and job.city == city and job.transport_type == transport_type and job.owned_by(user_ctx):
+                return job
+        return None
+
+    async def restore(self):
+        """Перезапускает или помечает прерванными задачи, не завершённые до остановки."""
+        rows = await self._fetch(
+            "SELECT * FROM ingest_jobs WHERE status = ANY($1::text[])", [QUEUED, RUNNING]
+        )
+        for row in rows or []:
+            job = IngestJob.from_row(row)
+            if INGEST_RESUME_ON_START:
+                job.status = QUEUED
+                job.progress = {event: 0 for event in PROGRESS_EVENTS}
+                self.jobs[job.id] = job
+                await self._persist(job)
+                self._start(job)
+                print(f"[INFO] Resuming ingest job {job.id} for {job.city} ({job.transport_type})")
+            else:
+                job.status = INTERRUPTED
+                job.error = "Interrupted by server restart"
+                await self._persist(job)
+                print(f"[WARN] Ingest job {job.id} for {job.city} marked as interrupted")
+
+    def _start(self, job: IngestJob):
+        task = asyncio.get_running_loop().create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job: IngestJob):
+        analysis_context = AnalysisContext(
+            city_name=job.city,
+            graph_name=job.dataset_id,
+            graph_type=TRANSPORT_TO_GRAPH[job.transport_type],
+            metric_calculation_context=MetricCalculationContext(),
+            need_create_graph=True
+        )
+        try:
+            while True:
+                try:
+                    await self.executor.run(self._ingest, job, analysis_context)
+                    break
+                except AnalysisQueueFull as e:
+                    await asyncio.sleep(e.retry_after)
+            await self._register_dataset(job, analysis_context)
+            await self._set_status(job, COMPLETED)
+        except Exception as e:
+            print(f"[ERROR] Ingest job {job.id} failed: {e}")
+            await self._set_status(job, FAILED, str(e))
+
+    async def _ingest(self, job: IngestJob, analysis_context: AnalysisContext):
+        await self._set_status(job, RUNNING)
+        loop = asyncio.get_running_loop()
+
+        def on_progress(event, count):
+            with self._lock:
+                if event == "total":
+                    job.progress[event] = count
+                else:
+                    job.progress[event] = job.progress.get(event, 0) + count
+            loop.call_soon_threadsafe(self._progress_changed, job)
+
+        await AnalysisManager().process_async(analysis_context, on_progress=on_progress)
+
+    async def _register_dataset(self, job: IngestJob, analysis_context: AnalysisContext):
+        """Публикует готовый датасет так же, как раньше это делал POST /datasets/."""
+        active_datasets[job.dataset_id] = {
+            "name": job.name,
+            "city_name": job.city,
+            "transport_type": job.transport_type,
+            "analysis_context": analysis_context,
+            "user_id": job.user_id,
+            "guest_token": job.guest_token,
+        }
+        if job.user_id is not None:
+            await self._execute(
+                "INSERT INTO datasets (id, user_id, city, transport_type, name) VALUES ($1, $2, $3, $4, $5)",
+                job.dataset_id, job.user_id, job.city, job.transport_type, job.name,
+                required=True
+            )
+
+    # -------------------- Состояние --------------------
+
+    async def get(self, job_id: UUID) -> Optional[IngestJob]:
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job
+        rows = await self._fetch("SELECT * FROM ingest_jobs WHERE id = $1", job_id)
+        return IngestJob.from_row(rows[0]) if rows else None
+
+    async def _set_status(self, job: IngestJob, status: str, error: Optional[str] = None):
+        job.status = status
+        job.error = error
+        self._notify(job)
+        await self._persist(job)
+        if job.finished:
+            self._forget_finished(job)
+
+    def _forget_finished(self, job: IngestJob):
+        """Оставляет в памяти только последние FINISHED_JOBS_KEPT завершённых задач."""
+        self._finished.append(job.id)
+        while len(self._finished) > FINISHED_JOBS_KEPT:
+            self.jobs.pop(self._finished.popleft(), None)
+
+    def _progress_changed(self, job: IngestJob):
+        self._notify(job)
+        if time.monotonic() - job.persisted_at >= self.persist_interval:
+            task = asyncio.get_running_loop().create_task(self._persist_progress(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def subscribe(self, job: IngestJob):
+        """Асинхронный генератор снимков состояния задачи до её завершения."""
+        updates = asyncio.Queue()
+        self._subscribers.setdefault(job.id, set()).add(updates)
+        try:
+            snapshot = job.to_dict()
+            while True:
+                yield snapshot
+                if snapshot["status"] in FINISHED_STATUSES:
+                    return
+                snapshot = await updates.get()
+                while not updates.empty():
+                    snapshot = updates.get_nowait()
+        finally:
+            subscribers = self._subscribers.get(job.id)
+            if subscribers is not None:
+                subscribers.discard(updates)
+                if not subscribers:
+                    del self._subscribers[job.id]
+
+    def _notify(self, job: IngestJob):
+        with self._lock:
+            snapshot = job.to_dict()
+        for updates in self._subscribers.get(job.id, ()):
+            updates.put_nowait(snapshot)
+
+    # -------------------- PostgreSQL --------------------
+
+    async def _insert(self, job: IngestJob):
+        job.persisted_at = time.monotonic()
+        await self._execute(
+            """
+            INSERT INTO ingest_jobs (id, dataset_id, user_id, guest_token, city, transport_type, name, status, progress)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9::jsonb)
+            """,
+            job.id, job.dataset_id, job.user_id, job.guest_token, job.city,
+            job.transport_type, job.name, job.status, json.dumps(job.progress)
+        )
+
+    async def _persist(self, job: IngestJob):
+        job.persisted_at = time.monotonic()
+        with self._lock:
+            progress = json.dumps(job.progress)
+        await self._execute(
+            "UPDATE ingest_jobs SET status = $2, progress = $3::jsonb, error = $4, updated_at = NOW() WHERE id = $1",
+            job.id, job.status, progress, job.error
+        )
+
+    async def _persist_progress(self, job: IngestJob):
+        """Сохраняет прогресс, не трогая статус.
+
+        Запись идёт в фоне и может выполниться уже после финального
+        _persist, поэтому обновляет только незавершённую задачу.
+        """
+        job.persisted_at = time.monotonic()
+        with self._lock:
+            progress = json.dumps(job.progress)
+        await self._execute(
+            "UPDATE ingest_jobs SET progress = $2::jsonb, updated_at = NOW() "
+            "WHERE id = $1 AND status <> ALL($3::text[])",
+            job.id, progress, list(FINISHED_STATUSES)
+        )
+
+    async def _execute(self, query: str, *args, required: bool = False):
+        try:
+            conn = await self.postgres.get_connection()
+            try:
+                return await conn.execute(query, *args)
+            finally:
+                await self.postgres.release_connection(conn)
+        except Exception as e:
+            if required:
+                raise
+            print(f"[WARN] Could not persist ingest job state: {e}")
+            return None
+
+    async def _fetch(self, query: str, *args):
+        try:
+            conn = await self.postgres.get_connection()
+            try:
+                return await conn.fetch(query, *args)
+            finally:
+                await self.postgres.release_connection(conn)
+        except Exception as e:
+            print(f"[WARN] Could not read ingest jobs: {e}")
+            return []
+
+
+ingest_jobs = IngestJobManager()
@@ -1,18 +1,32 @@
 import datetime
 import json
 import math
+import multiprocessing
 import os
-import random
-import re
 import time
 from abc import abstractmethod
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack
 from urllib.parse import urljoin
 
 import requests
 import requests_cache
-from bs4 import BeautifulSoup
 from requests.adapters import HTTPAdapter, Retry
 
+from app.core.services.graph_snapshot import GraphSnapshot, relationship_name
+from app.core.services.html_extractors import extract_route_pages, get_extractor
+from app.core.services.rate_limiter import (
+    RETRY_STATUSES,
+    AdaptiveRateLimiter,
+    parse_retry_after,
+)
+from app.core.services.stop_registry import STOPS_FILE, StopRegistry, route_stop_name
+from app.core.services.route_store import (
+    get_route_store,
+    is_file_fresh,
+    write_json_atomic,
+)
+
 """
     Класс занимающийся парсингом данных с сайта https://kudikina.ru
 """
@@ -23,7 +37,18 @@ MAP_URL = "/map"
 TIMETABLE_FORWARD_URL = "/A"
 TIMETABLE_BACKWARD_URL = "/B"
 CACHE_EXPIRE_DAYS = 30
-REQUEST_PAUSE_SEC = 2
+
+# --- Rate Limit Settings ---
+# Потоков загрузки маршрутов при сборке графа через менеджер БД (1 — последовательно)
+FETCH_WORKERS = int(os.environ.get("FETCH_WORKERS", "8"))
+# Процессов разбора HTML при сборке графа через менеджер БД (0 — в потоке загрузки)
+PARSE_WORKERS = int(os.environ.get("PARSE_WORKERS", "0"))
+MAX_REQUESTS_PER_HOST = 4
+REQUESTS_PER_SECOND = 1.0
+MAX_REQUESTS_PER_SECOND = 3.0
+RATE_LIMIT_BURST = 3
+FETCH_ATTEMPTS = 4
+ROUTE_DEADLINE_SEC = 90
 
 # --- Cache Configuration ---
 BASE_CACHE_DIR = "./cache"
@@ -32,19 +57,106 @@ session = requests_cache.CachedSession(
     cache_name=os.path.join(BASE_CACHE_DIR, "http_cache"),
     expire_after=datetime.timedelta(days=30),
 )
-retries = Retry(total=5, backoff_factor=2, status_forcelist=[500, 502, 503, 504])
+# Повторы по статусам 429/5xx выполняет fetch_page с учётом rate_limiter
+retries = Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.5)
 adapter = HTTPAdapter(max_retries=retries)
 session.mount("http://", adapter)
 session.mount("https://", adapter)
 
 
+rate_limiter = AdaptiveRateLimiter(
+    rate=REQUESTS_PER_SECOND,
+    burst=RATE_LIMIT_BURST,
+    max_rate=MAX_REQUESTS_PER_SECOND,
+    max_per_host=MAX_REQUESTS_PER_HOST,
+)
+
+
+def _is_cached(url):
+    """Проверяет, есть ли ответ для `url` в http_cache."""
+    try:
+        return session.cache.contains(url=url)
+    except Exception:
+        return False
+
+
+def fetch_page(url, timeout=10, deadline=None):
+    """Загружает страницу через общую сессию под контролем rate_limiter.
+
+    Бюджет запросов списывается только за обращения к сети: ответы из
+    http_cache проходят без ожидания. На 429/5xx и сетевые ошибки темп
+    снижается, а запрос повторяется, пока позволяет `deadline`
+    (time.monotonic); при его исчерпании выбрасывается DeadlineExceeded.
+    """
+    cached = _is_cached(url)
+    with rate_limiter.host_slot(url):
+        for attempt in range(FETCH_ATTEMPTS):
+            if not cached:
+                rate_limiter.acquire(deadline)
+            request_timeout = timeout
+            if deadline is not None:
+                request_timeout = min(timeout, max(deadline - time.monotonic(), 0.1))
+
+            started = time.monotonic()
+            try:
+                response = session.get(url, timeout=request_timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                rate_limiter.record_fetch(time.monotonic() - started, False)
+                rate_limiter.on_backoff()
+                if attempt + 1 == FETCH_ATTEMPTS:
+                    raise
+                rate_limiter.wait_backoff(rate_limiter.backoff_delay(attempt), deadline)
+                cached = False
+                continue
+
+            from_cache = getattr(response, "from_cache", False)
+            rate_limiter.record_fetch(time.monotonic() - started, from_cache)
+            if from_cache:
+                break
+            if cached:
+                rate_limiter.charge()  # запись в кеше устарела, запрос ушёл в сеть
+
+            if response.status_code not in RETRY_STATUSES:
+                rate_limiter.on_success()
+                break
+            rate_limiter.on_backoff()
+            if attempt + 1 == FETCH_ATTEMPTS:
+                break
+            delay = rate_limiter.backoff_delay(attempt, parse_retry_after(response))
+            rate_limiter.wait_backoff(delay, deadline)
+            cached = False
+
+    response.raise_for_status()
+    return response
+
+
+def fetch_text(url, deadline=None):
+    """Возвращает текст страницы или None, если её не удалось загрузить."""
+    try:
+        return fetch_page(url, timeout=10, deadline=deadline).text
+    except requests.RequestException:
+        return None
+
+
 class AbstractTransportGraphParser:
-    def __init__(self, city_name):
-        """Инициализирует парсер для указанного города."""
+    def __init__(self, city_name, extractor=None, route_store=None, stop_registry=None):
+        """Инициализирует парсер для указанного города.
+
+        `extractor` — имя бэкенда разбора HTML (`streaming` или `bs4`),
+        по умолчанию берётся из переменной окружения HTML_EXTRACTOR.
+        `route_store` — бэкенд кеша маршрутов (`json` или `sqlite`),
+        по умолчанию берётся из переменной окружения ROUTE_STORE.
+        `stop_registry` — общий StopRegistry, если остановки нужно
+        сопоставлять между парсерами одного города; по умолчанию реестр
+        загружается из таблицы остановок прошлой сборки.
+        """
         self.city_name = city_name
+        self.extractor = get_extractor(extractor)
         self.city_url = self.__get_city_url()
         self.nodes = {}
         self.relationships = []
+        self.on_route = None
+        self.on_progress = None
         self.transport_url = self.get_transport_url()
         self.transport_class = self.get_transport_class()
         self.city_dir = os.path.join(
@@ -54,68 +166,285 @@ class AbstractTransportGraphParser:
             self.transport_url.strip("/"),
         )
         os.makedirs(self.city_dir, exist_ok=True)
+        self.route_store = get_route_store(
+            self.city_name.lower(),
+            self.transport_url.strip("/"),
+            CACHE_EXPIRE_DAYS,
+            BASE_CACHE_DIR,
+            self.city_dir,
+            backend=route_store,
+        )
+        self.snapshot_dir = os.path.join(
+            BASE_CACHE_DIR,
+            "snapshots",
+            self.city_name.lower(),
+            self.transport_url.strip("/"),
+        )
+        self.stops_path = os.path.join(self.snapshot_dir, STOPS_FILE)
+        self.stop_registry = stop_registry if stop_registry is not None else StopRegistry.load(self.stops_path)
 
     # === Main Method ===
-    def parse(self, use_cache=True):
-        """Парсит все маршруты города и формирует граф."""
+    def parse(self, use_cache=True, workers=1, parse_workers=0, on_route=None, on_progress=None):
+        """Парсит все маршруты города и формирует граф.
+
+        При workers > 1 маршруты и страницы одного маршрута загружаются
+        параллельно в пуле потоков. При parse_workers > 0 разбор HTML
+        выносится в пул процессов, что ускоряет повторный разбор страниц
+        из http_cache на многоядерных машинах. Порядок объединения
+        маршрутов и формат кеша во всех режимах одинаковы.
+
+        Если кеш маршрутов не менялся с последней сборки и в нём есть все
+        маршруты индекса, граф читается из снимка (см. GraphSnapshot) без
+        обхода маршрутов. Если каких-то маршрутов нет (не загрузились или
+        не уложились в срок), снимок не используется и они запрашиваются снова.
+
+        `on_route(nodes, relationships)` вызывается после объединения каждого
+        маршрута с его узлами (копии текущего состояния, routeList
+        накопительный) и новыми связями — так граф можно записывать в БД,
+        не дожидаясь конца парсинга. При чтении из снимка вызывается один
+        раз со всем графом.
+
+        `on_progress(event, count)` сообщает о ходе парсинга: "total" — число
+        маршрутов в индексе, затем "cached", "fetched" или "failed" на каждый
+        маршрут (при чтении из снимка — один "cached" на все маршруты).
+        """
         if not self.city_url:
             print(f"[ERROR] City URL for '{self.city_name}' not found. Aborting.")
             return None, None
 
+        self.on_route = on_route
+        self.on_progress = on_progress
         transport_type = self.transport_url.strip("/")
         print(
             f"[INFO] Starting parsing for city: {self.city_name} (Transport: {transport_type})"
         )
 
-        routes_index_path = os.path.join(self.city_dir, "routes_index.json")
-        if use_cache and self.__is_cache_fresh(routes_index_path):
-            with open(routes_index_path, "r", encoding="utf-8") as f:
-                all_routes = json.load(f)
+        all_routes = self.route_store.load_index() if use_cache else None
+        if all_routes is not None:
             print("[INFO] Route index loaded from cache.")
+            if self.__load_snapshot(all_routes):
+                self.__report("total", len(all_routes))
+                self.__report("cached", len(all_routes))
+                if on_route is not None:
+                    on_route([dict(node) for node in self.nodes.values()], list(self.relationships))
+                return self.nodes, self.relationships
         else:
             all_routes = self.get_all_routes_info()
-            self.__save_json(routes_index_path, all_routes)
+            self.route_store.save_index(all_routes)
             print("[INFO] Fetched and saved new route index.")
+        self.__report("total", len(all_routes))
+        if use_cache and not len(self.stop_registry):
+            self.__seed_stop_registry(all_routes)
+
+        if workers > 1 or parse_workers > 0:
+            self.__parse_routes_concurrently(all_routes, use_cache, workers, parse_workers)
+        else:
+            self.__parse_routes_sequentially(all_routes, use_cache)
+        self.stop_registry.save(self.stops_path)
+        self.__save_snapshot(all_routes)
 
+        print(f"[SUCCESS] Parsing complete for {self.city_name} ({transport_type}).")
+        print(
+            f"[STATS] Total routes: {len(all_routes)}, Nodes: {len(self.nodes)}, Relationships: {len(self.relationships)}"
+        )
+        limiter_stats = rate_limiter.stats()
+        print(
+            f"[STATS] Network requests: {limiter_stats['network_requests']}, "
+            f"cache hits: {limiter_stats['cache_hits']}, "
+            f"fetching: {limiter_stats['fetch_seconds']:.1f}s, "
+            f"throttled: {limiter_stats['throttled_seconds']:.1f}s"
+        )
+        return self.nodes, self.relationships
+
+    def __parse_routes_sequentially(self, all_routes, use_cache):
+        """Обходит маршруты по одному; темп запросов задаёт rate_limiter."""
         for route_number, route_name, route_url in all_routes:
-            route_path = self.__get_route_path(route_number)
-            if use_cache and self.__is_cache_fresh(route_path):
-                with open(route_path, "r", encoding="utf-8") as f:
-                    route_data = json.load(f)
-                self.__merge_route_data(route_data)
-                print(f"[CACHE] Loaded route '{route_number}' from cache.")
+            if use_cache and self.__load_cached_route(route_number):
                 continue
 
             route_data = self.__parse_single_route(route_number, route_url)
             if not route_data:
+                self.__report("failed")
                 continue  # Логирование происходит внутри __parse_single_route
 
-            self.__save_json(route_path, route_data)
-            self.__merge_route_data(route_data)
-            print(f"[FETCH] Parsed and cached route: '{route_number}'")
-            time.sleep(REQUEST_PAUSE_SEC + random.uniform(0.3, 1.2))
+            self.__store_fetched_route(route_number, route_data)
+
+    def __parse_routes_concurrently(self, all_routes, use_cache, workers, parse_workers):
+        """Загружает маршруты параллельно и объединяет их в исходном порядке.
+
+        Маршруты обрабатываются в пуле потоков, а страницы каждого маршрута
+        (расписания A/B и карта) — в отдельном пуле страниц, поэтому задачи
+        маршрутов не блокируют друг друга. Темп запросов задаёт общий
+        `rate_limiter`. Если parse_workers > 0, стадия разбора HTML идёт
+        в пуле процессов, а объединение в self.nodes/self.relationships
+        остаётся в текущем процессе.
+        """
+        route_workers = max(workers, parse_workers, 1)
+        with ExitStack() as stack:
+            route_pool = stack.enter_context(ThreadPoolExecutor(max_workers=route_workers))
+            page_pool = stack.enter_context(ThreadPoolExecutor(max_workers=max(workers, 1) * 3))
+            parse_pool = None
+            if parse_workers > 0:
+                parse_pool = stack.enter_context(
+                    ProcessPoolExecutor(
+                        max_workers=parse_workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+                )
 
-        print(f"[SUCCESS] Parsing complete for {self.city_name} ({transport_type}).")
+            futures = {}
+            for route_number, route_name, route_url in all_routes:
+                if route_number in futures:
+                    continue
+                if use_cache and self.route_store.is_route_fresh(route_number):
+                    continue
+                futures[route_number] = route_pool.submit(
+                    self.__parse_single_route, route_number, route_url, page_pool, parse_pool
+                )
+
+            for route_number, route_name, route_url in all_routes:
+                future = futures.pop(route_number, None)
+                if future is None:
+                    if not self.__load_cached_route(route_number):
+                        self.__report("failed")
+                    continue
+
+                route_data = future.result()
+                if route_data:
+                    self.__store_fetched_route(route_number, route_data)
+                else:
+                    self.__report("failed")
+
+    def __load_cached_route(self, route_number):
+        """Объединяет маршрут из кеша маршрутов, если он актуален."""
+        route_data = self.route_store.load_route(route_number)
+        if route_data is None:
+            return False
+        self.__merge_route_data(route_data)
+        self.__report("cached")
+        print(f"[CACHE] Loaded route '{route_number}' from cache.")
+        return True
+
+    def __store_fetched_route(self, route_number, route_data):
+        """Сохраняет загруженный маршрут в кеш и объединяет его с графом."""
+        self.route_store.save_route(route_number, route_data)
+        self.__merge_route_data(route_data)
+        self.__report("fetched")
+        print(f"[FETCH] Parsed and cached route: '{route_number}'")
+
+    def __seed_stop_registry(self, all_routes):
+        """Заполняет пустой реестр остановками всех маршрутов из кеша.
+
+        Тогда имена узлов не зависят от порядка маршрутов в индексе:
+        маршруты сопоставляются с уже зарегистрированными местами.
+        """
+        stops = []
+        for route_number in dict.fromkeys(route[0] for route in all_routes):
+            route_data = self.route_store.load_route(route_number)
+            if route_data is None:
+                continue
+            stop_names = {row.get("stopName") for row in route_data.get("timetable") or []}
+            for name, node in route_data.get("nodes", {}).items():
+                stops.append(
+                    (
+                        route_stop_name(name, stop_names),
+                        node.get("xCoordinate"),
+                        node.get("yCoordinate"),
+                        node.get("isCoordinateApproximate", False),
+                    )
+                )
+        self.stop_registry.seed(stops)
+
+    def __report(self, event, count=1):
+        if self.on_progress is not None:
+            self.on_progress(event, count)
+
+    # === Graph Snapshot ===
+    def __load_snapshot(self, all_routes):
+        """Берёт граф из снимка, если он собран по текущему кешу маршрутов.
+
+        Снимок не используется, пока в кеше нет всех маршрутов индекса.
+        """
+        route_numbers = [route[0] for route in all_routes]
+        stamps = self.route_store.record_stamps(route_numbers)
+        missing = [number for number in dict.fromkeys(route_numbers) if number not in stamps]
+        if missing:
+            print(f"[INFO] {len(missing)} routes of {self.city_name} are not cached yet, retrying them.")
+            return False
+        version = self.route_store.version(route_numbers)
+        if version is None:
+            return False
+        snapshot = GraphSnapshot.load(self.snapshot_dir, version=version[0])
+        if snapshot is None:
+            return False
+        self.nodes, self.relationships = snapshot.to_graph()
         print(
-            f"[STATS] Total routes: {len(all_routes)}, Nodes: {len(self.nodes)}, Relationships: {len(self.relationships)}"
+            f"[CACHE] Loaded graph snapshot for {self.city_name}: "
+            f"{len(self.nodes)} nodes, {len(self.relationships)} relationships."
         )
-        return self.nodes, self.relationships
+        return True
+
+    def __save_snapshot(self, all_routes):
+        """Пересобирает снимок графа по текущему состоянию кеша маршрутов."""
+        version = self.route_store.version([route[0] for route in all_routes])
+        if version is None:
+            return
+        snapshot = GraphSnapshot.from_graph(self.nodes, self.relationships, *version)
+        if snapshot is None:
+            print(f"[WARN] Graph of {self.city_name} does not fit snapshot schema, skipping.")
+            return
+        snapshot.save(self.snapshot_dir)
 
     # === Single Route Processing ===
-    def __parse_single_route(self, route_number, route_url):
-        """Парсит один маршрут: расписание, координаты, узлы и связи."""
-        timetable, success = self.get_timetable(route_url)
+    def __parse_single_route(self, route_number, route_url, page_pool=None, parse_pool=None):
+        """Парсит один маршрут: расписание, координаты, узлы и связи.
+
+        Маршрут проходит три стадии: загрузка страниц (fetch_route_pages),
+        разбор HTML (extract_route_pages, в `parse_pool`, если он передан)
+        и построение узлов и связей. Все запросы маршрута должны уложиться
+        в ROUTE_DEADLINE_SEC, иначе недогруженные страницы считаются пустыми.
+        """
+        deadline = time.monotonic() + ROUTE_DEADLINE_SEC
+        if page_pool is None:
+            # Последовательно карта запрашивается, только если расписание разобрано
+            timetable, _ = self.get_timetable(route_url, deadline=deadline)
+            stop_coords = self.get_stop_coordinates(route_url, deadline) if timetable else {}
+        else:
+            forward, backward, map_page = self.fetch_route_pages(route_url, page_pool, deadline)
+            if parse_pool is not None:
+                timetable, coordinates = parse_pool.submit(
+                    extract_route_pages, self.extractor.name, forward, backward, map_page
+                ).result()
+            else:
+                timetable, coordinates = extract_route_pages(
+                    self.extractor, forward, backward, map_page
+                )
+            stop_coords = {name: Coordinate(x, y) for name, (x, y) in coordinates.items()}
 
-        if not success or not timetable:
+        if not timetable:
             print(f"[WARN] Skipping route '{route_number}': Failed to parse timetable.")
             return None
 
-        stop_coords = self.get_stop_coordinates(route_url)
         if not stop_coords:
             print(
                 f"[WARN] No coordinates found for route '{route_number}'. Proceeding with approximations."
             )
-
+        return self.__build_route_data(route_number, route_url, timetable, stop_coords)
+
+    def fetch_route_pages(self, route_url, page_pool, deadline=None):
+        """Параллельно загружает HTML расписаний A/B и карты маршрута в `page_pool`.
+
+        Возвращает кортеж (forward, backward, map); недоступная страница
+        заменяется None.
+        """
+        urls = [
+            urljoin(SITE_URL, route_url + suffix)
+            for suffix in (TIMETABLE_FORWARD_URL, TIMETABLE_BACKWARD_URL, MAP_URL)
+        ]
+        return tuple(page_pool.map(lambda url: fetch_text(url, deadline), urls))
+
+    def __build_route_data(self, route_number, route_url, timetable, stop_coords):
+        """Строит узлы и связи маршрута по расписанию и координатам."""
         route_nodes, route_relationships = {}, []
         last_coordinate = None
         previous_stop = None
@@ -149,12 +478,11 @@ class AbstractTransportGraphParser:
             if previous_stop and previous_stop["name"] != node_name:
                 duration = self.calculate_duration(previous_time, time_point)
                 if duration is not False and duration > 0:  # !!! Не пропускаем 0
-                    relationship_name = f"{previous_stop['name']} -> {node_name}; route_name: {route_number}"
                     route_relationships.append(
                         {
                             "startStop": previous_stop["name"],
                             "endStop": node_name,
-                            "name": relationship_name,
+                            "name": relationship_name(previous_stop["name"], node_name, route_number),
                             "route": route_number,
                             "duration": duration,
                         }
@@ -186,40 +514,68 @@ class AbstractTransportGraphParser:
         return coordinate
 
     # === Caching Logic ===
-    def __get_route_path(self, route_number):
-        """Строит путь к файлу кеша для маршрута."""
-        safe_name = re.sub(r"[^a-zA-Zа-яА-Я0-9_-]", "_", route_number)
-        return os.path.join(self.city_dir, f"{safe_name}.json")
-
     def __is_cache_fresh(self, path):
         """Проверяет, не устарел ли кеш по пути."""
-        if not os.path.exists(path):
-            return False
-        mtime = os.path.getmtime(path)
-        age_in_days = (
-            datetime.datetime.now() - datetime.datetime.fromtimestamp(mtime)
-        ).days
-        return age_in_days <= CACHE_EXPIRE_DAYS
-
-    def __save_json(self, path, data):
-        """Сохраняет данные в JSON по указанному пути."""
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        return is_file_fresh(path, CACHE_EXPIRE_DAYS)
 
     def __merge_route_data(self, route_data):
-        """Объединяет узлы и связи маршрута с общими структурами."""
+        """Объединяет узлы и связи маршрута с общими структурами.
+
+        Узлы маршрута сопоставляются каноническим остановкам города через
+        stop_registry: одноимённые остановки в пределах допуска становятся
+        одним узлом, одноимённые остановки в разных местах — разными.
+        """
+        stop_names = {row.get("stopName") for row in route_data.get("timetable") or []}
+        stop_ids = {}
+        route_stops = []
+        route_relationships = []
         for name, node in route_data.get("nodes", {}).items():
-            if name not in self.nodes:
-                self.nodes[name] = node
+            stop_id = self.stop_registry.resolve(
+                route_stop_name(name, stop_names),
+                node.get("xCoordinate"),
+                node.get("yCoordinate"),
+                node.get("isCoordinateApproximate", False),
+            )
+            stop_ids[name] = stop_id
+            route_stops.append(stop_id)
+            if stop_id not in self.nodes:
+                self.nodes[stop_id] = node if stop_id == name else {**node, "name": stop_id}
             else:
                 for r in node.get("routeList", []):
-                    if r not in self.nodes[name].get("routeList", []):
-                        self.nodes[name]["routeList"].append(r)
+                    if r not in self.nodes[stop_id].get("routeList", []):
+                        self.nodes[stop_id]["routeList"].append(r)
 
         for rel in route_data.get("relationships", []):
             if rel.get("duration") and rel["duration"] > 0:
-                self.relationships.append(rel)
+                rel = self.__remap_relationship(rel, stop_ids)
+                if rel is not None:
+                    self.relationships.append(rel)
+                    route_relationships.append(rel)
+
+        if self.on_route is not None:
+            self.on_route(
+                [
+                    {**self.nodes[stop_id], "routeList": list(self.nodes[stop_id].get("routeList", []))}
+                    for stop_id in dict.fromkeys(route_stops)
+                ],
+                route_relationships,
+            )
+
+    def __remap_relationship(self, rel, stop_ids):
+        """Переводит концы связи на канонические остановки.
+
+        Возвращает None, если после сопоставления связь стала петлёй.
+        """
+        start = stop_ids.get(rel.get("startStop"), rel.get("startStop"))
+        end = stop_ids.get(rel.get("endStop"), rel.get("endStop"))
+        if start == rel.get("startStop") and end == rel.get("endStop"):
+            return rel
+        if start == end:
+            return None
+        remapped = {**rel, "startStop": start, "endStop": end}
+        if rel.get("name") == relationship_name(rel["startStop"], rel["endStop"], rel.get("route")):
+            remapped["name"] = relationship_name(start, end, rel.get("route"))
+        return remapped
 
     # === City URL Management ===
     def __get_city_url(self):
@@ -238,45 +594,37 @@ class AbstractTransportGraphParser:
         """Парсит список всех городов и их относительные URL."""
         print(f"[INFO] Parsing all city URLs from {SITE_URL}...")
         try:
-            response = session.get(SITE_URL, timeout=15)
-            response.raise_for_status()
+            response = fetch_page(SITE_URL, timeout=15)
         except requests.RequestException as e:
             print(f"[ERROR] Failed to fetch main page: {e}")
             return {}
 
-        soup = BeautifulSoup(response.text, "html.parser")
         cities = {}
+        blocks = self.extractor.city_blocks(
+            response.text, "list-unstyled cities block-regions"
+        )
 
-        for ul in soup.find_all("ul", class_="list-unstyled cities block-regions"):
-            for region_link in ul.find_all("a"):
-                region_name = region_link.find("span", class_="city-name").text.strip()
-                region_href = region_link["href"]
-
-                # Используем urljoin для безопасного формирования URL
-                region_full_url = urljoin(SITE_URL, region_href)
+        for region_name, region_href in (link for block in blocks for link in block):
+            # Используем urljoin для безопасного формирования URL
+            region_full_url = urljoin(SITE_URL, region_href)
 
-                try:
-                    region_response = session.get(region_full_url, timeout=10)
-                    region_response.raise_for_status()
-                except requests.RequestException as e:
-                    print(f"[WARN] Could not fetch region page for {region_name}: {e}")
-                    continue
+            try:
+                region_response = fetch_page(region_full_url, timeout=10)
+            except requests.RequestException as e:
+                print(f"[WARN] Could not fetch region page for {region_name}: {e}")
+                continue
 
-                region_soup = BeautifulSoup(region_response.text, "html.parser")
-                city_blocks = region_soup.find_all("ul", class_="list-unstyled cities")
-                time.sleep(1.5)
+            city_blocks = self.extractor.city_blocks(
+                region_response.text, "list-unstyled cities"
+            )
 
-                if not city_blocks:
-                    cities[region_name] = region_href
-                    print(f"[INFO] Parsed region: {region_name} -> {region_href}")
-                else:
-                    for city_link in city_blocks[0].find_all("a"):
-                        city_name = city_link.find(
-                            "span", class_="city-name"
-                        ).text.strip()
-                        city_href = city_link["href"]
-                        cities[city_name] = city_href
-                        print(f"[INFO] Parsed city: {city_name} -> {city_href}")
+            if not city_blocks:
+                cities[region_name] = region_href
+                print(f"[INFO] Parsed region: {region_name} -> {region_href}")
+            else:
+                for city_name, city_href in city_blocks[0]:
+                    cities[city_name] = city_href
+                    print(f"[INFO] Parsed city: {city_name} -> {city_href}")
 
         print(f"[SUCCESS] Found {len(cities)} cities in total.")
         return cities
@@ -302,79 +650,39 @@ class AbstractTransportGraphParser:
         """Возвращает список маршрутов: номер, имя и URL."""
         full_url = urljoin(SITE_URL, self.city_url + self.transport_url)
         try:
-            response = session.get(full_url, timeout=10)
-            response.raise_for_status()
+            response = fetch_page(full_url, timeout=10)
         except requests.RequestException as e:
             print(f"[ERROR] Failed to get routes list from {full_url}: {e}")
             return []
 
-        soup = BeautifulSoup(response.text, "html.parser")
-        items = soup.find_all("a", class_=self.transport_class)
-        return [[i.text.strip(), i.find("span").text.strip(), i["href"]] for i in items]
-
-    def get_timetable(self, route_url):
-        """Получает расписание для маршрута в обоих направлениях."""
-        def parse_dir(suffix):
-            """Парсит расписание для указанного направления (A/B)."""
-            full_url = urljoin(SITE_URL, route_url + suffix)
-            try:
-                resp = session.get(full_url, timeout=10)
-                resp.raise_for_status()
-            except requests.RequestException:
-                return None
-
-            soup = BeautifulSoup(resp.text, "html.parser")
-            stops = []
-            for s in soup.find_all("div", class_="bus-stop"):
-                name_tag = s.find("a")
-                next_div = s.find_next_sibling("div", class_="col-xs-12")
-                time_tag = next_div.find("span") if next_div else None
-                if not name_tag or not time_tag:
-                    continue
-                name = re.sub(r"\d+\) ", "", name_tag.text.strip())
-                stops.append(
-                    {"stopName": name, "timePoint": time_tag.text.strip().rstrip("K")}
-                )
-            return stops
+        return self.extractor.route_links(response.text, self.transport_class)
 
-        t1 = parse_dir(TIMETABLE_FORWARD_URL)
-        t2 = parse_dir(TIMETABLE_BACKWARD_URL)
+    def get_timetable(self, route_url, page_pool=None, deadline=None):
+        """Получает расписание для маршрута в обоих направлениях.
 
-        if t1 is None and t2 is None:
-            return None, False
+        При переданном `page_pool` направления A и B загружаются параллельно.
+        """
+        urls = [
+            urljoin(SITE_URL, route_url + suffix)
+            for suffix in (TIMETABLE_FORWARD_URL, TIMETABLE_BACKWARD_URL)
+        ]
+        if page_pool is not None:
+            forward, backward = page_pool.map(lambda url: fetch_text(url, deadline), urls)
+        else:
+            forward, backward = (fetch_text(url, deadline) for url in urls)
 
-        combined = (t1 or []) + (t2 or [])
-        return (combined, True) if combined else (None, False)
+        timetable, _ = extract_route_pages(self.extractor, forward, backward, None)
+        return (timetable, True) if timetable else (None, False)
 
-    def get_stop_coordinates(self, route_url):
+    def get_stop_coordinates(self, route_url, deadline=None):
         """Извлекает координаты остановок из страницы карты маршрута."""
-        full_url = urljoin(SITE_URL, route_url + MAP_URL)
-        try:
-            response = session.get(full_url, timeout=10)
-            response.raise_for_status()
-        except requests.RequestException:
+        html = fetch_text(urljoin(SITE_URL, route_url + MAP_URL), deadline)
+        if html is None:
             return {}
 
-        soup = BeautifulSoup(response.text, "html.parser")
-        script_tag = next(
-            (
-                s
-                for s in soup.find_all("script", type="text/javascript")
-                if "drawMap" in s.text
-            ),
-            None,
-        )
-
-        if not script_tag:
-            return {}
-
-        matches = re.findall(
-            r'{"name":\s*"(.*?)",\s*"lat":\s*(-?\d+\.?\d*),\s*"long":\s*(-?\d+\.?\d*)}',
-            script_tag.text,
-        )
         return {
-            m[0].replace("\\", ""): Coordinate(float(m[2]), float(m[1]))
-            for m in matches
+            name: Coordinate(x, y)
+            for name, (x, y) in self.extractor.stop_coordinates(html).items()
         }
 
     # === Utility Methods ===
@@ -386,10 +694,8 @@ class AbstractTransportGraphParser:
         return {}
 
     def save_cache(self, path, data):
-        """Сохраняет словарь в кеш по указанному пути."""
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        """Атомарно сохраняет словарь в кеш по указанному пути."""
+        write_json_atomic(path, data)
 
     # === Math Helpers ===
     def calculate_duration(self, start, end):
@@ -0,0 +1,213 @@
+import asyncio
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+"""
+    Жизненный цикл проекций GDS
+
+    Проекция датасета строится один раз на версию графа (см.
+    result_cache.graph_version) и дальше переиспользуется. После построения
+    её размер берётся из gds.graph.list; если суммарный размер проекций
+    превышает GDS_PROJECTION_BUDGET_MB, давно не использованные проекции
+    удаляются из каталога. Проекции, найденные в каталоге при старте,
+    считаются устаревшими и вытесняются первыми.
+
+    На время расчёта (gds.*.write, gds.*.stream, чтение рёбер для
+    статистики) анализ закрепляет проекцию через add_reader: запрос другого
+    датасета держит блокировку другой метки и мог бы вытеснить её. Пока у
+    проекции есть читатели, ensure_async и drop_async ждут их завершения
+    перед удалением, а вытеснение по бюджету её пропускает.
+"""
+
+GDS_PROJECTION_BUDGET_MB = int(os.environ.get("GDS_PROJECTION_BUDGET_MB", "2048"))
+
+DROP_QUERY = "CALL gds.graph.drop($name, false) YIELD graphName RETURN graphName"
+SIZE_QUERY = (
+    "CALL gds.graph.list($name) YIELD graphName, sizeInBytes, nodeCount "
+    "RETURN graphName, sizeInBytes, nodeCount"
+)
+CATALOG_QUERY = "CALL gds.graph.list() YIELD graphName, sizeInBytes RETURN graphName, sizeInBytes"
+READER_POLL_SECONDS = 0.05
+
+
+def _size_of(records) -> tuple:
+    """Размер в байтах и число узлов проекции из ответа SIZE_QUERY."""
+    for record in records or []:
+        return int(record["sizeInBytes"] or 0), record.get("nodeCount")
+    return 0, None
+
+
+class ProjectionManager:
+    """Учёт проекций каталога GDS в порядке использования (LRU).
+
+    Состояние хранится в памяти процесса; запросы к Neo4j выполняются
+    через переданное подключение (ensure — для Neo4jConnection,
+    ensure_async — для AsyncNeo4jConnection). Несколько процессов вели бы
+    независимый учёт и удаляли бы проекции друг друга, поэтому API
+    запускается одним воркером uvicorn.
+    """
+
+    def __init__(self, budget_bytes: int = GDS_PROJECTION_BUDGET_MB * 1024 * 1024):
+        self.budget_bytes = budget_bytes
+        self._projections = OrderedDict()
+        self._readers = {}
+        self._lock = threading.Lock()
+        self.projected = 0
+        self.reused = 0
+        self.evicted = 0
+
+    # -------------------- Состояние --------------------
+
+    def is_current(self, name: str, version: Optional[str]) -> bool:
+        """Есть ли проекция `name` нужной версии; при попадании отмечает её использование."""
+        with self._lock:
+            entry = self._projections.get(name)
+            if entry is None or entry["version"] != version:
+                return False
+            self._projections.move_to_end(name)
+            self.reused += 1
+            return True
+
+    def register(self, name: str, version: Optional[str], size_bytes: int, node_count=None) -> List[str]:
+        """Запоминает проекцию и возвращает имена проекций, которые нужно удалить."""
+        with self._lock:
+            self._projections[name] = {"version": version, "size": size_bytes, "node_count": node_count}
+            self._projections.move_to_end(name)
+            victims = []
+            total = sum(entry["size"] for entry in self._projections.values())
+            for victim, entry in list(self._projections.items()):
+                if total <= self.budget_bytes or victim == name:
+                    break
+                if self._readers.get(victim):
+                    continue
+                total -= entry["size"]
+                del self._projections[victim]
+                victims.append(victim)
+            self.evicted += len(victims)
+            return victims
+
+    def adopt(self, records):
+        """Учитывает проекции из каталога как устаревшие (самые старые в LRU)."""
+        with self._lock:
+            for record in records or []:
+                name = record["graphName"]
+                if name not in self._projections:
+                    self._projections[name] = {"version": None, "size": int(record["sizeInBytes"] or 0)}
+                    self._projections.move_to_end(name, last=False)
+
+    def node_count(self, name: str) -> Optional[int]:
+        """Число узлов проекции `name`, если оно известно."""
+        with self._lock:
+            entry = self._projections.get(name)
+            return entry.get("node_count") if entry is not None else None
+
+    def add_reader(self, name: str):
+        """Отмечает, что проекцию `name` читают; снимается release_reader."""
+        with self._lock:
+            self._readers[name] = self._readers.get(name, 0) + 1
+
+    def release_reader(self, name: str):
+        with self._lock:
+            readers = self._readers.get(name, 0) - 1
+            if readers > 0:
+                self._readers[name] = readers
+            else:
+                self._readers.pop(name, None)
+
+    async def _wait_for_readers(self, name: str):
+        while True:
+            with self._lock:
+                if not self._readers.get(name):
+                    return
+            await asyncio.sleep(READER_POLL_SECONDS)
+
+    def forget(self, name: str):
+        with self._lock:
+            self._projections.pop(name, None)
+
+    def clear(self):
+        with self._lock:
+            self._projections.clear()
+            self._readers.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "projections": len(self._projections),
+                "size_bytes": sum(entry["size"] for entry in self._projections.values()),
+                "budget_bytes": self.budget_bytes,
+                "projected": self.projected,
+                "reused": self.reused,
+                "evicted": self.evicted,
+            }
+
+    # -------------------- Neo4j --------------------
+
+    def ensure(self, connection, name: str, version: Optional[str], build: Callable[[], bool]) -> bool:
+        """Строит проекцию `name` через `build`, если нет актуальной. Возвращает True, если строилась.
+
+        `build` должен вернуть True, если проекция создана.
+        """
+        if self.is_current(name, version):
+            return False
+        self.forget(name)
+        self._run(connection, DROP_QUERY, name)
+        if not build():
+            return True
+        self.projected += 1
+        for victim in self.register(name, version, *_size_of(self._run(connection, SIZE_QUERY, name))):
+            print(f"[INFO] Evicting GDS projection '{victim}' (memory budget)")
+            self._run(connection, DROP_QUERY, victim)
+        return True
+
+    async def ensure_async(self, connection, name: str, version: Optional[str], build) -> bool:
+        """Асинхронный вариант ensure; `build` — корутинная функция."""
+        if self.is_current(name, version):
+            return False
+        await self._wait_for_readers(name)
+        self.forget(name)
+        await self._run_async(connection, DROP_QUERY, name)
+        if not await build():
+            return True
+        self.projected += 1
+        for victim in self.register(name, version, *_size_of(await self._run_async(connection, SIZE_QUERY, name))):
+            print(f"[INFO] Evicting GDS projection '{victim}' (memory budget)")
+            await self._run_async(connection, DROP_QUERY, victim)
+        return True
+
+    def drop(self, connection, name: str):
+        self.forget(name)
+        self._run(connection, DROP_QUERY, name)
+
+    async def drop_async(self, connection, name: str):
+        await self._wait_for_readers(name)
+        self.forget(name)
+        await self._run_async(connection, DROP_QUERY, name)
+
+    async def sync_catalog_async(self, connection):
+        """Учитывает проекции, оставшиеся в каталоге GDS с прошлого запуска."""
+        try:
+            self.adopt(await connection.run(CATALOG_QUERY))
+        except Exception as e:
+            print(f"[WARN] Could not list GDS projections: {e}")
+
+    @staticmethod
+    def _run(connection, query: str, name: str):
+        try:
+            return connection.run(query, {"name": name})
+        except Exception as e:
+            print(f"[WARN] GDS catalog query failed for '{name}': {e}")
+            return []
+
+    @staticmethod
+    async def _run_async(connection, query: str, name: str):
+        try:
+            return await connection.run(query, {"name": name})
+        except Exception as e:
+            print(f"[WARN] GDS catalog query failed for '{name}': {e}")
+            return []
+
+
+projection_manager = ProjectionManager()
@@ -0,0 +1,178 @@
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests
+
+"""
+    Адаптивный ограничитель темпа запросов к сайту-источнику
+"""
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Верхняя граница паузы перед повтором, в том числе заданной сервером в Retry-After
+MAX_BACKOFF_SECONDS = 30.0
+
+
+class DeadlineExceeded(requests.Timeout):
+    """Запрос не укладывается в отведённый маршруту срок."""
+
+
+class AdaptiveRateLimiter:
+    """Token bucket с AIMD-адаптацией темпа и лимитом параллельности на хост.
+
+    Бюджет списывается только за реальные сетевые запросы. Успешные ответы
+    понемногу повышают темп (additive increase), ответы 429/5xx и сетевые
+    ошибки сокращают его вдвое (multiplicative decrease).
+    """
+
+    def __init__(
+        self,
+        rate=1.0,
+        burst=3,
+        min_rate=0.2,
+        max_rate=4.0,
+        increase_step=0.05,
+        decrease_factor=0.5,
+        max_per_host=4,
+    ):
+        """Создаёт ограничитель.
+
+        :param rate: начальный темп, запросов в секунду
+        :param burst: ёмкость корзины токенов
+        :param min_rate: нижняя граница темпа после штрафов
+        :param max_rate: верхняя граница темпа
+        :param increase_step: прибавка темпа за каждый успешный ответ
+        :param decrease_factor: множитель темпа при 429/5xx
+        :param max_per_host: число одновременных запросов к одному хосту
+        """
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.max_per_host = max_per_host
+
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._host_slots = {}
+        self._counters = {
+            "network_requests": 0,
+            "cache_hits": 0,
+            "backoffs": 0,
+            "deadline_exceeded": 0,
+            "throttled_seconds": 0.0,
+            "fetch_seconds": 0.0,
+        }
+
+    # === Token Bucket ===
+    def acquire(self, deadline=None):
+        """Резервирует токен и ждёт его появления.
+
+        Если ожидание выходит за `deadline` (time.monotonic), токен
+        возвращается и выбрасывается DeadlineExceeded.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            if deadline is not None and now + wait > deadline:
+                self._tokens += 1
+                self._counters["deadline_exceeded"] += 1
+                raise DeadlineExceeded("Rate limit wait exceeds route deadline")
+        self._sleep(wait)
+
+    def charge(self):
+        """Списывает токен без ожидания (запрос уже ушёл в сеть)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= 1
+
+    def _refill(self, now):
+        """Пополняет корзину пропорционально прошедшему времени."""
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    # === AIMD ===
+    def on_success(self):
+        """Плавно повышает темп после успешного сетевого ответа."""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def on_backoff(self):
+        """Снижает темп после 429/5xx или сетевой ошибки."""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            self._counters["backoffs"] += 1
+
+    def backoff_delay(self, attempt, retry_after=None):
+        """Возвращает паузу перед повтором запроса в секундах.
+
+        Retry-After сервера ограничивается MAX_BACKOFF_SECONDS, иначе запрос
+        без срока (например, parse_all_city_urls) мог бы ждать сколь угодно долго.
+        """
+        if retry_after is not None:
+            return min(MAX_BACKOFF_SECONDS, retry_after)
+        return min(MAX_BACKOFF_SECONDS, (2 ** attempt) / self.rate)
+
+    def wait_backoff(self, delay, deadline=None):
+        """Ждёт перед повтором, не выходя за `deadline`."""
+        if deadline is not None and time.monotonic() + delay > deadline:
+            with self._lock:
+                self._counters["deadline_exceeded"] += 1
+            raise DeadlineExceeded("Backoff exceeds route deadline")
+        self._sleep(delay)
+
+    # === Host Concurrency ===
+    @contextmanager
+    def host_slot(self, url):
+        """Ограничивает число одновременных запросов к хосту из `url`."""
+        host = urlparse(url).netloc
+        with self._lock:
+            semaphore = self._host_slots.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.max_per_host)
+                self._host_slots[host] = semaphore
+        with semaphore:
+            yield
+
+    # === Counters ===
+    def record_fetch(self, elapsed, from_cache):
+        """Учитывает время выполнения запроса и источник ответа."""
+        with self._lock:
+            if from_cache:
+                self._counters["cache_hits"] += 1
+            else:
+                self._counters["network_requests"] += 1
+                self._counters["fetch_seconds"] += elapsed
+
+    def stats(self):
+        """Возвращает копию счётчиков и текущий темп."""
+        with self._lock:
+            return {**self._counters, "rate": self.rate}
+
+    def reset_stats(self):
+        """Обнуляет счётчики (темп сохраняется)."""
+        with self._lock:
+            for key in self._counters:
+                self._counters[key] = 0.0 if key.endswith("_seconds") else 0
+
+    def _sleep(self, delay):
+        """Спит `delay` секунд и учитывает время в throttled_seconds."""
+        if delay <= 0:
+            return
+        time.sleep(delay)
+        with self._lock:
+            self._counters["throttled_seconds"] += delay
+
+
+def parse_retry_after(response):
+    """Извлекает Retry-After (в секундах) из ответа, если он задан числом."""
+    value = getattr(response, "headers", {}).get("Retry-After")
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
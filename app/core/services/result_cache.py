@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from typing import Optional
+
+"""
+    Кеш результатов анализа
+
+    Результат MetricClusterPreparer.prepare_metrics запоминается по ключу
+    (датасет, метки графа, вес, параметры расчёта, версия графа). Версия
+    графа — случайный идентификатор на метку узлов, который update_db
+    меняет после каждой записи, поэтому после обновления графа старые
+    результаты перестают находиться и вытесняются.
+
+    Первый уровень — LRU в памяти на ANALYSIS_CACHE_SIZE записей. Если задан
+    ANALYSIS_CACHE_DB, результаты и версии графов дополнительно хранятся
+    в SQLite (сжатый JSON) и переживают перезапуск; этот же файл видят
+    и загрузки графа из других процессов того же хоста.
+"""
+
+ANALYSIS_CACHE_SIZE = int(os.environ.get("ANALYSIS_CACHE_SIZE", "64"))
+ANALYSIS_CACHE_DB = os.environ.get("ANALYSIS_CACHE_DB", "")
+
+
+def cache_key(analysis_context, graph_version: str) -> str:
+    """Ключ результата для контекста анализа и версии графа."""
+    params = analysis_context.db_graph_parameters
+    parts = [
+        str(analysis_context.graph_name),
+        params.main_node_name,
+        params.main_rels_name,
+        params.weight,
+        sorted(vars(analysis_context.metric_calculation_context).items()),
+        graph_version,
+    ]
+    return hashlib.sha1(json.dumps(parts, default=str).encode("utf-8")).hexdigest()
+
+
+class AnalysisResultCache:
+    """LRU результатов анализа с необязательным уровнем в SQLite."""
+
+    def __init__(self, max_entries: int = ANALYSIS_CACHE_SIZE, db_path: str = ANALYSIS_CACHE_DB):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._db = None
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS graph_versions (label TEXT PRIMARY KEY, version TEXT NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, label TEXT NOT NULL, version TEXT NOT NULL, "
+                "created_at REAL NOT NULL, payload BLOB NOT NULL)"
+            )
+            self._db.commit()
+
+    # -------------------- Версии графа --------------------
+
+    def graph_version(self, label: str) -> str:
+        """Текущая версия графа метки `label` (создаётся при первом обращении)."""
+        with self._lock:
+            # Версию из SQLite читаем каждый раз: её может сменить другой процесс
+            if self._db is not None:
+                row = self._db.execute("SELECT version FROM graph_versions WHERE label = ?", (label,)).fetchone()
+                if row:
+                    self._versions[label] = row[0]
+                    return row[0]
+            version = self._versions.get(label)
+            if version is not None:
+                return version
+            return self._set_version(label)
+
+    def bump_graph_version(self, label: str) -> str:
+        """Объявляет граф метки `label` изменившимся; его результаты больше не выдаются."""
+        with self._lock:
+            version = self._set_version(label)
+            for key in [key for key, (entry_label, _) in self._entries.items() if entry_label == label]:
+                del self._entries[key]
+            if self._db is not None:
+                self._db.execute("DELETE FROM results WHERE label = ?", (label,))
+                self._db.commit()
+            return version
+
+    def _set_version(self, label: str) -> str:
+        version = uuid.uuid4().hex
+        self._versions[label] = version
+        if self._db is not None:
+            self._db.execute(
+                "INSERT INTO graph_versions (label, version) VALUES (?, ?) "
+                "ON CONFLICT(label) DO UPDATE SET version = excluded.version",
+                (label, version),
+            )
+            self._db.commit()
+        return version
+
+    # -------------------- Результаты --------------------
+
+    def key_for(self, analysis_context) -> str:
+        label = analysis_context.db_graph_parameters.main_node_name
+        return cache_key(analysis_context, self.graph_version(label))
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if self._db is not None:
+                row = self._db.execute("SELECT label, payload FROM results WHERE key = ?", (key,)).fetchone()
+                if row:
+                    value = json.loads(zlib.decompress(row[1]))
+                    self._remember(key, row[0], value)
+                    self.disk_hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def put(self, key: str, label: str, value: dict):
+        with self._lock:
+            self._remember(key, label, value)
+            if self._db is not None:
+                payload = zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"))
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results (key, label, version, created_at, payload) VALUES (?, ?, ?, ?, ?)",
+                    (key, label, self._versions.get(label, ""), time.time(), payload),
+                )
+                self._db.commit()
+
+    def _remember(self, key: str, label: str, value: dict):
+        self._entries[key] = (label, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM results")
+                self._db.execute("DELETE FROM graph_versions")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "persistent": self._db is not None,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+            }
+
+
+result_cache = AnalysisResultCache()
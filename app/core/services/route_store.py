@@ -0,0 +1,334 @@
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import zlib
+from abc import ABC, abstractmethod
+
+"""
+    Хранилища кеша маршрутов парсера
+
+    JsonRouteStore — исходная раскладка cache/routes_data/<город>/<транспорт>/
+    с отдельным JSON-файлом на маршрут. SQLiteRouteStore хранит все маршруты
+    в одном файле SQLite: сжатый компактный JSON на маршрут, индекс по
+    (город, транспорт, номер маршрута) и время загрузки.
+"""
+
+ROUTES_INDEX_FILE = "routes_index.json"
+# json остаётся по умолчанию: дерево cache/routes_data хранится в репозитории
+# и читается напрямую (benchmarks/betweenness_sampling.py); SQLite включается
+# через ROUTE_STORE=sqlite после миграции (см. migrate_json_cache)
+DEFAULT_BACKEND = os.environ.get("ROUTE_STORE", "json")
+DEFAULT_SQLITE_NAME = "routes.sqlite"
+
+
+def route_file_name(route_number):
+    """Имя JSON-файла маршрута с безопасными символами."""
+    safe_name = re.sub(r"[^a-zA-Zа-яА-Я0-9_-]", "_", route_number)
+    return f"{safe_name}.json"
+
+
+def is_fresh(fetched_at, expire_days):
+    """Проверяет, что с момента загрузки (unix time) прошло не больше expire_days дней."""
+    age_in_days = (
+        datetime.datetime.now() - datetime.datetime.fromtimestamp(fetched_at)
+    ).days
+    return age_in_days <= expire_days
+
+
+def is_file_fresh(path, expire_days):
+    """Проверяет актуальность файла по времени изменения."""
+    if not os.path.exists(path):
+        return False
+    return is_fresh(os.path.getmtime(path), expire_days)
+
+
+def write_json_atomic(path, data, indent=2):
+    """Записывает JSON во временный файл и атомарно подменяет им `path`."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class RouteStore(ABC):
+    """Кеш индекса маршрутов и данных маршрутов одного города и вида транспорта."""
+
+    def __init__(self, city, transport, expire_days):
+        self.city = city
+        self.transport = transport
+        self.expire_days = expire_days
+
+    @abstractmethod
+    def load_index(self):  # pragma: no cover
+        """Возвращает актуальный индекс маршрутов или None."""
+
+    @abstractmethod
+    def save_index(self, routes):  # pragma: no cover
+        """Сохраняет индекс маршрутов [[номер, название, url], ...]."""
+
+    @abstractmethod
+    def is_route_fresh(self, route_number):  # pragma: no cover
+        """Проверяет, есть ли актуальная запись маршрута."""
+
+    @abstractmethod
+    def load_route(self, route_number):  # pragma: no cover
+        """Возвращает данные маршрута, если запись актуальна, иначе None."""
+
+    @abstractmethod
+    def save_route(self, route_number, data):  # pragma: no cover
+        """Атомарно сохраняет данные маршрута."""
+
+    @abstractmethod
+    def record_stamps(self, route_numbers):  # pragma: no cover
+        """Возвращает {номер: (время загрузки, метка записи)} для индекса (ключ '') и маршрутов.
+
+        Метка меняется при каждой перезаписи и входит в отпечаток version().
+        """
+
+    def version(self, route_numbers):
+        """Отпечаток содержимого кеша для индекса и перечисленных маршрутов.
+
+        Маршруты, которых нет в кеше (например, не разобранные с сайта),
+        входят в отпечаток как отсутствующие. Возвращает
+        (digest, oldest_fetched_at) или None, если индекса нет либо
+        какая-то из записей устарела.
+        """
+        stamps = self.record_stamps(route_numbers)
+        if "" not in stamps:
+            return None
+        keys = ["", *dict.fromkeys(route_numbers)]
+        oldest = min(stamps[key][0] for key in keys if key in stamps)
+        if not is_fresh(oldest, self.expire_days):
+            return None
+        digest = hashlib.sha1()
+        for key in keys:
+            stamp = stamps[key][1] if key in stamps else None
+            digest.update(f"{key}\0{stamp!r}\n".encode("utf-8"))
+        return digest.hexdigest(), oldest
+
+
+class JsonRouteStore(RouteStore):
+    """Файловый кеш: отдельный JSON на маршрут и routes_index.json."""
+
+    def __init__(self, city, transport, expire_days, city_dir):
+        super().__init__(city, transport, expire_days)
+        self.city_dir = city_dir
+
+    def route_path(self, route_number):
+        """Путь к файлу маршрута."""
+        return os.path.join(self.city_dir, route_file_name(route_number))
+
+    @property
+    def index_path(self):
+        return os.path.join(self.city_dir, ROUTES_INDEX_FILE)
+
+    def load_index(self):
+        return self._load(self.index_path)
+
+    def save_index(self, routes):
+        write_json_atomic(self.index_path, routes)
+
+    def is_route_fresh(self, route_number):
+        return is_file_fresh(self.route_path(route_number), self.expire_days)
+
+    def load_route(self, route_number):
+        return self._load(self.route_path(route_number))
+
+    def save_route(self, route_number, data):
+        write_json_atomic(self.route_path(route_number), data)
+
+    def record_stamps(self, route_numbers):
+        stamps = {}
+        paths = {"": self.index_path}
+        paths.update((number, self.route_path(number)) for number in route_numbers)
+        for key, path in paths.items():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            stamps[key] = (stat.st_mtime, (stat.st_mtime_ns, stat.st_size, stat.st_ino))
+        return stamps
+
+    def _load(self, path):
+        if not is_file_fresh(path, self.expire_days):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+
+class SQLiteRouteStore(RouteStore):
+    """Единый файл SQLite со сжатыми записями маршрутов.
+
+    Индекс маршрутов хранится в той же таблице под пустым номером маршрута.
+    Соединения открываются на поток, запись выполняется в транзакции.
+    """
+
+    INDEX_KEY = ""
+
+    def __init__(self, city, transport, expire_days, db_path):
+        super().__init__(city, transport, expire_days)
+        self.db_path = db_path
+        self._local = threading.local()
+        ensure_schema(self._connection())
+
+    def load_index(self):
+        return self._load(self.INDEX_KEY)
+
+    def save_index(self, routes):
+        self._save(self.INDEX_KEY, routes)
+
+    def is_route_fresh(self, route_number):
+        row = self._connection().execute(
+            "SELECT fetched_at FROM routes WHERE city = ? AND transport = ? AND route_number = ?",
+            (self.city, self.transport, route_number),
+        ).fetchone()
+        return row is not None and is_fresh(row[0], self.expire_days)
+
+    def load_route(self, route_number):
+        return self._load(route_number)
+
+    def save_route(self, route_number, data):
+        self._save(route_number, data)
+
+    def record_stamps(self, route_numbers):
+        wanted = {self.INDEX_KEY, *route_numbers}
+        rows = self._connection().execute(
+            "SELECT route_number, fetched_at FROM routes WHERE city = ? AND transport = ?",
+            (self.city, self.transport),
+        )
+        return {
+            number: (fetched_at, fetched_at)
+            for number, fetched_at in rows
+            if number in wanted
+        }
+
+    def _load(self, key):
+        row = self._connection().execute(
+            "SELECT fetched_at, payload FROM routes WHERE city = ? AND transport = ? AND route_number = ?",
+            (self.city, self.transport, key),
+        ).fetchone()
+        if row is None or not is_fresh(row[0], self.expire_days):
+            return None
+        return decode_payload(row[1])
+
+    def _save(self, key, data, fetched_at=None):
+        fetched_at = fetched_at if fetched_at is not None else datetime.datetime.now().timestamp()
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO routes (city, transport, route_number, fetched_at, payload) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (self.city, self.transport, key, fetched_at, encode_payload(data)),
+            )
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            self._local.conn = conn
+        return conn
+
+
+def ensure_schema(conn):
+    """Создаёт таблицу маршрутов, если её ещё нет."""
+    conn.execute("PRAGMA journal_mode=WAL")
+    with conn:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS routes (
+                city TEXT NOT NULL,
+                transport TEXT NOT NULL,
+                route_number TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                payload BLOB NOT NULL,
+                PRIMARY KEY (city, transport, route_number)
+            )
+            """
+        )
+
+
+def encode_payload(data):
+    """Компактный JSON, сжатый zlib."""
+    raw = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return zlib.compress(raw.encode("utf-8"))
+
+
+def decode_payload(payload):
+    return json.loads(zlib.decompress(payload).decode("utf-8"))
+
+
+def get_route_store(city, transport, expire_days, base_cache_dir, city_dir, backend=None):
+    """Создаёт хранилище маршрутов выбранного бэкенда (`json` или `sqlite`)."""
+    backend = backend or DEFAULT_BACKEND
+    if backend == "json":
+        return JsonRouteStore(city, transport, expire_days, city_dir)
+    if backend == "sqlite":
+        db_path = os.path.join(base_cache_dir, DEFAULT_SQLITE_NAME)
+        return SQLiteRouteStore(city, transport, expire_days, db_path)
+    raise ValueError(f"Unknown route store backend: {backend}")
+
+
+def migrate_json_cache(base_cache_dir, db_path, expire_days=30):
+    """Импортирует дерево cache/routes_data в SQLite-хранилище.
+
+    Время загрузки берётся из mtime файлов, поэтому актуальность записей
+    после миграции не меняется. Возвращает число импортированных маршрутов.
+    """
+    routes_root = os.path.join(base_cache_dir, "routes_data")
+    imported = 0
+    if not os.path.isdir(routes_root):
+        return imported
+
+    for city in sorted(os.listdir(routes_root)):
+        city_path = os.path.join(routes_root, city)
+        if not os.path.isdir(city_path):
+            continue
+        for transport in sorted(os.listdir(city_path)):
+            transport_dir = os.path.join(city_path, transport)
+            if not os.path.isdir(transport_dir):
+                continue
+            store = SQLiteRouteStore(city, transport, expire_days, db_path)
+            for file_name in sorted(os.listdir(transport_dir)):
+                if not file_name.endswith(".json"):
+                    continue
+                path = os.path.join(transport_dir, file_name)
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                fetched_at = os.path.getmtime(path)
+                if file_name == ROUTES_INDEX_FILE:
+                    store._save(SQLiteRouteStore.INDEX_KEY, data, fetched_at)
+                    continue
+                route_number = data.get("routeNumber")
+                if not route_number:
+                    print(f"[WARN] Skipping {path}: no routeNumber")
+                    continue
+                store._save(route_number, data, fetched_at)
+                imported += 1
+            print(f"[INFO] Migrated {city}/{transport}")
+    return imported
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Импорт JSON-кеша маршрутов в единое SQLite-хранилище"
+    )
+    arg_parser.add_argument("--cache-dir", default="./cache")
+    arg_parser.add_argument("--db", default=None, help="путь к файлу SQLite")
+    args = arg_parser.parse_args()
+
+    target = args.db or os.path.join(args.cache_dir, DEFAULT_SQLITE_NAME)
+    count = migrate_json_cache(args.cache_dir, target)
+    print(f"[SUCCESS] Imported {count} routes into {target}")
@@ -0,0 +1,178 @@
+import json
+import math
+import os
+import re
+
+from app.core.services.route_store import write_json_atomic
+
+"""
+    Реестр остановок города с пространственным индексом
+
+    Сопоставляет паре (название, координата) каноническое имя узла графа.
+    Остановки с одинаковым названием в пределах допуска считаются одной
+    остановкой независимо от маршрута; одноимённые остановки в разных местах
+    получают суффиксы " 1", " 2", ... Остановки с приблизительной координатой
+    (взятой у предыдущей остановки маршрута) сопоставляются по названию и в
+    индекс не попадают: иначе точная координата той же остановки из другого
+    маршрута дала бы ещё один узел. Поиск идёт по сетке с шагом, равным
+    допуску, поэтому проверяются только 9 соседних ячеек.
+
+    Поэтому узлов может стать больше, чем при объединении только по названию:
+    в кеше Бирска 223 узла вместо 220 — разделяются «Николаевка» и
+    «По требованию» из разных сёл и две «Калинники» в ~0.6 км друг от друга.
+
+    Имена не зависят от порядка маршрутов: при первой сборке реестр
+    заполняется местами из кеша маршрутов в отсортированном порядке, и
+    маршруты сопоставляются с уже известными местами. Таблица остановок
+    сохраняется между сборками (stops.json рядом со снимком графа), поэтому
+    известное место сохраняет имя, а суффиксы получают только новые места.
+"""
+
+STOP_TOLERANCE = 0.005
+STOPS_FILE = "stops.json"
+
+_ROUTE_SUFFIX = re.compile(r"^(.*) (\d+)$")
+
+
+class StopRegistry:
+    """Канонические остановки одного города."""
+
+    def __init__(self, tolerance=STOP_TOLERANCE):
+        """Создаёт пустой реестр.
+
+        :param tolerance: расстояние в градусах, ближе которого одноимённые
+            остановки считаются одной (как в are_stops_same)
+        """
+        self.tolerance = tolerance
+        self._cells = {}
+        self._by_name = {}
+        self._pending = {}  # название -> имя узла, пока известна только приблизительная координата
+        self._ids = set()
+        self._next_suffix = {}
+        self._places = []  # [название, x, y, имя узла] для сохранения
+
+    def __len__(self):
+        return len(self._ids)
+
+    def resolve(self, name, x, y, is_approximate=False):
+        """Возвращает каноническое имя остановки `name` с координатой (x, y).
+
+        Если рядом уже есть одноимённая остановка, возвращается её имя,
+        иначе регистрируется новая. Для неизвестной или приблизительной
+        координаты берётся ближайшая одноимённая остановка (или первая, если
+        координаты нет); если таких ещё нет, имя резервируется и достаётся
+        первой точной координате этой остановки.
+        """
+        if x is None or y is None or is_approximate:
+            known = self._by_name.get(name)
+            if known:
+                if x is None or y is None:
+                    return known[0]
+                return self._nearest(name, x, y, math.inf) or known[0]
+            if name not in self._pending:
+                self._pending[name] = self._new_id(name)
+                self._places.append([name, None, None, self._pending[name]])
+            return self._pending[name]
+
+        stop_id = self._nearest(name, x, y, self.tolerance)
+        if stop_id is not None:
+            return stop_id
+
+        stop_id = self._pending.pop(name, None) or self._new_id(name)
+        self._add_place(name, x, y, stop_id)
+        return stop_id
+
+    def seed(self, stops):
+        """Регистрирует места остановок до объединения маршрутов.
+
+        `stops` — (название, x, y, приблизительная ли координата). Места
+        регистрируются в отсортированном порядке, поэтому имена узлов не
+        зависят от порядка маршрутов в индексе.
+        """
+        stops = sorted(
+            (name, x, y, bool(is_approximate))
+            for name, x, y, is_approximate in stops
+            if name is not None and x is not None and y is not None
+        )
+        for name, x, y, is_approximate in sorted(stops, key=lambda stop: stop[3]):
+            self.resolve(name, x, y, is_approximate)
+
+    # -------------------- Сохранение --------------------
+
+    @classmethod
+    def load(cls, path, tolerance=STOP_TOLERANCE):
+        """Реестр с местами из `path`; пустой, если файла нет или он повреждён."""
+        registry = cls(tolerance)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                places = json.load(f)
+        except (OSError, ValueError):
+            return registry
+        for name, x, y, stop_id in places:
+            registry._reserve(name, stop_id)
+            if x is None or y is None:
+                registry._pending[name] = stop_id
+                registry._places.append([name, None, None, stop_id])
+            else:
+                registry._add_place(name, x, y, stop_id)
+        return registry
+
+    def save(self, path):
+        """Атомарно записывает места реестра в `path`."""
+        places = [place for place in self._places if place[1] is not None or place[0] in self._pending]
+        write_json_atomic(path, places, indent=None)
+
+    # -------------------- Индекс --------------------
+
+    def _nearest(self, name, x, y, limit):
+        """Ближайшая одноимённая остановка ближе `limit` среди 9 соседних ячеек."""
+        cell_x, cell_y = self._cell(x, y)
+        best_id, best_dist = None, limit
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for stop_name, sx, sy, stop_id in self._cells.get((cell_x + dx, cell_y + dy), ()):
+                    if stop_name != name:
+                        continue
+                    dist = math.dist((x, y), (sx, sy))
+                    if dist < best_dist:
+                        best_id, best_dist = stop_id, dist
+        return best_id
+
+    def _add_place(self, name, x, y, stop_id):
+        self._cells.setdefault(self._cell(x, y), []).append((name, x, y, stop_id))
+        self._places.append([name, x, y, stop_id])
+
+    def _cell(self, x, y):
+        return math.floor(x / self.tolerance), math.floor(y / self.tolerance)
+
+    def _new_id(self, name):
+        """Подбирает свободное имя: `name`, затем `name 1`, `name 2`, ..."""
+        stop_id = name
+        suffix = self._next_suffix.get(name, 1)
+        while stop_id in self._ids:
+            stop_id = f"{name} {suffix}"
+            suffix += 1
+        self._next_suffix[name] = suffix
+        self._reserve(name, stop_id)
+        return stop_id
+
+    def _reserve(self, name, stop_id):
+        if stop_id not in self._ids:
+            self._ids.add(stop_id)
+            self._by_name.setdefault(name, []).append(stop_id)
+
+
+def route_stop_name(node_name, stop_names):
+    """Исходное название остановки для узла маршрута.
+
+    Внутри маршрута одноимённые остановки в разных местах получают суффиксы
+    (см. __check_and_find_unique_stop). Суффикс отбрасывается, только если
+    без него имя встречается в расписании маршрута, а с ним — нет, поэтому
+    названия вроде "Школа 5" не меняются.
+    """
+    if node_name in stop_names:
+        return node_name
+    match = _ROUTE_SUFFIX.match(node_name)
+    if match and match.group(1) in stop_names:
+        return match.group(1)
+    return node_name
@@ -0,0 +1,227 @@
+import hashlib
+import json
+import os
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from neo4j.exceptions import TransientError
+
+"""
+    Пакетная запись строк в Neo4j: транзакция на пакет, адаптивный размер
+    пакета и контрольные точки для продолжения прерванной загрузки
+"""
+
+CHECKPOINT_DIR = os.environ.get("INGEST_CHECKPOINT_DIR", "./cache/ingest_checkpoints")
+
+INITIAL_BATCH_SIZE = 5000
+MIN_BATCH_SIZE = 500
+MAX_BATCH_SIZE = 50000
+TARGET_BATCH_SECONDS = 2.0
+
+# --- Parallel Relationship Writes ---
+RELATIONSHIP_WRITE_WORKERS = int(os.environ.get("RELATIONSHIP_WRITE_WORKERS", "1"))
+RELATIONSHIP_PARTITIONS = 8
+DEADLOCK_RETRIES = 5
+DEADLOCK_BACKOFF_SEC = 0.2
+
+
+def insert_data(tx, query: str, rows: List[dict], batch_size: int = 10000) -> int:
+    if not rows:
+        return 0
+
+    total = 0
+    for start in range(0, len(rows), batch_size):
+        batch_data = rows[start:start + batch_size]
+        results = tx.run(query, parameters={'rows': batch_data}).data()
+        total += results[0]['total'] if results else 0
+    return total
+
+
+def rows_digest(rows: List[dict], digest=None):
+    """Дополняет sha1-отпечаток строками `rows` (порядок важен)."""
+    digest = digest or hashlib.sha1()
+    for row in rows:
+        digest.update(json.dumps(row, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+        digest.update(b"\n")
+    return digest
+
+
+class IngestCheckpoint:
+    """Файл с числом записанных строк и отпечатком этих строк по стадиям.
+
+    Продолжение допускается, только если первые `committed` строк новой
+    загрузки дают тот же отпечаток, иначе стадия пишется с начала.
+    """
+
+    def __init__(self, name: str, directory: Optional[str] = None):
+        safe_name = "".join(c if c.isalnum() or c in "_-" else "_" for c in name)
+        self.path = os.path.join(directory or CHECKPOINT_DIR, f"{safe_name}.json")
+        self.state = self._read()
+
+    def _read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def resume_offset(self, stage: str, rows: List[dict]) -> int:
+        """Число уже записанных строк стадии или 0, если строки изменились."""
+        saved = self.state.get(stage)
+        if not saved or saved["committed"] > len(rows):
+            return 0
+        if rows_digest(rows[:saved["committed"]]).hexdigest() != saved["digest"]:
+            return 0
+        return saved["committed"]
+
+    def commit(self, stage: str, committed: int, digest: str):
+        self.state[stage] = {"committed": committed, "digest": digest}
+        self._write()
+
+    def clear(self):
+        self.state = {}
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def _write(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.path)
+
+
+class BatchWriter:
+    """Пишет строки пакетами, каждый пакет — в отдельной транзакции.
+
+    Размер пакета подстраивается под время фиксации: быстрые пакеты
+    увеличивают его в 1.5 раза, медленные (дольше `target_seconds`)
+    уменьшают вдвое. После каждого пакета обновляется контрольная точка.
+    """
+
+    def __init__(self, connection, query: str, checkpoint: Optional[IngestCheckpoint] = None,
+                 stage: str = "rows", batch_size: int = INITIAL_BATCH_SIZE,
+                 min_batch_size: int = MIN_BATCH_SIZE, max_batch_size: int = MAX_BATCH_SIZE,
+                 target_seconds: float = TARGET_BATCH_SECONDS):
+        self.connection = connection
+        self.query = query
+        self.checkpoint = checkpoint
+        self.stage = stage
+        self.batch_size = batch_size
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.target_seconds = target_seconds
+        self.batches = 0
+
+    def write(self, rows: List[dict]) -> int:
+        """Записывает `rows`, продолжая с контрольной точки. Возвращает сумму total."""
+        offset = self.checkpoint.resume_offset(self.stage, rows) if self.checkpoint else 0
+        if offset:
+            print(f"[INFO] Resuming '{self.stage}' from row {offset} of {len(rows)}")
+        digest = rows_digest(rows[:offset])
+
+        total = 0
+        while offset < len(rows):
+            batch = rows[offset:offset + self.batch_size]
+            started = time.monotonic()
+            total += self.connection.execute_write(insert_data, self.query, batch, len(batch)) or 0
+            self._tune(time.monotonic() - started)
+
+            offset += len(batch)
+            self.batches += 1
+            rows_digest(batch, digest)
+            if self.checkpoint:
+                self.checkpoint.commit(self.stage, offset, digest.hexdigest())
+        return total
+
+    def _tune(self, elapsed: float):
+        if elapsed > self.target_seconds:
+            self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+        elif elapsed < self.target_seconds / 2:
+            self.batch_size = min(self.max_batch_size, int(self.batch_size * 1.5))
+
+
+def node_group(name, groups: int) -> int:
+    """Стабильный номер группы узла (crc32 имени)."""
+    return zlib.crc32(str(name).encode("utf-8")) % groups
+
+
+def partition_relationships(rows: List[dict], groups: int = RELATIONSHIP_PARTITIONS,
+                            start_key: str = "startStop", end_key: str = "endStop") -> List[List[List[dict]]]:
+    """Раскладывает связи по раундам из непересекающихся по узлам частей.
+
+    Узлы делятся на `groups` групп по хешу имени, связь попадает в ячейку
+    неупорядоченной пары групп своих концов. Ячейки распределяются по
+    раундам круговой схемой (как туры круговой системы), поэтому в одном
+    раунде каждая группа узлов встречается не более одного раза и
+    параллельные транзакции раунда не блокируют одни и те же узлы.
+    Возвращает список раундов, раунд — список непустых частей.
+    """
+    if groups % 2:
+        groups += 1
+    cells = {}
+    for row in rows:
+        a = node_group(row.get(start_key), groups)
+        b = node_group(row.get(end_key), groups)
+        cells.setdefault((min(a, b), max(a, b)), []).append(row)
+
+    rounds = []
+    # Круговой метод: группа 0 неподвижна, остальные сдвигаются на каждом туре
+    others = list(range(1, groups))
+    for shift in range(groups - 1):
+        ring = [0] + others[shift:] + others[:shift]
+        pairs = [(ring[i], ring[groups - 1 - i]) for i in range(groups // 2)]
+        rounds.append([cells[key] for key in (tuple(sorted(p)) for p in pairs) if key in cells])
+    # Связи внутри одной группы: группы попарно различны
+    rounds.append([cells[(g, g)] for g in range(groups) if (g, g) in cells])
+    return [parts for parts in rounds if parts]
+
+
+def write_with_retry(connection, query: str, rows: List[dict],
+                     retries: int = DEADLOCK_RETRIES, backoff: float = DEADLOCK_BACKOFF_SEC) -> int:
+    """Записывает `rows` одной транзакцией, повторяя её при TransientError (deadlock)."""
+    for attempt in range(retries + 1):
+        try:
+            return connection.execute_write(insert_data, query, rows, len(rows)) or 0
+        except TransientError as e:
+            if attempt == retries:
+                raise
+            delay = backoff * (2 ** attempt)
+            print(f"[WARN] Transient write error ({e.code}), retry {attempt + 1}/{retries} in {delay:.1f}s")
+            time.sleep(delay)
+    return 0
+
+
+class ParallelRelationshipWriter:
+    """Параллельная запись связей из нескольких сессий драйвера.
+
+    Раунды partition_relationships выполняются по очереди, части раунда —
+    одновременно в пуле из `workers` потоков. Каждая часть пишется пакетами
+    не больше `batch_size`, пакет — отдельная транзакция с повтором при
+    deadlock.
+    """
+
+    def __init__(self, connection, query: str, workers: int = 4,
+                 groups: int = RELATIONSHIP_PARTITIONS, batch_size: int = INITIAL_BATCH_SIZE):
+        self.connection = connection
+        self.query = query
+        self.workers = workers
+        self.groups = groups
+        self.batch_size = batch_size
+
+    def write(self, rows: List[dict]) -> int:
+        total = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for parts in partition_relationships(rows, self.groups):
+                total += sum(pool.map(self._write_part, parts))
+        return total
+
+    def _write_part(self, rows: List[dict]) -> int:
+        total = 0
+        for start in range(0, len(rows), self.batch_size):
+            total += write_with_retry(self.connection, self.query, rows[start:start + self.batch_size])
+        return total
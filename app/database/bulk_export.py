@@ -0,0 +1,144 @@
+import argparse
+import csv
+import hashlib
+import os
+from typing import List
+
+"""
+    Выгрузка графа в CSV для `neo4j-admin database import`
+
+    Связи пишутся на диск по мере поступления, в памяти остаются только
+    последние состояния узлов и 8-байтовые отпечатки ключей связей.
+    При закрытии связи переписываются в итоговый файл: как и MERGE по имени
+    в Cypher-пути, из дубликатов (начало, конец, имя) остаётся последний,
+    а связи с неизвестными концами отбрасываются.
+"""
+
+ARRAY_DELIMITER = "|"
+
+NODES_HEADER_FILE = "nodes_header.csv"
+NODES_FILE = "nodes.csv"
+RELATIONSHIPS_HEADER_FILE = "relationships_header.csv"
+RELATIONSHIPS_FILE = "relationships.csv"
+RAW_RELATIONSHIPS_FILE = "relationships.raw.csv"
+CONSTRAINTS_FILE = "constraints.cypher"
+
+
+def _key_hash(*parts) -> int:
+    digest = hashlib.blake2b(digest_size=8)
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return int.from_bytes(digest.digest(), "big")
+
+
+class BulkImportExporter:
+    """Пишет узлы и связи в CSV-файлы формата neo4j-admin import.
+
+    `add(nodes, relationships)` совместим с колбэком on_route парсера.
+    """
+
+    def __init__(self, directory: str, node_label: str, rels_type: str):
+        self.directory = directory
+        self.node_label = node_label
+        self.rels_type = rels_type
+        self.nodes = {}
+        self._last_row = {}
+        self._raw_rows = 0
+        os.makedirs(directory, exist_ok=True)
+        self._raw_file = open(os.path.join(directory, RAW_RELATIONSHIPS_FILE), "w", encoding="utf-8", newline="")
+        self._raw_writer = csv.writer(self._raw_file)
+
+    def abort(self):
+        """Закрывает и удаляет промежуточный файл связей."""
+        self._raw_file.close()
+        os.remove(os.path.join(self.directory, RAW_RELATIONSHIPS_FILE))
+
+    def add(self, nodes: List[dict], relationships: List[dict]):
+        for node in nodes:
+            if node.get("name") is not None:
+                self.nodes[node["name"]] = node
+        for rel in relationships:
+            row = [rel.get("startStop"), rel.get("endStop"), rel.get("name"), rel.get("duration"), rel.get("route")]
+            row = ["" if value is None else str(value) for value in row]
+            self._raw_writer.writerow(row)
+            self._last_row[_key_hash(*row[:3])] = self._raw_rows
+            self._raw_rows += 1
+
+    def close(self, constraints: List[str] = ()) -> dict:
+        """Дописывает узлы, оставляет последние версии связей и заголовки."""
+        self._raw_file.close()
+        self._write_headers()
+
+        with open(os.path.join(self.directory, NODES_FILE), "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            for name, node in self.nodes.items():
+                writer.writerow([name, self.node_label, *self._node_properties(node)])
+
+        raw_path = os.path.join(self.directory, RAW_RELATIONSHIPS_FILE)
+        written = 0
+        with open(raw_path, "r", encoding="utf-8", newline="") as src, \
+                open(os.path.join(self.directory, RELATIONSHIPS_FILE), "w", encoding="utf-8", newline="") as dst:
+            writer = csv.writer(dst)
+            for index, (start, end, name, duration, route) in enumerate(csv.reader(src)):
+                if self._last_row.get(_key_hash(start, end, name)) != index:
+                    continue
+                if start not in self.nodes or end not in self.nodes:
+                    continue
+                writer.writerow([start, end, self.rels_type, name, duration, route])
+                written += 1
+        os.remove(raw_path)
+
+        with open(os.path.join(self.directory, CONSTRAINTS_FILE), "w", encoding="utf-8") as f:
+            for constraint in constraints:
+                f.write(f"{constraint};\n")
+        return {"nodes": len(self.nodes), "relationships": written}
+
+    def _write_headers(self):
+        with open(os.path.join(self.directory, NODES_HEADER_FILE), "w", encoding="utf-8", newline="") as f:
+            csv.writer(f).writerow([
+                f"name:ID({self.node_label})",
+                ":LABEL",
+                "location:point{crs:WGS-84}",
+                "routeList:string[]",
+                "isCoordinateApproximate:boolean",
+            ])
+        with open(os.path.join(self.directory, RELATIONSHIPS_HEADER_FILE), "w", encoding="utf-8", newline="") as f:
+            csv.writer(f).writerow([
+                f":START_ID({self.node_label})",
+                f":END_ID({self.node_label})",
+                ":TYPE",
+                "name",
+                "duration:long",
+                "route",
+            ])
+
+    def _node_properties(self, node: dict) -> list:
+        x, y = node.get("xCoordinate"), node.get("yCoordinate")
+        location = "" if x is None or y is None else f"{{latitude:{y!r}, longitude:{x!r}}}"
+        routes = node.get("routeList") or []
+        for route in routes:
+            if ARRAY_DELIMITER in str(route):
+                raise ValueError(f"Route '{route}' contains array delimiter '{ARRAY_DELIMITER}'")
+        approximate = node.get("isCoordinateApproximate")
+        return [
+            location,
+            ARRAY_DELIMITER.join(str(route) for route in routes),
+            "" if approximate is None else str(approximate).lower(),
+        ]
+
+
+if __name__ == "__main__":
+    from app.core.context.analysis_context import AnalysisContext
+    from app.models.graph_types import GraphTypes
+
+    arg_parser = argparse.ArgumentParser(description="Выгрузка графа города в CSV для neo4j-admin import")
+    arg_parser.add_argument("--city", required=True)
+    arg_parser.add_argument("--graph-type", default="BUS_GRAPH", choices=[t.name for t in GraphTypes])
+    arg_parser.add_argument("--out", default="./import")
+    args = arg_parser.parse_args()
+
+    context = AnalysisContext(city_name=args.city, graph_type=GraphTypes[args.graph_type])
+    manager = context.graph_type.value(context)
+    stats = manager.export_bulk_import(args.out)
+    print(f"[SUCCESS] Exported {stats['nodes']} nodes and {stats['relationships']} relationships to {args.out}")
@@ -1,19 +1,43 @@
 from abc import ABC, abstractmethod
+import os
+import queue
 import re
-from typing import List, TYPE_CHECKING
-
-import pandas as pd
+import threading
+from contextlib import nullcontext
+from typing import Callable, List, Optional, TYPE_CHECKING
 
+from app.database import batch_writer
+from app.database.batch_writer import (
+    BatchWriter,
+    IngestCheckpoint,
+    ParallelRelationshipWriter,
+    insert_data,
+)
+from app.core.services.result_cache import result_cache
 from app.database.neo4j_connection import Neo4jConnection
 
 if TYPE_CHECKING:
     from app.core.context.analysis_context import AnalysisContext
 
+# Потоковая запись графа: включается переменной окружения STREAM_GRAPH_UPDATES=1
+STREAM_GRAPH_UPDATES = os.environ.get("STREAM_GRAPH_UPDATES", "0") == "1"
+STREAM_QUEUE_SIZE = 32
+STREAM_BATCH_SIZE = 5000
+# Быстрая первичная загрузка в пустую метку: включается FRESH_GRAPH_LOAD=1
+FRESH_GRAPH_LOAD = os.environ.get("FRESH_GRAPH_LOAD", "0") == "1"
+# Запись только изменившихся маршрутов: включается INCREMENTAL_GRAPH_UPDATES=1
+INCREMENTAL_GRAPH_UPDATES = os.environ.get("INCREMENTAL_GRAPH_UPDATES", "0") == "1"
+
 
 class GraphDBManager(ABC):
+    # write_lock(): контекст, под которым идёт запись в Neo4j; парсинг идёт без него
+    write_lock = None
+
     def __init__(self, analysis_context: "AnalysisContext"):
         self.connection = Neo4jConnection()
         self.city_name = analysis_context.city_name
+        # on_progress(event, count): ход загрузки, см. AbstractTransportGraphParser.parse
+        self.on_progress = None
         self.enrich_db_parameters(analysis_context)
         self.db_graph_parameters = analysis_context.db_graph_parameters
 
@@ -24,6 +48,10 @@ class GraphDBManager(ABC):
         analysis_context.db_graph_parameters.main_node_name = self.get_main_node_name()
         analysis_context.db_graph_parameters.weight = self.get_weight()
 
+    def report_progress(self, event: str, count: int = 1):
+        if self.on_progress is not None:
+            self.on_progress(event, count)
+
     @abstractmethod
     def get_graph(self):  # pragma: no cover
         pass
@@ -77,14 +105,150 @@ class OneTypeNodeDBManager(GraphDBManager):
     def create_relationships_query(self) -> str:  # pragma: no cover
         pass
 
-    def update_db(self, city_name):
+    def update_db(self, city_name, streaming: Optional[bool] = None,
+                  relationship_workers: Optional[int] = None, fresh_load: Optional[bool] = None,
+                  incremental: Optional[bool] = None):
+        """Записывает граф города в БД.
+
+        В потоковом режиме (`streaming=True` или STREAM_GRAPH_UPDATES=1)
+        маршруты пишутся пачками по мере парсинга через StreamingGraphWriter.
+        При `relationship_workers` > 1 (по умолчанию RELATIONSHIP_WRITE_WORKERS)
+        связи пишутся параллельно через ParallelRelationshipWriter, без
+        контрольной точки для этой стадии.
+        При `fresh_load=True` (по умолчанию FRESH_GRAPH_LOAD) и пустой метке
+        граф загружается через fresh_load_db.
+        При `incremental=True` (по умолчанию INCREMENTAL_GRAPH_UPDATES)
+        записываются только изменения, см. incremental_update_db.
+        После записи в on_progress передаётся "written" с числом маршрутов графа,
+        а версия графа в result_cache меняется, чтобы не выдавать старые результаты анализа.
+        Запись и смена версии идут под write_lock, если он задан; при потоковой
+        записи парсинг чередуется с записью, и write_lock держится всё время.
+        """
+        if relationship_workers is None:
+            relationship_workers = batch_writer.RELATIONSHIP_WRITE_WORKERS
+        if fresh_load is None:
+            fresh_load = FRESH_GRAPH_LOAD
+        if incremental is None:
+            incremental = INCREMENTAL_GRAPH_UPDATES
+        if streaming is None:
+            streaming = STREAM_GRAPH_UPDATES
+        if streaming:
+            with self._write_phase():
+                relationships = self.stream_update_db(city_name)
+                self._graph_written(relationships)
+            return
+
         (nodes, relationships) = self.get_graph()
         if nodes is None and relationships is None:
             print("Graph for", city_name, "is empty!")
             return
+        with self._write_phase():
+            if fresh_load and self.create_node_fresh_query() and self.is_label_empty():
+                self.fresh_load_db(nodes, relationships, relationship_workers)
+            elif incremental:
+                self.incremental_update_db(city_name, nodes, relationships)
+            else:
+                self.write_graph(nodes, relationships, relationship_workers)
+            self._graph_written(relationships)
+
+    def _write_phase(self):
+        return self.write_lock() if self.write_lock is not None else nullcontext()
+
+    def _graph_written(self, relationships: Optional[List[dict]]):
+        if relationships is None:
+            return
+        result_cache.bump_graph_version(self.get_main_node_name())
+        self.report_progress("written", len({rel.get("route") for rel in relationships}))
+
+    def write_graph(self, nodes: List[dict], relationships: List[dict], relationship_workers: int = 1):
+        """Полная запись графа через MERGE с контрольными точками."""
+        self.connection.execute_write(self.create_constraints)
+        checkpoint = IngestCheckpoint(f"{self.get_main_node_name()}_{self.get_main_rels_name()}")
+        BatchWriter(self.connection, self.create_node_query(), checkpoint, stage="nodes").write(nodes)
+        if relationship_workers > 1:
+            ParallelRelationshipWriter(
+                self.connection, self.create_relationships_query(), workers=relationship_workers
+            ).write(relationships)
+        else:
+            BatchWriter(self.connection, self.create_relationships_query(), checkpoint, stage="relationships").write(relationships)
+        checkpoint.clear()
+
+    def incremental_update_db(self, city_name, nodes: List[dict], relationships: List[dict]):
+        """Записывает только изменения графа; по умолчанию — полная запись."""
+        self.write_graph(nodes, relationships)
+
+    def fresh_load_db(self, nodes: List[dict], relationships: List[dict], relationship_workers: int = 1):
+        """Первичная загрузка в пустую метку.
+
+        Узлы создаются через CREATE, каждый пакет возвращает соответствие
+        имя -> elementId, связи создаются по этим id без MATCH по имени.
+        Ограничения и индексы строятся после загрузки. Прерванная загрузка
+        оставляет метку непустой, и следующий update_db пойдёт обычным
+        путём через MERGE.
+        """
+        unique_nodes = list({node.get("name"): node for node in nodes if node.get("name") is not None}.values())
+        element_ids = {}
+        for start in range(0, len(unique_nodes), batch_writer.INITIAL_BATCH_SIZE):
+            batch = unique_nodes[start:start + batch_writer.INITIAL_BATCH_SIZE]
+            element_ids.update(self.connection.execute_write(create_returning_ids, self.create_node_fresh_query(), batch))
+
+        # MERGE по имени связи оставлял последнюю версию дубликата — так же и здесь
+        rows = {}
+        for rel in relationships:
+            start_id = element_ids.get(rel.get("startStop"))
+            end_id = element_ids.get(rel.get("endStop"))
+            if start_id is None or end_id is None:
+                continue
+            rows[(start_id, end_id, rel.get("name"))] = {**rel, "startId": start_id, "endId": end_id}
+        rows = list(rows.values())
+
+        query = self.create_relationships_by_id_query()
+        if relationship_workers > 1:
+            ParallelRelationshipWriter(self.connection, query, workers=relationship_workers).write(rows)
+        else:
+            BatchWriter(self.connection, query).write(rows)
+        self.connection.execute_write(self.create_constraints)
+        print(f"[INFO] Fresh load: {len(element_ids)} nodes, {len(rows)} relationships")
+
+    def is_label_empty(self) -> bool:
+        rows = self.connection.read_all(
+            f"MATCH (n:{self.get_main_node_name()}) WITH n LIMIT 1 RETURN count(n) = 0 AS empty"
+        )
+        return bool(rows) and rows[0]["empty"] is True
+
+    def create_node_fresh_query(self) -> Optional[str]:
+        """CREATE-запрос узлов, возвращающий name и elementId(id); None — не поддерживается."""
+        return None
+
+    def create_relationships_by_id_query(self) -> Optional[str]:
+        """Запрос создания связей по startId/endId (elementId концов)."""
+        return None
+
+    def stream_update_db(self, city_name):
         self.connection.execute_write(self.create_constraints)
-        self.connection.execute_write(insert_data, self.create_node_query(), nodes)
-        self.connection.execute_write(insert_data, self.create_relationships_query(), relationships)
+        with StreamingGraphWriter(
+            self.connection, self.create_node_query(), self.create_relationships_query()
+        ) as writer:
+            (nodes, relationships) = self.stream_graph(writer.push)
+        if nodes is None and relationships is None:
+            print("Graph for", city_name, "is empty!")
+            return None
+        print(
+            f"[INFO] Streamed {writer.written_nodes} node and "
+            f"{writer.written_relationships} relationship rows for {city_name}"
+        )
+        return relationships
+
+    def stream_graph(self, on_route: Callable[[List[dict], List[dict]], None]):
+        """Отдаёт граф в `on_route` частями по мере построения.
+
+        По умолчанию граф строится целиком через get_graph() и передаётся
+        одной частью; наследники с пошаговым построением переопределяют метод.
+        """
+        (nodes, relationships) = self.get_graph()
+        if nodes is not None or relationships is not None:
+            on_route(nodes or [], relationships or [])
+        return nodes, relationships
 
     def get_bd_all_node_graph(self):
         query = self.get_bd_all_node_query_graph()
@@ -113,18 +277,110 @@ class OneTypeNodeDBManager(GraphDBManager):
         return safe
 
 
-def insert_data(tx, query: str, rows: List[dict], batch_size: int = 10000) -> int:
-    if not rows:
-        return 0
+def create_returning_ids(tx, query: str, rows: List[dict]) -> dict:
+    """Выполняет CREATE-запрос пакета и возвращает {name: elementId}."""
+    return {record["name"]: record["id"] for record in tx.run(query, parameters={"rows": rows})}
+
+
+class StreamingGraphWriter:
+    """Фоновая пакетная запись узлов и связей из ограниченной очереди.
+
+    Производитель (парсер) кладёт части графа через push() и блокируется,
+    если очередь заполнена, поэтому в памяти одновременно находится не более
+    `queue_size` частей и по одному буферу узлов и связей. Узлы с одним
+    именем внутри буфера схлопываются до последнего состояния. Перед записью
+    связей всегда записываются накопленные узлы, так что MATCH по концам
+    связи находит их.
+    """
+
+    _DONE = object()
+
+    def __init__(self, connection, node_query: str, rels_query: str,
+                 batch_size: int = STREAM_BATCH_SIZE, queue_size: int = STREAM_QUEUE_SIZE):
+        self.connection = connection
+        self.node_query = node_query
+        self.rels_query = rels_query
+        self.batch_size = batch_size
+        self.written_nodes = 0
+        self.written_relationships = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._nodes = {}
+        self._relationships = []
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="graph-writer", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+            return False
+        # Ошибка производителя важнее ошибки записи: дописываем и не маскируем её
+        try:
+            self.close()
+        except Exception as e:
+            print("[WARN] Graph writer failed after producer error:", e)
+        return False
+
+    def push(self, nodes: List[dict], relationships: List[dict]):
+        """Ставит часть графа в очередь записи."""
+        self._raise_if_failed()
+        while True:
+            try:
+                self._queue.put((nodes, relationships), timeout=0.5)
+                return
+            except queue.Full:
+                self._raise_if_failed()
+
+    def close(self):
+        """Дожидается записи всех частей и пробрасывает ошибку писателя."""
+        if self._thread.is_alive():
+            self._queue.put(self._DONE)
+            self._thread.join()
+        self._raise_if_failed()
+
+    def _raise_if_failed(self):
+        if self._error is not None:
+            raise self._error
+
+    def _run(self):
+        try:
+            while True:
+                item = self._queue.get()
+                if item is self._DONE:
+                    break
+                nodes, relationships = item
+                for node in nodes:
+                    self._nodes[node.get("name")] = node
+                self._relationships.extend(relationships)
+                if len(self._nodes) >= self.batch_size:
+                    self._flush_nodes()
+                if len(self._relationships) >= self.batch_size:
+                    self._flush_nodes()
+                    self._flush_relationships()
+            self._flush_nodes()
+            self._flush_relationships()
+        except Exception as e:
+            self._error = e
+            # Освобождаем производителя, ожидающего места в очереди
+            while True:
+                try:
+                    if self._queue.get_nowait() is self._DONE:
+                        break
+                except queue.Empty:
+                    break
 
-    total = 0
-    df = pd.DataFrame(rows)
-    batch = 0
+    def _flush_nodes(self):
+        if self._nodes:
+            rows = list(self._nodes.values())
+            self._nodes = {}
+            self.connection.execute_write(insert_data, self.node_query, rows)
+            self.written_nodes += len(rows)
 
-    while batch * batch_size < len(df):
-        current_batch = df.iloc[batch * batch_size:(batch + 1) * batch_size]
-        batch_data = current_batch.to_dict('records')
-        results = tx.run(query, parameters={'rows': batch_data}).data()
-        total += results[0]['total'] if results else 0
-        batch += 1
-    return total
+    def _flush_relationships(self):
+        if self._relationships:
+            rows, self._relationships = self._relationships, []
+            self.connection.execute_write(insert_data, self.rels_query, rows)
+            self.written_relationships += len(rows)
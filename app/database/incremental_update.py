@@ -0,0 +1,130 @@
+import hashlib
+import json
+from typing import Dict, List
+
+from app.database.batch_writer import BatchWriter
+
+"""
+    Инкрементальное обновление графа по отпечаткам маршрутов
+
+    Для каждого маршрута считается отпечаток его связей и остановок
+    (без routeList, который зависит от других маршрутов) и хранится в БД
+    в узлах RouteFingerprint. При обновлении пишутся только изменившиеся
+    маршруты: их связи, затронутые остановки (новые и прежние) и удаления.
+"""
+
+FINGERPRINT_LABEL = "RouteFingerprint"
+
+
+def route_fingerprints(nodes: List[dict], relationships: List[dict]) -> Dict[str, dict]:
+    """Возвращает {маршрут: {"hash", "stops", "relationships"}} для графа."""
+    routes = {}
+    for node in nodes:
+        for route in node.get("routeList") or []:
+            routes.setdefault(str(route), {"stops": [], "relationships": []})["stops"].append(node)
+    for rel in relationships:
+        routes.setdefault(str(rel.get("route")), {"stops": [], "relationships": []})["relationships"].append(rel)
+
+    fingerprints = {}
+    for route, data in routes.items():
+        stops = sorted(
+            (n.get("name"), n.get("xCoordinate"), n.get("yCoordinate"), n.get("isCoordinateApproximate"))
+            for n in data["stops"]
+        )
+        rels = sorted(
+            (r.get("startStop"), r.get("endStop"), r.get("name"), r.get("duration"))
+            for r in data["relationships"]
+        )
+        digest = hashlib.sha1(json.dumps([stops, rels], ensure_ascii=False, default=str).encode("utf-8"))
+        fingerprints[route] = {
+            "hash": digest.hexdigest(),
+            "stops": [stop[0] for stop in stops],
+            "relationships": data["relationships"],
+        }
+    return fingerprints
+
+
+class IncrementalGraphUpdater:
+    """Применяет к БД только изменения маршрутов относительно прошлой записи."""
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.connection = manager.connection
+        self.node_label = manager.db_graph_parameters.main_node_name
+        self.rels_type = manager.db_graph_parameters.main_rels_name
+
+    def stored_fingerprints(self) -> Dict[str, dict]:
+        rows = self.connection.read_all(
+            f"MATCH (f:{FINGERPRINT_LABEL} {{label: $label}}) "
+            "RETURN f.route AS route, f.hash AS hash, f.stops AS stops",
+            {"label": self.node_label},
+        )
+        return {row["route"]: {"hash": row["hash"], "stops": row["stops"] or []} for row in rows}
+
+    def update(self, nodes: List[dict], relationships: List[dict]) -> dict:
+        """Пишет изменения и возвращает счётчики; при отсутствии отпечатков — полная запись."""
+        current = route_fingerprints(nodes, relationships)
+        stored = self.stored_fingerprints()
+        if not stored:
+            self.manager.write_graph(nodes, relationships)
+            self._save_fingerprints(current, list(current))
+            return {"mode": "full", "routes": len(current)}
+
+        changed = [route for route, fp in current.items() if stored.get(route, {}).get("hash") != fp["hash"]]
+        removed = [route for route in stored if route not in current]
+        if not changed and not removed:
+            return {"mode": "incremental", "changed": 0, "removed": 0, "nodes": 0, "relationships": 0}
+
+        affected = set()
+        for route in changed + removed:
+            affected.update(stored.get(route, {}).get("stops", []))
+        for route in changed:
+            affected.update(current[route]["stops"])
+
+        nodes_by_name = {node.get("name"): node for node in nodes}
+        upsert_nodes = [nodes_by_name[name] for name in sorted(affected) if name in nodes_by_name]
+        deleted_nodes = sorted(name for name in affected if name not in nodes_by_name)
+        upsert_rels = [rel for route in changed for rel in current[route]["relationships"]]
+
+        self.connection.execute_write(self.manager.create_constraints)
+        BatchWriter(self.connection, self.manager.create_node_query()).write(upsert_nodes)
+        self.connection.run(
+            f"UNWIND $routes AS route "
+            f"MATCH (:{self.node_label})-[r:{self.rels_type} {{route: route}}]->(:{self.node_label}) "
+            f"WHERE NOT r.name IN $keep DELETE r",
+            {"routes": changed + removed, "keep": [rel.get("name") for rel in upsert_rels]},
+        )
+        if deleted_nodes:
+            self.connection.run(
+                f"MATCH (s:{self.node_label}) WHERE s.name IN $names DETACH DELETE s",
+                {"names": deleted_nodes},
+            )
+        BatchWriter(self.connection, self.manager.create_relationships_query()).write(upsert_rels)
+
+        self._save_fingerprints(current, changed)
+        if removed:
+            self.connection.run(
+                f"MATCH (f:{FINGERPRINT_LABEL} {{label: $label}}) WHERE f.route IN $routes DELETE f",
+                {"label": self.node_label, "routes": removed},
+            )
+        return {
+            "mode": "incremental",
+            "changed": len(changed),
+            "removed": len(removed),
+            "nodes": len(upsert_nodes) + len(deleted_nodes),
+            "relationships": len(upsert_rels),
+        }
+
+    def _save_fingerprints(self, fingerprints: Dict[str, dict], routes: List[str]):
+        rows = [
+            {"route": route, "hash": fingerprints[route]["hash"], "stops": fingerprints[route]["stops"]}
+            for route in routes
+        ]
+        query = f"""
+        UNWIND $rows AS row
+        MERGE (f:{FINGERPRINT_LABEL} {{label: '{self.node_label}', route: row.route}})
+            SET f.hash = row.hash,
+                f.stops = row.stops
+        RETURN COUNT(*) AS total
+        """
+        BatchWriter(self.connection, query).write(rows)
@@ -1,39 +1,228 @@
-from neo4j import GraphDatabase
+from neo4j import AsyncGraphDatabase, GraphDatabase
 import os
+import threading
+from contextlib import asynccontextmanager, contextmanager
 from dotenv import load_dotenv
 
+"""
+    Подключение к Neo4j
+
+    Драйвер Neo4j держит пул соединений и рассчитан на один экземпляр на
+    процесс. init_driver() создаёт общий драйвер при старте приложения,
+    после этого все Neo4jConnection работают через него, а close() у них
+    его не закрывает. Без общего драйвера (скрипты, тесты) каждое
+    подключение создаёт и закрывает собственный драйвер, как раньше.
+
+    AsyncNeo4jConnection — то же для асинхронного драйвера: запросы из
+    обработчиков FastAPI не блокируют цикл событий на время работы GDS.
+    Асинхронный драйвер привязан к циклу событий, поэтому создаётся
+    отдельно, в init_async_driver() при старте приложения.
+"""
+
+load_dotenv()
+
+NEO4J_MAX_POOL_SIZE = int(os.environ.get("NEO4J_MAX_POOL_SIZE", "100"))
+NEO4J_ACQUISITION_TIMEOUT = float(os.environ.get("NEO4J_ACQUISITION_TIMEOUT", "60"))
+
+_shared_driver = None
+_shared_async_driver = None
+_shared_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {
+    "sessions_opened": 0,
+    "sessions_in_use": 0,
+    "peak_sessions_in_use": 0,
+    "session_errors": 0,
+}
+
+
+def _driver_settings():
+    return {
+        "auth": (os.environ.get("GRAPH_DATABASE_USER"), os.environ.get("GRAPH_DATABASE_PASSWORD")),
+        "max_connection_pool_size": NEO4J_MAX_POOL_SIZE,
+        "connection_acquisition_timeout": NEO4J_ACQUISITION_TIMEOUT,
+    }
+
+
+def _create_driver():
+    return GraphDatabase.driver(os.environ.get("GRAPH_DATABASE_URL"), **_driver_settings())
+
+
+def _create_async_driver():
+    return AsyncGraphDatabase.driver(os.environ.get("GRAPH_DATABASE_URL"), **_driver_settings())
+
+
+def init_driver():
+    """Создаёт общий драйвер процесса (повторный вызов возвращает тот же)."""
+    global _shared_driver
+    with _shared_lock:
+        if _shared_driver is None:
+            _shared_driver = _create_driver()
+            print(f"[INFO] Neo4j driver pool created (max size {NEO4J_MAX_POOL_SIZE}, "
+                  f"acquisition timeout {NEO4J_ACQUISITION_TIMEOUT}s)")
+        return _shared_driver
+
+
+def close_driver():
+    """Закрывает общий драйвер; новые подключения снова создают свои."""
+    global _shared_driver
+    with _shared_lock:
+        driver, _shared_driver = _shared_driver, None
+    if driver is not None:
+        driver.close()
+        print("[INFO] Neo4j driver pool closed")
+
+
+def get_driver():
+    return _shared_driver
+
+
+def init_async_driver():
+    """Создаёт общий асинхронный драйвер; вызывается внутри цикла событий."""
+    global _shared_async_driver
+    with _shared_lock:
+        if _shared_async_driver is None:
+            _shared_async_driver = _create_async_driver()
+        return _shared_async_driver
+
+
+async def close_async_driver():
+    global _shared_async_driver
+    with _shared_lock:
+        driver, _shared_async_driver = _shared_async_driver, None
+    if driver is not None:
+        await driver.close()
+
+
+def get_async_driver():
+    return _shared_async_driver
+
+
+def _session_opened():
+    with _stats_lock:
+        _stats["sessions_opened"] += 1
+        _stats["sessions_in_use"] += 1
+        _stats["peak_sessions_in_use"] = max(_stats["peak_sessions_in_use"], _stats["sessions_in_use"])
+
+
+def _session_closed(failed):
+    with _stats_lock:
+        _stats["sessions_in_use"] -= 1
+        if failed:
+            _stats["session_errors"] += 1
+
+
+def pool_stats() -> dict:
+    """Счётчики сессий Neo4jConnection и AsyncNeo4jConnection и настройки пула.
+
+    Драйвер не раскрывает метрики своего пула, поэтому считаются сессии,
+    открытые через этот модуль, а не соединения пула. Сессия занимает не
+    больше одного соединения, так что session_utilization — оценка сверху
+    загрузки пула этими подключениями.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["shared"] = _shared_driver is not None
+    stats["shared_async"] = _shared_async_driver is not None
+    stats["max_pool_size"] = NEO4J_MAX_POOL_SIZE
+    stats["acquisition_timeout"] = NEO4J_ACQUISITION_TIMEOUT
+    stats["session_utilization"] = (
+        round(stats["sessions_in_use"] / NEO4J_MAX_POOL_SIZE, 3) if NEO4J_MAX_POOL_SIZE else 0.0
+    )
+    return stats
+
+
 class Neo4jConnection:
     def __init__(self):
-        load_dotenv()
-        self.__uri = os.environ.get("GRAPH_DATABASE_URL")
-        self.__user = os.environ.get("GRAPH_DATABASE_USER")
-        self.__pwd = os.environ.get("GRAPH_DATABASE_PASSWORD")
-        self.__driver = None
+        self.__driver = get_driver()
+        self.__owns_driver = self.__driver is None
+        if not self.__owns_driver:
+            return
 
         try:
-            self.__driver = GraphDatabase.driver(self.__uri, auth=(self.__user, self.__pwd))
+            self.__driver = _create_driver()
         except Exception as e:
             print("Failed to create the driver:", e)
 
     def close(self):
-        if self.__driver:
+        if self.__driver and self.__owns_driver:
             self.__driver.close()
 
-    def run(self, query, parameters=None):
+    @contextmanager
+    def __session(self):
         assert self.__driver, "Driver not initialized!"
         with self.__driver.session() as session:
+            _session_opened()
+            failed = False
+            try:
+                yield session
+            except Exception:
+                failed = True
+                raise
+            finally:
+                _session_closed(failed)
+
+    def run(self, query, parameters=None):
+        with self.__session() as session:
             result = session.run(query, parameters)
             return list(result)
 
     def read_all(self, query, parameters=None):
-        assert self.__driver, "Driver not initialized!"
         def read_tx(tx):
             result = tx.run(query, parameters)
             return [dict(record) for record in result]
-        with self.__driver.session() as session:
+        with self.__session() as session:
             return session.execute_read(read_tx)
 
     def execute_write(self, tx_func, *args, **kwargs):
-        assert self.__driver, "Driver not initialized!"
-        with self.__driver.session() as session:
+        with self.__session() as session:
             return session.execute_write(tx_func, *args, **kwargs)
+
+
+class AsyncNeo4jConnection:
+    """Асинхронный аналог Neo4jConnection с тем же набором методов."""
+
+    def __init__(self):
+        self.__driver = get_async_driver()
+        self.__owns_driver = self.__driver is None
+        if not self.__owns_driver:
+            return
+
+        try:
+            self.__driver = _create_async_driver()
+        except Exception as e:
+            print("Failed to create the async driver:", e)
+
+    async def close(self):
+        if self.__driver and self.__owns_driver:
+            await self.__driver.close()
+
+    @asynccontextmanager
+    async def __session(self):
+        assert self.__driver, "Driver not initialized!"
+        async with self.__driver.session() as session:
+            _session_opened()
+            failed = False
+            try:
+                yield session
+            except Exception:
+                failed = True
+                raise
+            finally:
+                _session_closed(failed)
+
+    async def run(self, query, parameters=None):
+        async with self.__session() as session:
+            result = await session.run(query, parameters)
+            return [record async for record in result]
+
+    async def read_all(self, query, parameters=None):
+        async def read_tx(tx):
+            result = await tx.run(query, parameters)
+            return [dict(record) async for record in result]
+        async with self.__session() as session:
+            return await session.execute_read(read_tx)
+
+    async def execute_write(self, tx_func, *args, **kwargs):
+        async with self.__session() as session:
+            return await session.execute_write(tx_func, *args, **kwargs)
@@ -54,6 +54,23 @@ class PostgresManager:
                 );
             """)
 
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS ingest_jobs (
+                    id UUID PRIMARY KEY,
+                    dataset_id UUID NOT NULL,
+                    user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+                    guest_token TEXT,
+                    city TEXT NOT NULL,
+                    transport_type TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    progress JSONB NOT NULL DEFAULT '{}'::jsonb,
+                    error TEXT,
+                    created_at TIMESTAMPTZ DEFAULT NOW(),
+                    updated_at TIMESTAMPTZ DEFAULT NOW()
+                );
+            """)
+
             await conn.execute("""
                 CREATE TABLE IF NOT EXISTS verification_codes (
                     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
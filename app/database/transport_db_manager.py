@@ -1,7 +1,17 @@
 from typing import List, Tuple
 
-from app.core.services.parsers import BusGraphParser, TrolleyGraphParser, TramGraphParser, MiniBusGraphParser
+from app.core.services.parsers import (
+    FETCH_WORKERS,
+    PARSE_WORKERS,
+    BusGraphParser,
+    MiniBusGraphParser,
+    TramGraphParser,
+    TrolleyGraphParser,
+)
+from app.core.services.result_cache import result_cache
+from app.database.bulk_export import BulkImportExporter
 from app.database.graph_db_manager import OneTypeNodeDBManager
+from app.database.incremental_update import IncrementalGraphUpdater
 from abc import abstractmethod
 
 class TransportNetworkGraphDBManager(OneTypeNodeDBManager):
@@ -28,6 +38,27 @@ class TransportNetworkGraphDBManager(OneTypeNodeDBManager):
         RETURN COUNT(*) AS total
         """
     
+    def create_node_fresh_query(self) -> str:
+        return f"""
+        UNWIND $rows AS row
+        CREATE (s:{self.db_graph_parameters.main_node_name} {{name: row.name}})
+            SET s.location = point({{latitude: row.yCoordinate, longitude: row.xCoordinate}}),
+                s.routeList = row.routeList,
+                s.isCoordinateApproximate = row.isCoordinateApproximate
+        RETURN row.name AS name, elementId(s) AS id
+        """
+
+    def create_relationships_by_id_query(self) -> str:
+        return f"""
+        UNWIND $rows AS path
+        MATCH (u) WHERE elementId(u) = path.startId
+        MATCH (v) WHERE elementId(v) = path.endId
+        CREATE (u)-[r:{self.db_graph_parameters.main_rels_name} {{name: path.name}}]->(v)
+            SET r.duration = path.duration,
+                r.route = path.route
+        RETURN COUNT(*) AS total
+        """
+
     def get_bd_all_node_query_graph(self):
         return f'''
         MATCH (s:{self.db_graph_parameters.main_node_name})
@@ -57,8 +88,57 @@ class TransportNetworkGraphDBManager(OneTypeNodeDBManager):
             f"CREATE INDEX IF NOT EXISTS FOR ()-[r:{self.db_graph_parameters.main_rels_name}]-() ON r.name"
         ]
     
+    def get_graph(self) -> Tuple[List[dict], List[dict]]:
+        nodes, relationships = self._parse()
+        return list(nodes.values()), relationships
+
+    def stream_graph(self, on_route):
+        """Передаёт маршруты в `on_route` по мере парсинга."""
+        nodes, relationships = self._parse(on_route=on_route)
+        if nodes is None:
+            return None, None
+        return list(nodes.values()), relationships
+
+    def _parse(self, **kwargs):
+        """Запускает парсер, передавая ему on_progress менеджера, если он задан.
+
+        Маршруты загружаются в FETCH_WORKERS потоков, HTML разбирается в
+        PARSE_WORKERS процессах; темп запросов к сайту по-прежнему
+        ограничивает общий rate_limiter.
+        """
+        kwargs.setdefault("workers", FETCH_WORKERS)
+        kwargs.setdefault("parse_workers", PARSE_WORKERS)
+        if self.on_progress is not None:
+            kwargs["on_progress"] = self.on_progress
+        return self.create_parser().parse(**kwargs)
+
+    def incremental_update_db(self, city_name, nodes, relationships):
+        """Пишет только маршруты, чьи отпечатки изменились с прошлой записи."""
+        stats = IncrementalGraphUpdater(self).update(nodes, relationships)
+        print(f"[INFO] Incremental update of {city_name}: {stats}")
+
+    def export_bulk_import(self, directory: str) -> dict:
+        """Выгружает граф в CSV для `neo4j-admin database import` (см. scripts/bulk_import.sh).
+
+        Связи пишутся на диск по мере парсинга маршрутов. Граф в БД после
+        импорта заменится, поэтому версия графа в result_cache меняется сразу.
+        """
+        exporter = BulkImportExporter(
+            directory,
+            self.db_graph_parameters.main_node_name,
+            self.db_graph_parameters.main_rels_name,
+        )
+        try:
+            self.stream_graph(exporter.add)
+        except BaseException:
+            exporter.abort()
+            raise
+        stats = exporter.close(self.get_constraint_list())
+        result_cache.bump_graph_version(self.get_main_node_name())
+        return stats
+
     @abstractmethod
-    def get_graph(self):
+    def create_parser(self):
         pass
 
     @abstractmethod
@@ -76,10 +156,8 @@ class TransportNetworkGraphDBManager(OneTypeNodeDBManager):
 
 class BusGraphDBManager(TransportNetworkGraphDBManager):
 
-    def get_graph(self) -> Tuple[List[dict], List[dict]]:
-        parser = BusGraphParser(self.city_name)
-        nodes, relationships = parser.parse()
-        return list(nodes.values()), relationships
+    def create_parser(self):
+        return BusGraphParser(self.city_name)
 
     def get_node_name(self) -> str:
         return f"{self.city_name}BusStop"
@@ -95,10 +173,8 @@ class BusGraphDBManager(TransportNetworkGraphDBManager):
 
 
 class TrolleyGraphDBManager(BusGraphDBManager):
-    def get_graph(self) -> Tuple[List[dict], List[dict]]:
-        parser = TrolleyGraphParser(self.city_name)
-        nodes, relationships = parser.parse()
-        return list(nodes.values()), relationships
+    def create_parser(self):
+        return TrolleyGraphParser(self.city_name)
 
     def get_node_name(self) -> str:
         return f"{self.city_name}TrolleyStop"
@@ -108,10 +184,8 @@ class TrolleyGraphDBManager(BusGraphDBManager):
 
 
 class TramGraphDBManager(BusGraphDBManager):
-    def get_graph(self) -> Tuple[List[dict], List[dict]]:
-        parser = TramGraphParser(self.city_name)
-        nodes, relationships = parser.parse()
-        return list(nodes.values()), relationships
+    def create_parser(self):
+        return TramGraphParser(self.city_name)
 
     def get_node_name(self) -> str:
         return f"{self.city_name}TramStop"
@@ -121,10 +195,8 @@ class TramGraphDBManager(BusGraphDBManager):
 
 
 class MiniBusGraphDBManager(BusGraphDBManager):
-    def get_graph(self) -> Tuple[List[dict], List[dict]]:
-        parser = MiniBusGraphParser(self.city_name)
-        nodes, relationships = parser.parse()
-        return list(nodes.values()), relationships
+    def create_parser(self):
+        return MiniBusGraphParser(self.city_name)
 
     def get_node_name(self) -> str:
         return f"{self.city_name}MiniBusStop"
@@ -50,6 +50,11 @@ from app.core.storage import active_datasets
 from app.core.context.analysis_context import AnalysisContext
 from app.core.context.metric_calculation_context import MetricCalculationContext
 from app.database.postgres import postgres_manager
+from app.core.services.ingest_jobs import ingest_jobs
+from app.core.services.projection_manager import projection_manager
+from app.database.neo4j_connection import (
+    AsyncNeo4jConnection, init_driver, close_driver, init_async_driver, close_async_driver
+)
 
 TRANSPORT_TO_GRAPH = {
     "bus": GraphTypes.BUS_GRAPH,
@@ -84,6 +89,15 @@ app.include_router(api_router, prefix="/v1")
 # --- восстановление active_datasets при старте ---
 @app.on_event("startup")
 async def restore_active_datasets():
+    init_driver()
+    init_async_driver()
+    # Учёт проекций и очереди анализов хранятся в памяти процесса, поэтому
+    # сервер запускается одним воркером uvicorn (без --workers N)
+    connection = AsyncNeo4jConnection()
+    try:
+        await projection_manager.sync_catalog_async(connection)
+    finally:
+        await connection.close()
     await postgres_manager.init()
 
     async for db in postgres_manager.get_db():
@@ -108,6 +122,14 @@ async def restore_active_datasets():
         finally:
             break  # закрываем генератор после первого соединения
 
+    await ingest_jobs.restore()
+
+
+@app.on_event("shutdown")
+async def close_neo4j_driver():
+    close_driver()
+    await close_async_driver()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, conlist, EmailStr
-from typing import List, Optional
+from typing import Dict, List, Optional
 from uuid import UUID
 from enum import Enum
 
@@ -19,6 +19,18 @@ class MetricType(str, Enum):
     BETWEENNESS_CENTRALITY = "betweenness"
 
 
+class WeightTransform(str, Enum):
+    LOG1P = "log1p"
+    INVERSE = "inverse"
+    RAW = "raw"
+    DISTANCE = "distance"
+
+
+class AccuracyMode(str, Enum):
+    EXACT = "exact"
+    SAMPLED = "sampled"
+
+
 # Auth Schemas
 class RequestCodeRequest(BaseModel):
     email: EmailStr = Field(..., json_schema_extra={"example": "user@example.com"})
@@ -51,6 +63,26 @@ class DatasetUploadRequest(BaseModel):
 
 class DatasetUploadResponse(BaseModel):
     dataset_id: UUID = Field(..., json_schema_extra={"example": "b361e37f-a5bc-436d-ac58-dfe573c29aac"})
+    job_id: Optional[UUID] = Field(None, description="Задача загрузки, см. /datasets/jobs/{job_id}")
+
+
+class IngestProgress(BaseModel):
+    total: int = Field(0, description="Маршрутов в индексе города")
+    fetched: int = Field(0, description="Маршрутов загружено из сети")
+    cached: int = Field(0, description="Маршрутов взято из кеша")
+    written: int = Field(0, description="Маршрутов записано в БД")
+    failed: int = Field(0, description="Маршрутов, которые не удалось разобрать")
+
+
+class IngestJobResponse(BaseModel):
+    job_id: UUID
+    dataset_id: UUID
+    city: str
+    transport_type: TransportType
+    status: str = Field(..., json_schema_extra={"example": "running"},
+                        description="queued / running / completed / failed / interrupted")
+    progress: IngestProgress
+    error: Optional[str] = None
 
 
 class DatasetInfo(BaseModel):
@@ -92,6 +124,9 @@ class ClusterStatistics(BaseModel):
 class ClusterRequest(BaseModel):
     dataset_id: UUID = Field(..., json_schema_extra={"example": "b361e37f-a5bc-436d-ac58-dfe573c29aac"})
     method: ClusteringMethod = Field(..., description="Метод кластеризации")
+    weight_transform: WeightTransform = Field(
+        WeightTransform.LOG1P, description="Преобразование весов рёбер при построении проекции"
+    )
 
 
 class ClusterResponse(BaseModel):
@@ -114,9 +149,61 @@ class MetricNode(BaseModel):
 class MetricAnalysisRequest(BaseModel):
     dataset_id: UUID = Field(..., json_schema_extra={"example": "b361e37f-a5bc-436d-ac58-dfe573c29aac"})
     metric_type: MetricType = Field(...)
+    weight_transform: WeightTransform = Field(
+        WeightTransform.LOG1P, description="Преобразование весов рёбер при построении проекции"
+    )
+    sampling_size: Optional[int] = Field(
+        None, ge=1, description="Betweenness по выборке из стольких исходных узлов"
+    )
+    sampling_seed: Optional[int] = Field(None, description="Зерно выборки исходных узлов")
+    target_latency_ms: Optional[float] = Field(
+        None, gt=0, description="Целевое время расчёта Betweenness; размер выборки подбирается по числу узлов"
+    )
+
+
+class MetricAccuracy(BaseModel):
+    mode: AccuracyMode = Field(..., json_schema_extra={"example": "sampled"})
+    sampling_size: Optional[int] = None
+    sampling_seed: Optional[int] = None
+    node_count: Optional[int] = None
 
 
 class MetricAnalysisResponse(BaseModel):
     dataset_id: UUID
     metric_type: MetricType = Field("metric", json_schema_extra={"example": "metric"})
     nodes: List[MetricNode]
+    accuracy: MetricAccuracy = Field(default_factory=lambda: MetricAccuracy(mode=AccuracyMode.EXACT))
+
+
+class CombinedAnalysisRequest(BaseModel):
+    dataset_id: UUID = Field(..., json_schema_extra={"example": "b361e37f-a5bc-436d-ac58-dfe573c29aac"})
+    metrics: List[MetricType] = Field(default_factory=list, json_schema_extra={"example": ["pagerank", "betweenness"]})
+    clusterings: List[ClusteringMethod] = Field(default_factory=list, json_schema_extra={"example": ["leiden"]})
+    weight_transform: WeightTransform = Field(
+        WeightTransform.LOG1P, description="Преобразование весов рёбер при построении проекции"
+    )
+
+
+class CombinedNode(BaseModel):
+    id: str
+    name: str
+    coordinates: conlist(float, min_length=2, max_length=2) = Field(
+    ...,
+    description="[longitude, latitude]",
+    json_schema_extra={"example": [30.33, 59.93]}
+)
+    pagerank: Optional[float] = None
+    betweenness: Optional[float] = None
+    leiden_community: Optional[int] = None
+    louvain_community: Optional[int] = None
+
+
+class CombinedAnalysisResponse(BaseModel):
+    dataset_id: UUID
+    metrics: List[MetricType]
+    clusterings: List[ClusteringMethod]
+    nodes: List[CombinedNode]
+    statistics: Dict[ClusteringMethod, ClusterStatistics] = Field(
+        default_factory=dict,
+        description="Показатели качества для каждого метода кластеризации"
+    )
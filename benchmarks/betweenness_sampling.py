@@ -0,0 +1,165 @@
+import argparse
+import glob
+import heapq
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+from app.core.services.parsers import BASE_CACHE_DIR
+
+"""
+    Точность выборочного Betweenness на кешах маршрутов
+
+    Для каждого города из cache/routes_data строится граф остановок так же,
+    как проекция анализа: неориентированный, параллельные рёбра сводятся к
+    минимальному весу log(1 + duration). Betweenness считается точно
+    (алгоритм Брандеса из каждого узла) и по выборке из k исходных узлов,
+    затем сравнивается ранговая корреляция Спирмена и доля общих узлов в
+    топе. Расчёт идёт в Python без Neo4j: абсолютное время отличается от
+    GDS, но отношение времени точного и выборочного расчёта примерно равно
+    n / k. GDS выбирает источники по своей стратегии, поэтому цифры
+    ориентировочные.
+
+    python -m benchmarks.betweenness_sampling --cities Самара Казань --samples 32 128 512
+"""
+
+
+def load_city_graph(city, transport="bus"):
+    """Список смежности и имена остановок из файлов маршрутов кеша (без обращения к сети)."""
+    weights = {}
+    pattern = os.path.join(BASE_CACHE_DIR, "routes_data", city.lower(), transport, "*.json")
+    for path in sorted(glob.glob(pattern)):
+        if os.path.basename(path) == "routes_index.json":
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            route = json.load(f)
+        for rel in route.get("relationships", []):
+            u, v = sorted((rel["startStop"], rel["endStop"]))
+            if u == v:
+                continue
+            duration = rel.get("duration")
+            weight = 1.0 if duration is None else math.log1p(duration)
+            weights[(u, v)] = min(weight, weights.get((u, v), weight))
+
+    names = sorted({stop for pair in weights for stop in pair})
+    index = {name: i for i, name in enumerate(names)}
+    adjacency = [[] for _ in names]
+    for (u, v), weight in weights.items():
+        adjacency[index[u]].append((index[v], weight))
+        adjacency[index[v]].append((index[u], weight))
+    return adjacency, names
+
+
+def betweenness(adjacency, sources):
+    """Betweenness по алгоритму Брандеса (Дейкстра) из заданных исходных узлов."""
+    n = len(adjacency)
+    centrality = np.zeros(n)
+    for s in sources:
+        dist = [math.inf] * n
+        sigma = [0] * n
+        preds = [[] for _ in range(n)]
+        done = [False] * n
+        order = []
+        dist[s] = 0.0
+        sigma[s] = 1
+        heap = [(0.0, s)]
+        while heap:
+            d, v = heapq.heappop(heap)
+            if done[v]:
+                continue
+            done[v] = True
+            order.append(v)
+            for w, weight in adjacency[v]:
+                candidate = d + weight
+                if candidate < dist[w]:
+                    dist[w] = candidate
+                    sigma[w] = sigma[v]
+                    preds[w] = [v]
+                    heapq.heappush(heap, (candidate, w))
+                elif candidate == dist[w] and not done[w]:
+                    sigma[w] += sigma[v]
+                    preds[w].append(v)
+
+        delta = [0.0] * n
+        for w in reversed(order):
+            for v in preds[w]:
+                delta[v] += sigma[v] / sigma[w] * (1.0 + delta[w])
+            if w != s:
+                centrality[w] += delta[w]
+    # в неориентированном графе каждый путь учтён с обоих концов
+    return centrality / 2.0
+
+
+def ranks(values):
+    """Ранги с усреднением одинаковых значений."""
+    order = np.argsort(values, kind="mergesort")
+    positions = np.empty(len(values))
+    positions[order] = np.arange(len(values))
+    _, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+    return np.bincount(inverse, weights=positions)[inverse] / counts[inverse]
+
+
+def spearman(a, b):
+    ra, rb = ranks(a), ranks(b)
+    if ra.std() == 0 or rb.std() == 0:
+        return float("nan")
+    return float(np.corrcoef(ra, rb)[0, 1])
+
+
+def top_overlap(a, b, top):
+    top = min(top, len(a))
+    return len(set(np.argsort(-a)[:top]) & set(np.argsort(-b)[:top])) / top
+
+
+def timed(compute):
+    started = time.perf_counter()
+    value = compute()
+    return value, time.perf_counter() - started
+
+
+def benchmark_city(city, samples, repeats, seed, top):
+    adjacency, names = load_city_graph(city)
+    n = len(names)
+    if n == 0:
+        print(f"[WARN] {city}: no cached routes, skipped")
+        return
+
+    exact, exact_time = timed(lambda: betweenness(adjacency, range(n)))
+    print(f"\n{city}: {n} nodes, exact {exact_time:.2f}s")
+    print(f"{'k':>6} {'share':>6} {'time':>8} {'speed-up':>9} {'spearman':>9} {'min':>7} {f'top-{top}':>7}")
+
+    for k in samples:
+        if k >= n:
+            continue
+        correlations, overlaps, elapsed = [], [], []
+        for repeat in range(repeats):
+            sources = np.random.default_rng(seed + repeat).choice(n, size=k, replace=False)
+            sampled, sampled_time = timed(lambda: betweenness(adjacency, sources) * (n / k))
+            correlations.append(spearman(exact, sampled))
+            overlaps.append(top_overlap(exact, sampled, top))
+            elapsed.append(sampled_time)
+        mean_time = sum(elapsed) / repeats
+        print(
+            f"{k:>6} {k / n:>6.1%} {mean_time:>7.2f}s {exact_time / mean_time:>8.1f}x "
+            f"{np.mean(correlations):>9.3f} {min(correlations):>7.3f} {np.mean(overlaps):>7.2f}"
+        )
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Rank correlation of sampled vs exact betweenness")
+    arg_parser.add_argument("--cities", nargs="+", default=["Бирск", "Котлас", "Самара", "Казань"])
+    arg_parser.add_argument("--samples", type=int, nargs="+", default=[32, 64, 128, 256, 512])
+    arg_parser.add_argument("--repeats", type=int, default=3, help="прогонов с разными зёрнами выборки")
+    arg_parser.add_argument("--seed", type=int, default=42)
+    arg_parser.add_argument("--top", type=int, default=50, help="размер топа для сравнения узлов")
+    args = arg_parser.parse_args()
+
+    for city in args.cities:
+        benchmark_city(city, args.samples, args.repeats, args.seed, args.top)
+
+
+if __name__ == "__main__":
+    main()
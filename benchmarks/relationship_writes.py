@@ -0,0 +1,85 @@
+import argparse
+import time
+
+from app.core.services.parsers import BusGraphParser
+from app.database.batch_writer import BatchWriter, ParallelRelationshipWriter
+from app.database.neo4j_connection import Neo4jConnection
+
+"""
+    Сравнение последовательной и параллельной записи связей в Neo4j
+
+    Берёт граф города из кеша маршрутов (снимок или файлы маршрутов),
+    пишет его во временные метки BenchStop/BenchSegment и замеряет только
+    стадию связей. Перед каждым прогоном связи удаляются, узлы остаются.
+
+    python -m benchmarks.relationship_writes --city Самара --workers 1 2 4 8
+"""
+
+NODE_LABEL = "BenchStop"
+RELS_LABEL = "BenchSegment"
+
+NODE_QUERY = f"""
+UNWIND $rows AS row
+MERGE (s:{NODE_LABEL} {{name: row.name}})
+RETURN COUNT(*) AS total
+"""
+
+RELS_QUERY = f"""
+UNWIND $rows AS path
+MATCH (u:{NODE_LABEL} {{name: path.startStop}})
+MATCH (v:{NODE_LABEL} {{name: path.endStop}})
+MERGE (u)-[r:{RELS_LABEL} {{name: path.name}}]->(v)
+    SET r.duration = path.duration,
+        r.route = path.route
+RETURN COUNT(*) AS total
+"""
+
+
+def clear_relationships(connection):
+    connection.run(f"MATCH ()-[r:{RELS_LABEL}]->() CALL {{ WITH r DELETE r }} IN TRANSACTIONS OF 10000 ROWS")
+
+
+def timed(label, write):
+    started = time.perf_counter()
+    total = write()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<14} {elapsed:8.2f}s  {total} rows")
+    return elapsed
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Serial vs parallel relationship writes")
+    arg_parser.add_argument("--city", default="Самара")
+    arg_parser.add_argument("--workers", type=int, nargs="+", default=[2, 4, 8])
+    arg_parser.add_argument("--repeat", type=int, default=3, help="копий графа с разными именами связей")
+    args = arg_parser.parse_args()
+
+    nodes, relationships = BusGraphParser(args.city).parse()
+    rows = [
+        dict(rel, name=f"{rel['name']}#{copy}")
+        for copy in range(args.repeat)
+        for rel in relationships
+    ]
+    print(f"[INFO] {args.city}: {len(nodes)} nodes, {len(rows)} relationships")
+
+    connection = Neo4jConnection()
+    try:
+        connection.run(f"CREATE CONSTRAINT IF NOT EXISTS FOR (s:{NODE_LABEL}) REQUIRE s.name IS UNIQUE")
+        BatchWriter(connection, NODE_QUERY).write(list(nodes.values()))
+
+        clear_relationships(connection)
+        serial = timed("serial", lambda: BatchWriter(connection, RELS_QUERY).write(rows))
+        for workers in args.workers:
+            clear_relationships(connection)
+            elapsed = timed(
+                f"parallel x{workers}",
+                lambda: ParallelRelationshipWriter(connection, RELS_QUERY, workers=workers).write(rows),
+            )
+            print(f"{'':<14} speed-up {serial / elapsed:.2f}x")
+    finally:
+        connection.run(f"MATCH (s:{NODE_LABEL}) CALL {{ WITH s DETACH DELETE s }} IN TRANSACTIONS OF 10000 ROWS")
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,11 +5,43 @@ import CitySelector from "./CitySelector.tsx";
 import DatasetList from "./DatasetList.tsx";
 
 // Читаем актуальный токен непосредственно при запросе
+const authHeaders = (): Record<string, string> => {
+  const token = localStorage.getItem("token");
+  return token ? { Authorization: token } : {};
+};
+
+const JOB_POLL_INTERVAL_MS = 2000;
+const FINISHED_STATUSES = ["completed", "failed", "interrupted"];
+
+interface IngestJob {
+  status: string;
+  progress: { total: number; fetched: number; cached: number; written: number; failed: number };
+  error?: string | null;
+}
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// Опрашиваем задачу загрузки, пока она не завершится: датасет появляется
+// в списке только после записи графа. EventSource (/events) не умеет
+// передавать заголовок Authorization, поэтому используем опрос.
+async function waitForJob(jobId: string, onProgress: (job: IngestJob) => void): Promise<IngestJob> {
+  for (;;) {
+    const res = await fetch(`/v1/datasets/jobs/${jobId}`, {
+      headers: { Accept: "application/json", ...authHeaders() },
+    });
+    if (!res.ok) throw new Error(`HTTP error! status: ${res.status}`);
+    const job: IngestJob = await res.json();
+    onProgress(job);
+    if (FINISHED_STATUSES.includes(job.status)) return job;
+    await sleep(JOB_POLL_INTERVAL_MS);
+  }
+}
 
 export default function ParamsSelector() {
   const { city, transport, setAll, resetAnalysisData, bumpDatasetsRefresh } = useParamsStore();
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState<string>("");
+  const [progress, setProgress] = useState<string>("");
 
   const isValid = city.trim() !== "" && transport !== "";
 
@@ -18,16 +50,16 @@ export default function ParamsSelector() {
 
     setIsLoading(true);
     setError("");
+    setProgress("");
     resetAnalysisData();
 
     try {
-      const token = localStorage.getItem("token");
       const res = await fetch("/v1/datasets/", {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
           Accept: "application/json",
-          ...(token ? { Authorization: token } : {}),
+          ...authHeaders(),
         },
         body: JSON.stringify({ city, transport_type: transport }),
       });
@@ -42,6 +74,12 @@ export default function ParamsSelector() {
       }
       const data = await res.json();
       if (!data.dataset_id) throw new Error("Invalid response: dataset_id is missing");
+      if (data.job_id) {
+        const job = await waitForJob(data.job_id, ({ progress: p }) => {
+          if (p.total) setProgress(`${p.fetched + p.cached + p.failed} / ${p.total} маршрутов`);
+        });
+        if (job.status !== "completed") throw new Error(job.error || `job ${job.status}`);
+      }
       // Тригерим обновление списка датасетов
       bumpDatasetsRefresh();
     } catch (error) {
@@ -49,6 +87,7 @@ export default function ParamsSelector() {
       setError(`Не удалось создать датасет: ${error instanceof Error ? error.message : "Unknown error"}`);
     } finally {
       setIsLoading(false);
+      setProgress("");
     }
   };
 
@@ -127,7 +166,7 @@ export default function ParamsSelector() {
                     d="M4 12a8 8 0 018-8V0C5.346 0 0 5.346 0 12h4zm2 5.291A7.962 7.962 0 014 12H0c0 3.042 1.135 5.824 3 7.938l3-2.643z"
                   ></path>
                 </svg>
-                Загрузка данных
+                Загрузка данных{progress && ` (${progress})`}
               </span>
             ) : (
               "Загрузить"
@@ -0,0 +1,42 @@
+#!/usr/bin/env bash
+# Загрузка CSV, выгруженных python -m app.database.bulk_export, в новую локальную БД Neo4j.
+#
+#   scripts/bulk_import.sh ./import <database>
+#
+# neo4j-admin database import full создаёт базу заново (--overwrite-destination),
+# поэтому сервер (или целевая база) должен быть остановлен, а всё содержимое
+# базы — в том числе графы других городов — будет удалено. Имя базы
+# обязательно; основную базу neo4j скрипт перезаписывает только при
+# ALLOW_OVERWRITE_NEO4J=1. После импорта запустите сервер и
+# примените constraints.cypher — скрипт делает это сам, если задан
+# GRAPH_DATABASE_PASSWORD и доступен cypher-shell.
+set -euo pipefail
+
+USAGE="usage: $0 <export dir> <database> (the database is wiped; set ALLOW_OVERWRITE_NEO4J=1 to import into 'neo4j')"
+EXPORT_DIR="${1:?$USAGE}"
+DATABASE="${2:?$USAGE}"
+
+if [[ "$DATABASE" == "neo4j" && "${ALLOW_OVERWRITE_NEO4J:-0}" != "1" ]]; then
+    echo "[WARN] Import overwrites database 'neo4j' with all its cities; set ALLOW_OVERWRITE_NEO4J=1 to proceed" >&2
+    exit 1
+fi
+NEO4J_ADMIN="${NEO4J_HOME:+$NEO4J_HOME/bin/}neo4j-admin"
+CYPHER_SHELL="${NEO4J_HOME:+$NEO4J_HOME/bin/}cypher-shell"
+
+"$NEO4J_ADMIN" database import full \
+    --overwrite-destination=true \
+    --array-delimiter="|" \
+    --nodes="$EXPORT_DIR/nodes_header.csv,$EXPORT_DIR/nodes.csv" \
+    --relationships="$EXPORT_DIR/relationships_header.csv,$EXPORT_DIR/relationships.csv" \
+    "$DATABASE"
+
+if [[ -n "${GRAPH_DATABASE_PASSWORD:-}" ]] && command -v "$CYPHER_SHELL" >/dev/null; then
+    echo "[INFO] Waiting for the server to apply constraints (start it now if it is stopped)"
+    until "$CYPHER_SHELL" -u "${GRAPH_DATABASE_USER:-neo4j}" -p "$GRAPH_DATABASE_PASSWORD" -d "$DATABASE" "RETURN 1" >/dev/null 2>&1; do
+        sleep 2
+    done
+    "$CYPHER_SHELL" -u "${GRAPH_DATABASE_USER:-neo4j}" -p "$GRAPH_DATABASE_PASSWORD" -d "$DATABASE" -f "$EXPORT_DIR/constraints.cypher"
+    echo "[SUCCESS] Constraints applied"
+else
+    echo "[INFO] Start the server and run: cypher-shell -d $DATABASE -f $EXPORT_DIR/constraints.cypher"
+fi
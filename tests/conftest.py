@@ -6,3 +6,19 @@ from pathlib import Path
 ROOT = Path(__file__).resolve().parent.parent
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
+
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def _clear_result_cache():
+    """Результаты анализа и учёт проекций не должны переходить из одного теста в другой."""
+    from app.core.services.projection_manager import projection_manager
+    from app.core.services.result_cache import result_cache
+
+    result_cache.clear()
+    projection_manager.clear()
+    yield
+    result_cache.clear()
+    projection_manager.clear()
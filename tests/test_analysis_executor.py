@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from app.core.services.analysis_executor import AnalysisExecutor, AnalysisQueueFull
+
+
+def test_executor_limits_concurrency_and_rejects_when_queue_full():
+    executor = AnalysisExecutor(max_concurrency=1, max_queue=1)
+    peak = {"running": 0}
+
+    async def job(release):
+        peak["running"] = max(peak["running"], executor.running)
+        await release.wait()
+        return "done"
+
+    async def scenario():
+        release = asyncio.Event()
+        first = asyncio.create_task(executor.run(job, release))
+        second = asyncio.create_task(executor.run(job, release))
+        await asyncio.sleep(0)
+        assert executor.running == 1
+        assert executor.waiting == 1
+
+        with pytest.raises(AnalysisQueueFull) as info:
+            await executor.run(job, release)
+        assert info.value.retry_after >= 1
+
+        release.set()
+        return await asyncio.gather(first, second)
+
+    assert asyncio.run(scenario()) == ["done", "done"]
+    assert peak["running"] == 1
+    stats = executor.stats()
+    assert stats["completed"] == 2
+    assert stats["rejected"] == 1
+    assert stats["queue_depth"] == 0
+    assert stats["running"] == 0
+
+
+def test_executor_releases_slot_on_error_and_across_loops():
+    executor = AnalysisExecutor(max_concurrency=1, max_queue=0)
+
+    async def fail():
+        raise RuntimeError("boom")
+
+    async def ok():
+        return 1
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(executor.run(fail))
+    assert asyncio.run(executor.run(ok)) == 1
+    assert executor.stats()["completed"] == 2
+
+
+def test_retry_after_grows_with_queue_depth():
+    executor = AnalysisExecutor(max_concurrency=2, max_queue=10)
+    executor.avg_run_seconds = 3.0
+    assert executor.retry_after() == 3
+    executor.waiting = 4
+    assert executor.retry_after() == 9
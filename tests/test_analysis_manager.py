@@ -101,3 +101,126 @@ def test_process_none():
 
     result = AnalysisManager().process(ctx)
     assert result is None
+
+
+def test_process_async_runs_update_in_thread_and_awaits_preparers(monkeypatch):
+    import asyncio
+    import threading
+
+    calls = {}
+
+    class FakeDBMgr:
+        def __init__(self, ctx):
+            pass
+        def update_db(self, city):
+            calls["update_thread"] = threading.current_thread() is not threading.main_thread()
+
+    async def fake_prepare(self):
+        calls["prepare"] = True
+
+    async def fake_prepare_metrics(self):
+        return {"nodes": []}
+
+    monkeypatch.setattr(ap_mod.AsyncAnalysisPreparer, "__init__", lambda self, ctx: None)
+    monkeypatch.setattr(ap_mod.AsyncAnalysisPreparer, "prepare", fake_prepare)
+    monkeypatch.setattr(mcp_mod.AsyncMetricClusterPreparer, "__init__", lambda self, ctx: None)
+    monkeypatch.setattr(mcp_mod.AsyncMetricClusterPreparer, "prepare_metrics", fake_prepare_metrics)
+
+    ctx = make_ctx()
+    ctx.graph_type = type("FakeEnum", (), {"value": FakeDBMgr})
+    ctx.need_create_graph = True
+    ctx.need_prepare_data = True
+
+    result = asyncio.run(AnalysisManager().process_async(ctx))
+
+    assert calls == {"update_thread": True, "prepare": True}
+    assert result == {"nodes": []}
+
+
+def test_process_async_locks_only_writes_and_keeps_projection_for_stream(monkeypatch):
+    import asyncio
+
+    from app.core.services.projection_manager import projection_manager
+
+    seen = {}
+
+    def label_locked():
+        entry = am_mod.graph_locks._locks.get("MN")
+        return entry is not None and entry["lock"].locked()
+
+    class FakeDBMgr:
+        def __init__(self, ctx):
+            pass
+        def update_db(self, city):
+            seen["parse_locked"] = label_locked()
+            with self.write_lock():
+                seen["write_locked"] = label_locked()
+
+    async def fake_prepare(self):
+        pass
+
+    def fake_init(self, ctx):
+        self.stream = True
+
+    async def fake_prepare_metrics(self):
+        seen["stream_locked"] = label_locked()
+        seen["readers"] = projection_manager._readers.get("dataset-1")
+        return {"nodes": []}
+
+    monkeypatch.setattr(ap_mod.AsyncAnalysisPreparer, "__init__", lambda self, ctx: None)
+    monkeypatch.setattr(ap_mod.AsyncAnalysisPreparer, "prepare", fake_prepare)
+    monkeypatch.setattr(mcp_mod.AsyncMetricClusterPreparer, "__init__", fake_init)
+    monkeypatch.setattr(mcp_mod.AsyncMetricClusterPreparer, "prepare_metrics", fake_prepare_metrics)
+
+    ctx = make_ctx()
+    ctx.graph_name = "dataset-1"
+    ctx.graph_type = type("FakeEnum", (), {"value": FakeDBMgr})
+    ctx.need_create_graph = True
+    ctx.need_prepare_data = True
+
+    assert asyncio.run(AnalysisManager().process_async(ctx)) == {"nodes": []}
+    assert seen == {"parse_locked": False, "write_locked": True, "stream_locked": False, "readers": 1}
+    assert "dataset-1" not in projection_manager._readers
+
+
+def test_write_mode_pins_projection_against_eviction(monkeypatch):
+    import asyncio
+
+    from app.core.services.projection_manager import DROP_QUERY, SIZE_QUERY, projection_manager
+
+    class FakeConn:
+        dropped = []
+
+        def run(self, query, parameters=None):
+            if query == DROP_QUERY:
+                self.dropped.append(parameters["name"])
+            if query == SIZE_QUERY:
+                return [{"graphName": parameters["name"], "sizeInBytes": 60}]
+            return []
+
+    async def fake_prepare(self):
+        projection_manager.register("dataset-1", "v", 60)
+
+    def fake_init(self, ctx):
+        self.stream = False
+
+    async def fake_prepare_metrics(self):
+        # запрос другого датасета строит проекцию сверх бюджета
+        projection_manager.ensure(FakeConn(), "dataset-2", "v", lambda: True)
+        return {"nodes": []}
+
+    monkeypatch.setattr(projection_manager, "budget_bytes", 100)
+    monkeypatch.setattr(ap_mod.AsyncAnalysisPreparer, "__init__", lambda self, ctx: None)
+    monkeypatch.setattr(ap_mod.AsyncAnalysisPreparer, "prepare", fake_prepare)
+    monkeypatch.setattr(mcp_mod.AsyncMetricClusterPreparer, "__init__", fake_init)
+    monkeypatch.setattr(mcp_mod.AsyncMetricClusterPreparer, "prepare_metrics", fake_prepare_metrics)
+
+    ctx = make_ctx()
+    ctx.graph_name = "dataset-1"
+    ctx.need_create_graph = False
+    ctx.need_prepare_data = True
+
+    assert asyncio.run(AnalysisManager().process_async(ctx)) == {"nodes": []}
+    assert "dataset-1" not in FakeConn.dropped
+    assert "dataset-1" not in projection_manager._readers
+    assert projection_manager.stats()["projections"] == 2
@@ -28,9 +28,11 @@ def test_prepare_sets_normalized_weight_and_projects(monkeypatch):
 
     # вес должен быть нормализован
     assert ctx.db_graph_parameters.weight == "norm_w"
-    # были вызваны запросы нормализации и проекции
-    assert any("SET r.norm_w" in q for q in queries)
-    assert any("gds.graph.project" in q for q in queries)
+    # нормализация выполняется в проекции, без записи в граф
+    assert not any("SET " in q for q in queries)
+    projection = next(q for q in queries if "gds.graph.project" in q)
+    assert "log(1 + r.`w`)" in projection
+    assert "`norm_w`: `norm_w`" in projection
 
 
 def test_prepare_raises_when_graph_params_missing(monkeypatch):
@@ -56,3 +58,48 @@ def test_prepare_handles_query_exceptions(monkeypatch):
 
     # нормализация веса произошла даже при ошибках
     assert ctx.db_graph_parameters.weight == "norm_w"
+
+
+def test_prepare_reuses_projection_until_graph_changes(monkeypatch):
+    from app.core.services.result_cache import result_cache
+
+    queries = []
+
+    def fake_run(self, query, parameters=None):
+        queries.append(query)
+        return []
+
+    monkeypatch.setattr(neo4j_connection.Neo4jConnection, "run", fake_run)
+
+    AnalysisPreparer(make_ctx()).prepare()
+    AnalysisPreparer(make_ctx()).prepare()
+    assert sum("gds.graph.project" in q for q in queries) == 1
+
+    result_cache.bump_graph_version("MN")
+    ctx = make_ctx()
+    AnalysisPreparer(ctx).prepare()
+    assert sum("gds.graph.project" in q for q in queries) == 2
+    assert ctx.db_graph_parameters.weight == "norm_w"
+
+
+@pytest.mark.parametrize("transform,expected", [
+    ("inverse", "inv_w"),
+    ("raw", "w"),
+    ("distance", "distance"),
+])
+def test_prepare_selects_transformed_weight(monkeypatch, transform, expected):
+    monkeypatch.setattr(neo4j_connection.Neo4jConnection, "run", lambda self, query, parameters=None: [])
+
+    ctx = make_ctx()
+    ctx.metric_calculation_context.weight_transform = transform
+    AnalysisPreparer(ctx).prepare()
+
+    assert ctx.db_graph_parameters.weight == expected
+
+
+def test_prepare_rejects_unknown_transform():
+    ctx = make_ctx()
+    ctx.metric_calculation_context.weight_transform = "square"
+
+    with pytest.raises(ValueError, match="Unknown weight transform"):
+        AnalysisPreparer(ctx).prepare()
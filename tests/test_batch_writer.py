@@ -0,0 +1,138 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.database import batch_writer as bw
+
+
+class _Tx:
+    def __init__(self):
+        self.runs = []
+
+    def run(self, query, parameters=None):
+        self.runs.append(parameters["rows"])
+        return SimpleNamespace(data=lambda: [{"total": len(parameters["rows"])}])
+
+
+class _Conn:
+    """Каждый execute_write — отдельная транзакция; fail_on — номер падающей."""
+
+    def __init__(self, fail_on=None):
+        self.transactions = []
+        self.fail_on = fail_on
+
+    def execute_write(self, func, *args):
+        if self.fail_on is not None and len(self.transactions) == self.fail_on:
+            self.fail_on = None
+            raise RuntimeError("connection lost")
+        tx = _Tx()
+        self.transactions.append(tx)
+        return func(tx, *args)
+
+
+ROWS = [{"name": f"S{i}"} for i in range(10)]
+
+
+def test_insert_data_without_pandas_slices_rows():
+    tx = _Tx()
+    assert bw.insert_data(tx, "Q", ROWS, batch_size=4) == 10
+    assert [len(rows) for rows in tx.runs] == [4, 4, 2]
+
+
+def test_batch_writer_commits_each_batch_separately():
+    conn = _Conn()
+    writer = bw.BatchWriter(conn, "Q", batch_size=4, min_batch_size=1, target_seconds=100)
+    writer._tune = lambda elapsed: None
+    assert writer.write(ROWS) == 10
+    assert [tx.runs for tx in conn.transactions] == [[ROWS[0:4]], [ROWS[4:8]], [ROWS[8:10]]]
+
+
+def test_batch_writer_adapts_batch_size_to_latency():
+    writer = bw.BatchWriter(_Conn(), "Q", batch_size=1000, min_batch_size=500, max_batch_size=1800, target_seconds=1.0)
+    writer._tune(0.1)
+    assert writer.batch_size == 1500
+    writer._tune(0.1)
+    assert writer.batch_size == 1800
+    writer._tune(3.0)
+    assert writer.batch_size == 900
+    writer._tune(3.0)
+    assert writer.batch_size == 500
+    writer._tune(0.7)
+    assert writer.batch_size == 500
+
+
+def test_batch_writer_resumes_from_checkpoint(tmp_path):
+    checkpoint = bw.IngestCheckpoint("City Bus", directory=str(tmp_path))
+    failing = _Conn(fail_on=2)
+    writer = bw.BatchWriter(failing, "Q", checkpoint, stage="nodes", batch_size=3, target_seconds=100)
+    writer._tune = lambda elapsed: None
+    with pytest.raises(RuntimeError):
+        writer.write(ROWS)
+
+    reloaded = bw.IngestCheckpoint("City Bus", directory=str(tmp_path))
+    assert reloaded.resume_offset("nodes", ROWS) == 6
+
+    conn = _Conn()
+    writer = bw.BatchWriter(conn, "Q", reloaded, stage="nodes", batch_size=3)
+    writer._tune = lambda elapsed: None
+    writer.write(ROWS)
+    assert [tx.runs[0] for tx in conn.transactions] == [ROWS[6:9], ROWS[9:10]]
+
+    reloaded.clear()
+    assert bw.IngestCheckpoint("City Bus", directory=str(tmp_path)).state == {}
+
+
+def test_checkpoint_is_ignored_when_rows_change(tmp_path):
+    checkpoint = bw.IngestCheckpoint("city", directory=str(tmp_path))
+    checkpoint.commit("nodes", 3, bw.rows_digest(ROWS[:3]).hexdigest())
+    assert checkpoint.resume_offset("nodes", ROWS) == 3
+    changed = [{"name": "X"}] + ROWS[1:]
+    assert checkpoint.resume_offset("nodes", changed) == 0
+    assert checkpoint.resume_offset("nodes", ROWS[:2]) == 0
+
+
+def test_partition_rounds_are_node_disjoint_and_cover_all_rows():
+    rows = [
+        {"startStop": f"S{i % 37}", "endStop": f"S{(i * 7) % 41}", "name": str(i)}
+        for i in range(500)
+    ]
+    rounds = bw.partition_relationships(rows, groups=6)
+
+    written = [row for parts in rounds for part in parts for row in part]
+    assert sorted(r["name"] for r in written) == sorted(r["name"] for r in rows)
+    for parts in rounds:
+        seen = set()
+        for part in parts:
+            stops = {r["startStop"] for r in part} | {r["endStop"] for r in part}
+            assert not stops & seen
+            seen |= stops
+
+
+def test_parallel_writer_writes_every_row_once():
+    rows = [{"startStop": f"A{i}", "endStop": f"B{i % 5}", "name": str(i)} for i in range(50)]
+    conn = _Conn()
+    total = bw.ParallelRelationshipWriter(conn, "Q", workers=4, groups=4, batch_size=7).write(rows)
+
+    assert total == 50
+    written = [row for tx in conn.transactions for rows_ in tx.runs for row in rows_]
+    assert sorted(r["name"] for r in written) == sorted(r["name"] for r in rows)
+    assert all(len(tx.runs[0]) <= 7 for tx in conn.transactions)
+
+
+def test_write_with_retry_retries_transient_errors(monkeypatch):
+    monkeypatch.setattr(bw.time, "sleep", lambda s: None)
+    attempts = []
+
+    class _DeadlockConn(_Conn):
+        def execute_write(self, func, *args):
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise bw.TransientError("deadlock detected")
+            return super().execute_write(func, *args)
+
+    assert bw.write_with_retry(_DeadlockConn(), "Q", ROWS, retries=3) == 10
+    assert len(attempts) == 3
+
+    attempts.clear()
+    with pytest.raises(bw.TransientError):
+        bw.write_with_retry(_DeadlockConn(), "Q", ROWS, retries=1)
@@ -0,0 +1,63 @@
+from app.core.context.metric_calculation_context import MetricCalculationContext
+from app.core.metric_cluster.betweenness_sampling import (
+    DEFAULT_SAMPLING_SEED,
+    MIN_SAMPLING_SIZE,
+    BetweennessSampling,
+)
+
+
+def test_sampling_size_follows_latency_budget():
+    sampling = BetweennessSampling(seconds_per_source_node=1e-6)
+
+    # 10 000 узлов: точный расчёт ~100 с, на 1 с хватает 100 источников
+    assert sampling.sampling_size(10_000, 1.0) == 100
+    assert sampling.sampling_size(10_000, 0.001) == MIN_SAMPLING_SIZE
+    # 1 000 узлов: точный расчёт ~1 с укладывается в бюджет
+    assert sampling.sampling_size(1_000, 2.0) is None
+    assert sampling.sampling_size(None, 1.0) is None
+
+
+def test_observe_moves_estimate_towards_measured_time():
+    sampling = BetweennessSampling(seconds_per_source_node=1e-6)
+
+    sampling.observe(1_000, 100, 1.0)  # 1e-5 с на источник и узел
+
+    assert 1e-6 < sampling.seconds_per_source_node < 1e-5
+    sampling.observe(None, 100, 1.0)
+    sampling.observe(1_000, 100, 0.0)
+    assert 1e-6 < sampling.seconds_per_source_node < 1e-5
+
+
+def test_resolve_prefers_explicit_sampling_size():
+    sampling = BetweennessSampling(seconds_per_source_node=1e-6)
+    mc = MetricCalculationContext(
+        need_betweenness=True,
+        betweenness_sampling_size=64,
+        betweenness_sampling_seed=7,
+        betweenness_target_ms=1_000_000,
+    )
+
+    assert sampling.resolve(mc, 5_000) == {
+        "mode": "sampled", "sampling_size": 64, "sampling_seed": 7, "node_count": 5_000,
+    }
+
+
+def test_resolve_derives_size_from_target_and_defaults_seed():
+    sampling = BetweennessSampling(seconds_per_source_node=1e-6)
+    mc = MetricCalculationContext(need_betweenness=True, betweenness_target_ms=1_000)
+
+    accuracy = sampling.resolve(mc, 10_000)
+
+    assert accuracy["mode"] == "sampled"
+    assert accuracy["sampling_size"] == 100
+    assert accuracy["sampling_seed"] == DEFAULT_SAMPLING_SEED
+
+
+def test_resolve_is_exact_without_sampling_or_when_sample_covers_graph():
+    sampling = BetweennessSampling()
+
+    assert sampling.resolve(MetricCalculationContext(need_betweenness=True), 10)["mode"] == "exact"
+    mc = MetricCalculationContext(need_betweenness=True, betweenness_sampling_size=50)
+    assert sampling.resolve(mc, 10) == {
+        "mode": "exact", "sampling_size": None, "sampling_seed": None, "node_count": 10,
+    }
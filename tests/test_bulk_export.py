@@ -0,0 +1,154 @@
+import csv
+import os
+import re
+from types import SimpleNamespace
+
+import pytest
+
+import app.database.batch_writer as batch_writer
+import app.database.graph_db_manager as gdm
+import app.database.transport_db_manager as tdm
+from app.core.context.analysis_context import AnalysisContext
+
+
+def _node(name, routes, x):
+    return {"name": name, "routeList": routes, "xCoordinate": x, "yCoordinate": 55.5, "isCoordinateApproximate": False}
+
+
+def _rel(start, end, route, duration):
+    return {"startStop": start, "endStop": end, "name": f"{start} -> {end}; route_name: {route}", "route": route, "duration": duration}
+
+
+ROUTES = [
+    ([_node("A", ["1"], 37.1), _node("B", ["1"], 37.2)], [_rel("A", "B", "1", 3), _rel("B", "A", "1", 4)]),
+    # повтор A -> B маршрута 1 с другой длительностью и связь к неизвестной остановке
+    ([_node("B", ["1", "2"], 37.2), _node("C, D", ["2"], 37.3)], [_rel("A", "B", "1", 5), _rel("B", "C, D", "2", 2), _rel("C, D", "Z", "2", 1)]),
+]
+
+
+class _RoutesParser:
+    def __init__(self, city):
+        self.city = city
+
+    def parse(self, on_route=None, workers=1, parse_workers=0):
+        nodes, rels = {}, []
+        for route_nodes, route_rels in ROUTES:
+            for node in route_nodes:
+                nodes[node["name"]] = node
+            rels.extend(route_rels)
+            if on_route is not None:
+                on_route(route_nodes, route_rels)
+        return nodes, rels
+
+
+class _MergeTx:
+    """Собирает строки, которые Cypher-путь передаёт в MERGE-запросы.
+
+    Запросы не выполняются: ключи MERGE (имя узла; начало, конец и имя
+    связи) и отбрасывание связей с неизвестными концами повторены вручную.
+    Поэтому сравнение с CSV проверяет, что оба пути получают одни и те же
+    строки, но не сам импорт в Neo4j.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def run(self, query, parameters=None):
+        rows = parameters["rows"] if parameters else []
+        for row in rows:
+            if "UNWIND $rows AS row" in query and row.get("name") is not None:
+                self.db["nodes"][row["name"]] = (
+                    (row["yCoordinate"], row["xCoordinate"]), tuple(row["routeList"]), row["isCoordinateApproximate"],
+                )
+            elif "UNWIND $rows AS path" in query:
+                if _endpoints_exist(self.db, row):
+                    self.db["rels"][(row["startStop"], row["endStop"], row["name"])] = (row["duration"], row["route"])
+        return SimpleNamespace(data=lambda: [{"total": len(rows)}])
+
+
+def _endpoints_exist(db, row):
+    return row["startStop"] in db["nodes"] and row["endStop"] in db["nodes"]
+
+
+class _MergeConn:
+    def __init__(self):
+        self.db = {"nodes": {}, "rels": {}}
+
+    def execute_write(self, func, *args, **kwargs):
+        return func(_MergeTx(self.db), *args, **kwargs)
+
+
+@pytest.fixture
+def manager(monkeypatch, tmp_path):
+    monkeypatch.setattr(gdm, "Neo4jConnection", _MergeConn)
+    monkeypatch.setattr(tdm, "BusGraphParser", _RoutesParser)
+    monkeypatch.setattr(batch_writer, "CHECKPOINT_DIR", str(tmp_path / "checkpoints"))
+    return tdm.BusGraphDBManager(AnalysisContext(city_name="Demo"))
+
+
+def _read_import(directory):
+    def rows(name):
+        with open(os.path.join(directory, f"{name}_header.csv"), encoding="utf-8", newline="") as f:
+            header = next(csv.reader(f))
+        with open(os.path.join(directory, f"{name}.csv"), encoding="utf-8", newline="") as f:
+            return [dict(zip(header, row)) for row in csv.reader(f)]
+
+    nodes = {}
+    for row in rows("nodes"):
+        lat, lon = (float(part.split(":")[1]) for part in row["location:point{crs:WGS-84}"].strip("{}").split(", "))
+        nodes[row["name:ID(DemoBusStop)"]] = (
+            (lat, lon), tuple(row["routeList:string[]"].split("|")), row["isCoordinateApproximate:boolean"] == "true",
+        )
+        assert row[":LABEL"] == "DemoBusStop"
+    rels = {}
+    for row in rows("relationships"):
+        assert row[":TYPE"] == "DemoBusRouteSegment"
+        key = (row[":START_ID(DemoBusStop)"], row[":END_ID(DemoBusStop)"], row["name"])
+        rels[key] = (int(row["duration:long"]), row["route"])
+    return {"nodes": nodes, "rels": rels}
+
+
+def test_bulk_export_rows_match_cypher_batches(manager, tmp_path):
+    manager.update_db("Demo")
+    cypher_graph = manager.connection.db
+
+    stats = manager.export_bulk_import(str(tmp_path / "import"))
+
+    assert _read_import(str(tmp_path / "import")) == cypher_graph
+    assert stats == {"nodes": 3, "relationships": 3}
+    assert cypher_graph["rels"][("A", "B", "A -> B; route_name: 1")] == (5, "1")
+    assert not os.path.exists(tmp_path / "import" / "relationships.raw.csv")
+    with open(tmp_path / "import" / "constraints.cypher", encoding="utf-8") as f:
+        assert "REQUIRE s.name IS UNIQUE;" in f.read()
+
+
+def _set_properties(query, alias):
+    return set(re.findall(rf"\b{alias}\.(\w+) =", query))
+
+
+def test_bulk_import_headers_match_cypher_schema(manager, tmp_path):
+    manager.export_bulk_import(str(tmp_path / "import"))
+    node_label = manager.get_main_node_name()
+    rels_type = manager.get_main_rels_name()
+
+    with open(tmp_path / "import" / "nodes_header.csv", encoding="utf-8", newline="") as f:
+        node_header = next(csv.reader(f))
+    with open(tmp_path / "import" / "relationships_header.csv", encoding="utf-8", newline="") as f:
+        rel_header = next(csv.reader(f))
+
+    # свойства, которые пишет Cypher-путь, и их типы в формате neo4j-admin
+    assert node_header[:2] == [f"name:ID({node_label})", ":LABEL"]
+    assert {column.split(":")[0] for column in node_header[2:]} == _set_properties(manager.create_node_query(), "s")
+    assert "location:point{crs:WGS-84}" in node_header
+    assert "routeList:string[]" in node_header
+    assert rel_header[:3] == [f":START_ID({node_label})", f":END_ID({node_label})", ":TYPE"]
+    assert {column.split(":")[0] for column in rel_header[3:]} - {"name"} == _set_properties(
+        manager.create_relationships_query(), "r"
+    )
+
+    with open(tmp_path / "import" / "nodes.csv", encoding="utf-8", newline="") as f:
+        assert {row[1] for row in csv.reader(f)} == {node_label}
+    with open(tmp_path / "import" / "relationships.csv", encoding="utf-8", newline="") as f:
+        rows = list(csv.reader(f))
+    assert {row[2] for row in rows} == {rels_type}
+    assert all(len(row) == len(rel_header) for row in rows)
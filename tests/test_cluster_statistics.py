@@ -0,0 +1,71 @@
+import random
+from collections import defaultdict
+
+import pytest
+
+from app.core.metric_cluster.cluster_statistics import cluster_statistics
+
+
+def _reference(communities, edges):
+    """Прямой перенос прежних Cypher-запросов и формулы модульности."""
+    external, total = defaultdict(int), defaultdict(int)
+    for e in edges:
+        for n, m in ((e["source"], e["target"]), (e["target"], e["source"])):
+            c = communities.get(n)
+            if c is None:
+                continue
+            total[c] += 1
+            external[c] += communities.get(m) != c
+    conductance = sum(external[c] / total[c] for c in total) / len(total)
+
+    two_m = 2 * sum(e["weight"] for e in edges)
+    degree, inside = defaultdict(float), defaultdict(float)
+    for e in edges:
+        cs, ct = communities.get(e["source"]), communities.get(e["target"])
+        degree[cs] += e["weight"]
+        degree[ct] += e["weight"]
+        if cs is not None and cs == ct:
+            inside[cs] += 2 * e["weight"]
+    modularity = sum(inside[c] / two_m - (degree[c] / two_m) ** 2 for c in degree if c is not None)
+    return {"modularity": modularity, "conductance": conductance, "coverage": 1 - conductance}
+
+
+def test_two_triangles_joined_by_one_edge():
+    communities = {n: 0 if n < 3 else 1 for n in range(6)}
+    pairs = [(0, 1), (1, 2), (2, 0), (3, 4), (4, 5), (5, 3), (2, 3)]
+    edges = [{"source": s, "target": t, "weight": None} for s, t in pairs]
+
+    stats = cluster_statistics(communities, edges)
+
+    # 7 рёбер, в каждом сообществе 3 внутренних и степень 7
+    assert stats["modularity"] == pytest.approx(2 * (6 / 14 - (7 / 14) ** 2))
+    assert stats["conductance"] == pytest.approx(1 / 7)
+    assert stats["coverage"] == pytest.approx(6 / 7)
+
+
+def test_matches_reference_on_random_graph():
+    rng = random.Random(7)
+    communities = {f"n{i}": rng.randrange(5) for i in range(60)}
+    communities["lonely"] = None
+    nodes = list(communities)
+    edges = [
+        {"source": rng.choice(nodes), "target": rng.choice(nodes), "weight": rng.uniform(0.1, 2.0)}
+        for _ in range(300)
+    ]
+
+    stats = cluster_statistics(communities, edges)
+    expected = _reference(communities, edges)
+
+    for key in expected:
+        assert stats[key] == pytest.approx(expected[key])
+
+
+def test_known_modularity_is_kept():
+    stats = cluster_statistics({"a": 1, "b": 1}, [{"source": "a", "target": "b", "weight": 2.0}], modularity=0.3)
+
+    assert stats == {"modularity": 0.3, "conductance": 0.0, "coverage": 1.0}
+
+
+def test_empty_input_raises():
+    with pytest.raises(ValueError, match="empty result"):
+        cluster_statistics({}, [])
@@ -57,116 +57,6 @@ class TestCommunityDetection:
         with pytest.raises(RuntimeError, match="Neo4j write failed"):
             leiden.detect_communities("Graph", "weight")
 
-    def test_get_metric_raises_when_no_graph_name(self):
-        """Проверяет, что _get_metric выбрасывает ошибку при отсутствии graph_name."""
-        leiden = Leiden()
-        with pytest.raises(ValueError, match="graph_name is not set"):
-            leiden._get_metric("SELECT 1")
-
-    def test_get_metric_raises_on_empty_result(self, monkeypatch):
-        """Проверяет, что _get_metric выбрасывает ошибку при пустом результате."""
-        def fake_run(self, query, parameters=None):
-            return []
-
-        monkeypatch.setattr(neo4j_connection.Neo4jConnection, 'run', fake_run)
-
-        leiden = Leiden()
-        leiden.graph_name = "TestGraph"
-
-        with pytest.raises(ValueError, match="empty result"):
-            leiden._get_metric("RETURN 1")
-
-    def test_get_metric_returns_float_value(self, monkeypatch):
-        """Проверяет, что _get_metric возвращает корректное значение."""
-        def fake_run(self, query, parameters=None):
-            return [[0.75]]
-
-        monkeypatch.setattr(neo4j_connection.Neo4jConnection, 'run', fake_run)
-
-        leiden = Leiden()
-        leiden.graph_name = "TestGraph"
-        result = leiden._get_metric("RETURN 0.75")
-
-        assert result == 0.75
-
-    def test_calculate_modularity_success(self, monkeypatch):
-        """Проверяет успешный расчёт модульности."""
-        def fake_run(self, query, parameters=None):
-            return [[0.65]]
-
-        monkeypatch.setattr(neo4j_connection.Neo4jConnection, 'run', fake_run)
-
-        leiden = Leiden()
-        leiden.graph_name = "G1"
-        modularity = leiden.calculate_modularity()
-
-        assert modularity == 0.65
-
-    def test_calculate_modularity_raises_on_error(self, monkeypatch):
-        """Проверяет, что ошибка при расчёте модульности пробрасывается."""
-        def bad_run(self, query, parameters=None):
-            raise RuntimeError("GDS stats failed")
-
-        monkeypatch.setattr(neo4j_connection.Neo4jConnection, 'run', bad_run)
-
-        leiden = Leiden()
-        leiden.graph_name = "G1"
-
-        with pytest.raises(RuntimeError, match="GDS stats failed"):
-            leiden.calculate_modularity()
-
-    def test_calculate_conductance_success(self, monkeypatch):
-        """Проверяет успешный расчёт проводимости."""
-        def fake_run(self, query, parameters=None):
-            return [[0.12]]
-
-        monkeypatch.setattr(neo4j_connection.Neo4jConnection, 'run', fake_run)
-
-        louvain = Louvain()
-        louvain.graph_name = "G2"
-        conductance = louvain.calculate_conductance()
-
-        assert conductance == 0.12
-
-    def test_calculate_conductance_raises_on_error(self, monkeypatch):
-        """Проверяет, что ошибка при расчёте проводимости пробрасывается."""
-        def bad_run(self, query, parameters=None):
-            raise RuntimeError("Conductance query failed")
-
-        monkeypatch.setattr(neo4j_connection.Neo4jConnection, 'run', bad_run)
-
-        louvain = Louvain()
-        louvain.graph_name = "G2"
-
-        with pytest.raises(RuntimeError, match="Conductance query failed"):
-            louvain.calculate_conductance()
-
-    def test_calculate_coverage_success(self, monkeypatch):
-        """Проверяет успешный расчёт покрытия."""
-        def fake_run(self, query, parameters=None):
-            return [[0.88]]
-
-        monkeypatch.setattr(neo4j_connection.Neo4jConnection, 'run', fake_run)
-
-        leiden = Leiden()
-        leiden.graph_name = "G3"
-        coverage = leiden.calculate_coverage()
-
-        assert coverage == 0.88
-
-    def test_calculate_coverage_raises_on_error(self, monkeypatch):
-        """Проверяет, что ошибка при расчёте покрытия пробрасывается."""
-        def bad_run(self, query, parameters=None):
-            raise RuntimeError("Coverage query failed")
-
-        monkeypatch.setattr(neo4j_connection.Neo4jConnection, 'run', bad_run)
-
-        leiden = Leiden()
-        leiden.graph_name = "G3"
-
-        with pytest.raises(RuntimeError, match="Coverage query failed"):
-            leiden.calculate_coverage()
-
     def test_louvain_detect_communities_uses_correct_algorithm(self, monkeypatch):
         """Проверяет, что Louvain использует правильный алгоритм."""
         captured = {}
@@ -182,3 +72,23 @@ class TestCommunityDetection:
 
         assert "louvain.write" in captured['query'].lower()
         assert "louvain_community" in captured['query']
+
+
+def test_cluster_statistics_use_modularity_from_write_result(monkeypatch):
+    def fake_run(self, query, parameters=None):
+        return [(0.42,)]
+
+    monkeypatch.setattr(neo4j_connection.Neo4jConnection, 'run', fake_run)
+
+    leiden = Leiden()
+    leiden.detect_communities("G", "w")
+    nodes = [{"id": "a", "leiden_community": 1}, {"id": "b", "leiden_community": 2}]
+    stats = leiden.cluster_statistics(nodes, [{"source": "a", "target": "b", "weight": 1.0}])
+
+    assert stats == {"modularity": 0.42, "conductance": 1.0, "coverage": 0.0}
+
+
+def test_cluster_statistics_raise_without_communities():
+    nodes = [{"id": "a", "leiden_community": None}]
+    with pytest.raises(ValueError, match="empty result"):
+        Leiden().cluster_statistics(nodes, [{"source": "a", "target": "b", "weight": None}])
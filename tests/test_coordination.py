@@ -0,0 +1,127 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core.services.coordination import GraphLocks, SingleFlight
+
+
+def test_identical_calls_share_one_execution():
+    flights = SingleFlight()
+    calls = []
+
+    async def compute(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return {"value": value}
+
+    async def main():
+        return await asyncio.gather(*(flights.run("k", compute, 1) for _ in range(3)))
+
+    results = asyncio.run(main())
+
+    assert calls == [1]
+    assert results == [{"value": 1}] * 3
+    assert flights.stats() == {"in_flight": 0, "started": 1, "shared": 2}
+
+
+def test_different_keys_run_separately_and_errors_are_shared():
+    flights = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def ok():
+        return "ok"
+
+    async def main():
+        return await asyncio.gather(
+            flights.run("a", fail), flights.run("a", fail), flights.run("b", ok),
+            return_exceptions=True
+        )
+
+    first, second, third = asyncio.run(main())
+
+    assert isinstance(first, RuntimeError) and second is first
+    assert third == "ok"
+    assert flights.stats()["started"] == 2
+
+
+def test_cancelled_caller_does_not_cancel_shared_execution():
+    flights = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.02)
+        return 42
+
+    async def main():
+        leader = asyncio.ensure_future(flights.run("k", compute))
+        follower = asyncio.ensure_future(flights.run("k", compute))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(main()) == 42
+
+
+def test_graph_locks_serialise_same_key_and_record_wait():
+    locks = GraphLocks()
+    order = []
+
+    async def job(key, name):
+        async with locks.hold(key):
+            order.append(f"{name}:start")
+            await asyncio.sleep(0.01)
+            order.append(f"{name}:end")
+
+    async def main():
+        await asyncio.gather(job("Stop", "a"), job("Stop", "b"), job("Other", "c"))
+
+    asyncio.run(main())
+
+    assert order.index("a:end") < order.index("b:start")
+    assert order.index("c:start") < order.index("a:end")
+    stats = locks.stats()
+    assert stats["acquired"] == 3
+    assert stats["contended"] == 1
+    assert stats["held_or_waiting"] == 0
+    assert stats["max_wait_seconds"] > 0
+
+
+def test_graph_lock_released_on_error():
+    locks = GraphLocks()
+
+    async def main():
+        with pytest.raises(ValueError):
+            async with locks.hold("Stop"):
+                raise ValueError("fail")
+        async with locks.hold("Stop"):
+            return True
+
+    assert asyncio.run(main()) is True
+
+
+def test_hold_from_thread_shares_lock_with_async_holders():
+    locks = GraphLocks()
+    order = []
+
+    def write(loop):
+        with locks.hold_from_thread("Stop", loop):
+            order.append("thread:start")
+            time.sleep(0.02)
+            order.append("thread:end")
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        writer = asyncio.create_task(asyncio.to_thread(write, loop))
+        while not order:
+            await asyncio.sleep(0.001)
+        async with locks.hold("Stop"):
+            order.append("async")
+        await writer
+
+    asyncio.run(main())
+
+    assert order == ["thread:start", "thread:end", "async"]
+    assert locks.stats()["held_or_waiting"] == 0
@@ -3,6 +3,7 @@ from types import SimpleNamespace
 import pandas as pd
 import pytest
 
+import app.database.batch_writer as batch_writer
 import app.database.graph_db_manager as gdm
 import app.database.transport_db_manager as tdm
 from app.core.context.analysis_context import AnalysisContext
@@ -78,6 +79,11 @@ def _patch_conn(monkeypatch):
     monkeypatch.setattr(gdm, "Neo4jConnection", lambda: _StubConn())
 
 
+@pytest.fixture(autouse=True)
+def _checkpoint_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(batch_writer, "CHECKPOINT_DIR", str(tmp_path / "checkpoints"))
+
+
 def _base_context(city="City"):
     mc = MetricCalculationContext()
     db_params = DBGraphParameters()
@@ -120,8 +126,10 @@ class _StubParser:
         self.city = city
         self.parse_called = False
 
-    def parse(self):
+    def parse(self, workers=1, parse_workers=0):
         self.parse_called = True
+        self.workers = workers
+        self.parse_workers = parse_workers
         nodes = {"S1": {"name": "S1", "routeList": ["1"], "xCoordinate": 1, "yCoordinate": 2, "isCoordinateApproximate": False}}
         rels = [{"startStop": "S1", "endStop": "S1", "name": "loop", "route": "1", "duration": 10}]
         return nodes, rels
@@ -140,6 +148,17 @@ def test_transport_manager_get_graph_and_update(monkeypatch):
     assert exec_names == ["create_constraints", "insert_data", "insert_data"]
 
 
+def test_transport_manager_parses_with_fetch_workers(monkeypatch):
+    parser = _StubParser("DemoCity")
+    monkeypatch.setattr(tdm, "BusGraphParser", lambda city: parser)
+    monkeypatch.setattr(tdm, "FETCH_WORKERS", 6)
+    monkeypatch.setattr(tdm, "PARSE_WORKERS", 2)
+
+    tdm.BusGraphDBManager(_base_context(city="DemoCity")).get_graph()
+
+    assert (parser.workers, parser.parse_workers) == (6, 2)
+
+
 def test_transport_manager_queries_and_constraints(monkeypatch):
     # Use stub parser to avoid network
     monkeypatch.setattr(tdm, "BusGraphParser", lambda city: _StubParser(city))
@@ -205,3 +224,127 @@ def test_transport_specific_names_and_weight(monkeypatch):
     mini = tdm.MiniBusGraphDBManager(ctx)
     assert mini.get_node_name() == "CityXMiniBusStop"
     assert mini.get_rels_name() == "CityXMiniBusRouteSegment"
+
+
+class _StreamingStubParser(_StubParser):
+    def parse(self, on_route=None, workers=1, parse_workers=0):
+        self.parse_called = True
+        node = {"name": "S1", "routeList": ["1"], "xCoordinate": 1, "yCoordinate": 2, "isCoordinateApproximate": False}
+        rel = {"startStop": "S1", "endStop": "S2", "name": "S1 -> S2; route_name: 1", "route": "1", "duration": 10}
+        on_route([node], [])
+        on_route([dict(node, routeList=["1", "2"]), {"name": "S2"}], [rel])
+        return {"S1": dict(node, routeList=["1", "2"]), "S2": {"name": "S2"}}, [rel]
+
+
+def test_update_db_streaming_writes_nodes_before_relationships():
+    nodes = [{"name": "A"}, {"name": "B"}]
+    rels = [{"startStop": "A", "endStop": "B", "name": "A-B", "route": "1", "duration": 5}]
+    manager = _DummyManager(_base_context(), graph=(nodes, rels))
+
+    manager.update_db("City", streaming=True)
+
+    calls = manager.connection.exec_calls
+    assert [c[0] for c in calls] == ["create_constraints", "insert_data", "insert_data"]
+    assert calls[1][1] == (manager.create_node_query(), nodes)
+    assert calls[2][1] == (manager.create_relationships_query(), rels)
+
+
+def test_transport_manager_streams_cumulative_node_state(monkeypatch):
+    monkeypatch.setattr(tdm, "BusGraphParser", lambda city: _StreamingStubParser(city))
+    manager = tdm.BusGraphDBManager(_base_context(city="DemoCity"))
+
+    manager.update_db("DemoCity", streaming=True)
+
+    calls = manager.connection.exec_calls
+    assert [c[0] for c in calls] == ["create_constraints", "insert_data", "insert_data"]
+    node_rows = calls[1][1][1]
+    assert [row["name"] for row in node_rows] == ["S1", "S2"]
+    assert node_rows[0]["routeList"] == ["1", "2"]
+
+
+def test_streaming_writer_flushes_in_batches():
+    conn = _StubConn()
+    with gdm.StreamingGraphWriter(conn, "NODES", "RELS", batch_size=2, queue_size=1) as writer:
+        for i in range(5):
+            writer.push([{"name": f"N{i}"}], [{"startStop": f"N{i}", "endStop": f"N{i}"}])
+
+    queries = [c[1][0] for c in conn.exec_calls]
+    # связи пишутся только после узлов, на которые ссылаются
+    assert queries == ["NODES", "RELS", "NODES", "RELS", "NODES", "RELS"]
+    assert writer.written_nodes == 5
+    assert writer.written_relationships == 5
+
+
+def test_streaming_writer_propagates_write_errors():
+    class _FailingConn(_StubConn):
+        def execute_write(self, func, *args, **kwargs):
+            raise RuntimeError("neo4j down")
+
+    writer = gdm.StreamingGraphWriter(_FailingConn(), "NODES", "RELS", batch_size=1, queue_size=1)
+    with pytest.raises(RuntimeError, match="neo4j down"):
+        with writer:
+            for i in range(10):
+                writer.push([{"name": f"N{i}"}], [])
+
+
+def test_update_db_parallel_relationship_writes():
+    nodes = [{"name": f"N{i}"} for i in range(6)]
+    rels = [{"startStop": f"N{i}", "endStop": f"N{(i + 1) % 6}", "name": str(i)} for i in range(6)]
+    manager = _DummyManager(_base_context(), graph=(nodes, rels))
+
+    manager.update_db("City", relationship_workers=3)
+
+    calls = manager.connection.exec_calls
+    assert calls[0][0] == "create_constraints"
+    assert calls[1][1] == (manager.create_node_query(), nodes, len(nodes))
+    written = [row for call in calls[2:] for row in call[1][1]]
+    assert sorted(r["name"] for r in written) == sorted(r["name"] for r in rels)
+
+
+class _FreshLoadTx(_FakeTx):
+    def run(self, query, parameters=None):
+        if "elementId(s) AS id" in query:
+            self.queries.append((query, parameters))
+            return [{"name": row["name"], "id": f"4:x:{row['name']}"} for row in parameters["rows"]]
+        return super().run(query, parameters)
+
+
+class _FreshLoadConn(_StubConn):
+    def __init__(self, empty=True):
+        super().__init__()
+        self.empty = empty
+        self.txs = []
+
+    def execute_write(self, func, *args, **kwargs):
+        self.exec_calls.append((func.__name__, args, kwargs))
+        tx = _FreshLoadTx()
+        self.txs.append(tx)
+        return func(tx, *args, **kwargs)
+
+    def read_all(self, query, parameters=None):
+        self.read_calls.append((query, parameters))
+        return [{"empty": self.empty}]
+
+
+def test_fresh_load_creates_nodes_then_relationships_by_id(monkeypatch):
+    monkeypatch.setattr(tdm, "BusGraphParser", lambda city: _StubParser(city))
+    manager = tdm.BusGraphDBManager(_base_context(city="Fresh"))
+    manager.connection = _FreshLoadConn(empty=True)
+
+    manager.update_db("Fresh", fresh_load=True)
+
+    calls = manager.connection.exec_calls
+    assert [c[0] for c in calls] == ["create_returning_ids", "insert_data", "create_constraints"]
+    rel_rows = calls[1][1][1]
+    assert rel_rows[0]["startId"] == rel_rows[0]["endId"] == "4:x:S1"
+    assert "elementId(u) = path.startId" in calls[1][1][0]
+
+
+def test_fresh_load_falls_back_to_merge_when_label_has_data(monkeypatch):
+    monkeypatch.setattr(tdm, "BusGraphParser", lambda city: _StubParser(city))
+    manager = tdm.BusGraphDBManager(_base_context(city="Fresh"))
+    manager.connection = _FreshLoadConn(empty=False)
+
+    manager.update_db("Fresh", fresh_load=True)
+
+    assert [c[0] for c in manager.connection.exec_calls] == ["create_constraints", "insert_data", "insert_data"]
@@ -0,0 +1,117 @@
+import json
+import os
+
+import numpy as np
+
+import app.core.services.parsers as parsers
+from app.core.services.graph_snapshot import GraphSnapshot
+
+
+NODES = {
+    "A": {"name": "A", "routeList": ["1", "2"], "xCoordinate": 37.5, "yCoordinate": 55.7, "isCoordinateApproximate": False},
+    "B": {"name": "B", "routeList": ["1"], "xCoordinate": 37.6, "yCoordinate": 55.8, "isCoordinateApproximate": True},
+}
+RELS = [
+    {"startStop": "A", "endStop": "B", "name": "A -> B; route_name: 1", "route": "1", "duration": 4},
+    {"startStop": "B", "endStop": "A", "name": "B -> A; route_name: 2", "route": "2", "duration": 6},
+]
+
+
+class DummyParser(parsers.AbstractTransportGraphParser):
+    def get_transport_url(self):
+        return "bus/"
+
+    def get_transport_class(self):
+        return "bus-item"
+
+
+def test_snapshot_roundtrip_is_memory_mapped(tmp_path):
+    snapshot = GraphSnapshot.from_graph(NODES, RELS, "v1", 0.0)
+    snapshot.save(str(tmp_path))
+
+    loaded = GraphSnapshot.load(str(tmp_path), version="v1")
+    assert isinstance(loaded.rel_duration, np.memmap)
+    assert loaded.to_graph() == (NODES, RELS)
+    assert GraphSnapshot.load(str(tmp_path), version="v2") is None
+
+
+def test_snapshot_save_replaces_previous_version(tmp_path):
+    GraphSnapshot.from_graph(NODES, RELS, "v1", 0.0).save(str(tmp_path))
+    GraphSnapshot.from_graph(NODES, RELS[:1], "v2", 0.0).save(str(tmp_path))
+
+    assert len([e for e in os.listdir(tmp_path) if (tmp_path / e).is_dir()]) == 1
+    assert GraphSnapshot.load(str(tmp_path)).to_graph() == (NODES, RELS[:1])
+
+
+def test_snapshot_rejects_unknown_schema():
+    rels = [dict(RELS[0], name="custom")]
+    assert GraphSnapshot.from_graph(NODES, rels, "v1", 0.0) is None
+    nodes = {"A": dict(NODES["A"], extra=1)}
+    assert GraphSnapshot.from_graph(nodes, [], "v1", 0.0) is None
+
+
+def test_parse_uses_snapshot_until_route_cache_changes(monkeypatch, tmp_path):
+    monkeypatch.setattr(parsers, "BASE_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(parsers.AbstractTransportGraphParser, "_AbstractTransportGraphParser__get_city_url", lambda self: "/dummy")
+
+    parser = DummyParser("Demo")
+    parser.route_store.save_index([["1", "One", "/1"], ["2", "Two", "/2"]])
+    parser.route_store.save_route("1", {"nodes": {"A": NODES["A"], "B": NODES["B"]}, "relationships": RELS[:1]})
+    parser.route_store.save_route("2", {"nodes": {"A": NODES["A"]}, "relationships": RELS[1:]})
+    assert parser.parse() == (NODES, RELS)
+
+    merged = []
+    cached = DummyParser("Demo")
+    monkeypatch.setattr(cached, "_AbstractTransportGraphParser__merge_route_data", merged.append)
+    assert cached.parse() == (NODES, RELS)
+    assert merged == []
+
+    parser.route_store.save_route("2", {"nodes": {"A": NODES["A"]}, "relationships": []})
+    rebuilt = DummyParser("Demo")
+    assert rebuilt.parse() == (NODES, RELS[:1])
+    with open(os.path.join(rebuilt.snapshot_dir, "current.json"), encoding="utf-8") as f:
+        assert json.load(f)["version"] == rebuilt.route_store.version(["1", "2"])[0]
+
+
+
+def test_parse_retries_routes_missing_from_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(parsers, "BASE_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(parsers.AbstractTransportGraphParser, "_AbstractTransportGraphParser__get_city_url", lambda self: "/dummy")
+
+    parser = DummyParser("Demo")
+    parser.route_store.save_index([["1", "One", "/1"], ["2", "Two", "/2"]])
+    parser.route_store.save_route("1", {"nodes": {"A": NODES["A"], "B": NODES["B"]}, "relationships": RELS[:1]})
+    monkeypatch.setattr(parser, "_AbstractTransportGraphParser__parse_single_route", lambda *a, **kw: None)
+    assert parser.parse() == ({"A": NODES["A"], "B": NODES["B"]}, RELS[:1])
+
+    # маршрут 2 по-прежнему отсутствует: снимок не берётся, маршрут запрашивается снова
+    retried = []
+    again = DummyParser("Demo")
+    monkeypatch.setattr(
+        again, "_AbstractTransportGraphParser__parse_single_route", lambda number, *a, **kw: retried.append(number)
+    )
+    again.parse()
+    assert retried == ["2"]
+
+
+def test_stop_names_do_not_depend_on_route_order(monkeypatch, tmp_path):
+    monkeypatch.setattr(parsers.AbstractTransportGraphParser, "_AbstractTransportGraphParser__get_city_url", lambda self: "/dummy")
+    far_a = dict(NODES["A"], routeList=["2"], xCoordinate=38.5)
+    routes = {
+        "1": {"nodes": {"A": NODES["A"]}, "relationships": []},
+        "2": {"nodes": {"A": far_a}, "relationships": []},
+    }
+    index = [["1", "One", "/1"], ["2", "Two", "/2"]]
+
+    graphs = []
+    for order, cache_dir in ((index, "forward"), (index[::-1], "backward")):
+        monkeypatch.setattr(parsers, "BASE_CACHE_DIR", str(tmp_path / cache_dir))
+        parser = DummyParser("Demo")
+        parser.route_store.save_index(order)
+        for number, route in routes.items():
+            parser.route_store.save_route(number, route)
+        nodes, _ = parser.parse()
+        graphs.append({name: node["xCoordinate"] for name, node in nodes.items()})
+        assert os.path.exists(parser.stops_path)
+
+    assert graphs[0] == graphs[1] == {"A": 37.5, "A 1": 38.5}
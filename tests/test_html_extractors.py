@@ -0,0 +1,146 @@
+import pytest
+
+from app.core.services import html_extractors as he
+
+TIMETABLE_PAGES = [
+    # обычная разметка kudikina: остановка и время в соседних div
+    '''
+    <div class="row">
+      <div class="col-xs-8 bus-stop"><a href="/s/1">1) Вокзал &amp; Площадь</a></div>
+      <div class="col-xs-12"><span>06:05K</span><span>07:00</span></div>
+      <div class="col-xs-8 bus-stop"><a href="/s/2">2) <b>Школа</b> 12</a></div>
+      <div class="col-xs-12"><span> 06:20 </span></div>
+    </div>
+    ''',
+    # время отсутствует, сосед через один элемент и остановка без ссылки
+    '''
+    <div>
+      <div class="bus-stop"><a>1) Первая</a></div>
+      <p>реклама</p><br>
+      <div class="col-xs-12"><i>нет</i></div>
+      <div class="bus-stop"><span>без ссылки</span></div>
+      <div class="col-xs-12"><span>10:00</span></div>
+      <div class="bus-stop"><a>3) Последняя</a></div>
+    </div>
+    <div class="col-xs-12"><span>23:59</span></div>
+    ''',
+    # две остановки подряд делят один блок времени, незакрытые теги
+    '''
+    <section>
+      <div class="bus-stop"><a>1) A</div>
+      <div class="bus-stop"><a>2) B</a></div>
+      <div class="col-xs-12 time"><span>08:00K</span>
+    </section>
+    <div class="bus-stop"><a>3) C</a><div class="col-xs-12"><span>09:00</span></div></div>
+    ''',
+    # скрипты, стили и комментарии внутри ссылки не входят в название
+    '''
+    <div>
+      <div class="bus-stop"><a>1) X<script>var a=1;</script><style>.c{}</style><!-- скрыто --></a></div>
+      <div class="col-xs-12"><span>10:00<template>11:00</template></span></div>
+    </div>
+    ''',
+    "",
+]
+
+ROUTE_PAGES = [
+    '''
+    <a class="bus-item bus-icon" href="/spb/bus/1">Автобус 1 <span>Вокзал - Порт</span></a>
+    <a class="bus-item tram-icon" href="/spb/tram/1">Трамвай 1 <span>Другое</span></a>
+    <a class="bus-icon bus-item" href="/spb/bus/2">Автобус 2 <span>Не совпадает</span></a>
+    <a class="bus-item  bus-icon" href="/spb/bus/3">3<span><b>Парк</b> - Центр</span><span>x</span></a>
+    ''',
+]
+
+MAP_PAGES = [
+    '''
+    <script type="text/javascript">var x = 1;</script>
+    <script>drawMap([{"name":"Не тот","lat":1.0,"long":2.0}])</script>
+    <script type="text/javascript">
+      drawMap([{"name":"Stop \\"1\\"","lat":55.1,"long":37.6},
+               {"name": "Вторая", "lat": -55, "long": 37.25},
+               {"name":"Stop \\"1\\"","lat":55.2,"long":37.7}]);
+    </script>
+    ''',
+    '<script type="text/javascript">nothing here</script>',
+    # закомментированный скрипт карты игнорируется, следующий за ним — нет
+    '''
+    <!-- <script type="text/javascript">drawMap([{"name":"Старая","lat":1.0,"long":2.0}])</script> -->
+    <script type="text/javascript"><!-- drawMap([{"name":"Новая","lat":3.0,"long":4.0}]) //--></script>
+    ''',
+    '<!-- <script type="text/javascript">drawMap([{"name":"Старая","lat":1.0,"long":2.0}])</script> -->',
+]
+
+CITY_PAGES = [
+    '''
+    <ul class="list-unstyled cities block-regions">
+      <li><a href="/r1"><span class="city-name"> Регион 1 </span></a></li>
+      <li><a href="/r2"><span class="flag"></span><span class="city-name">Регион 2</span></a></li>
+    </ul>
+    <ul class="list-unstyled cities"><li><a href="/c"><span class="city-name">Город</span></a></li></ul>
+    ''',
+]
+
+
+@pytest.fixture
+def backends():
+    return he.BeautifulSoupExtractor(), he.StreamingExtractor()
+
+
+@pytest.mark.parametrize("html", TIMETABLE_PAGES)
+def test_timetable_backends_match(backends, html):
+    reference, fast = backends
+    assert fast.timetable(html) == reference.timetable(html)
+
+
+@pytest.mark.parametrize("html", ROUTE_PAGES)
+@pytest.mark.parametrize("transport_class", ["bus-item bus-icon", "bus-icon", "bus-item tram-icon"])
+def test_route_links_backends_match(backends, html, transport_class):
+    reference, fast = backends
+    assert fast.route_links(html, transport_class) == reference.route_links(html, transport_class)
+
+
+@pytest.mark.parametrize("html", MAP_PAGES)
+def test_stop_coordinates_backends_match(backends, html):
+    reference, fast = backends
+    assert fast.stop_coordinates(html) == reference.stop_coordinates(html)
+
+
+@pytest.mark.parametrize("html", CITY_PAGES)
+@pytest.mark.parametrize("list_class", ["list-unstyled cities block-regions", "list-unstyled cities"])
+def test_city_blocks_backends_match(backends, html, list_class):
+    reference, fast = backends
+    assert fast.city_blocks(html, list_class) == reference.city_blocks(html, list_class)
+
+
+def test_timetable_content():
+    stops = he.StreamingExtractor().timetable(TIMETABLE_PAGES[0])
+    assert stops == [
+        {"stopName": "Вокзал & Площадь", "timePoint": "06:05"},
+        {"stopName": "Школа 12", "timePoint": "06:20"},
+    ]
+
+
+def test_get_extractor():
+    assert isinstance(he.get_extractor("bs4"), he.BeautifulSoupExtractor)
+    assert isinstance(he.get_extractor("streaming"), he.StreamingExtractor)
+    with pytest.raises(ValueError):
+        he.get_extractor("lxml")
+
+
+def test_compare_backends_reports_mismatches():
+    class _Broken(he.StreamingExtractor):
+        def timetable(self, html):
+            return []
+
+    pages = [("https://x/r/1/A", TIMETABLE_PAGES[0]), ("https://x/r/1/map", MAP_PAGES[0]), ("https://x/", "")]
+    assert he.compare_backends(pages) == []
+    assert he.compare_backends(pages, candidate=_Broken()) == ["https://x/r/1/A"]
+
+
+def test_streaming_skips_script_text_and_commented_scripts():
+    extractor = he.StreamingExtractor()
+
+    assert extractor.timetable(TIMETABLE_PAGES[3]) == [{"stopName": "X", "timePoint": "10:00"}]
+    assert extractor.stop_coordinates(MAP_PAGES[2]) == {"Новая": (4.0, 3.0)}
+    assert extractor.stop_coordinates(MAP_PAGES[3]) == {}
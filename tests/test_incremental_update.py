@@ -0,0 +1,124 @@
+from types import SimpleNamespace
+
+import pytest
+
+import app.database.batch_writer as batch_writer
+import app.database.graph_db_manager as gdm
+import app.database.transport_db_manager as tdm
+from app.core.context.analysis_context import AnalysisContext
+from app.database.incremental_update import route_fingerprints
+
+
+def _node(name, routes, x=37.0):
+    return {"name": name, "routeList": list(routes), "xCoordinate": x, "yCoordinate": 55.0, "isCoordinateApproximate": False}
+
+
+def _rel(start, end, route, duration=3):
+    return {"startStop": start, "endStop": end, "name": f"{start} -> {end}; route_name: {route}", "route": route, "duration": duration}
+
+
+class _Tx:
+    def __init__(self, db):
+        self.run = db.run_tx
+
+
+class _GraphDB:
+    """Хранилище в памяти, понимающее запросы менеджера и апдейтера."""
+
+    def __init__(self):
+        self.nodes, self.rels, self.fingerprints = {}, {}, {}
+        self.written_rows = 0
+
+    # --- Neo4jConnection API ---
+    def execute_write(self, func, *args, **kwargs):
+        return func(_Tx(self), *args, **kwargs)
+
+    def read_all(self, query, parameters=None):
+        return [{"route": route, **fp} for route, fp in self.fingerprints.items()]
+
+    def run(self, query, parameters=None):
+        if "DELETE r" in query:
+            for key, rel in list(self.rels.items()):
+                if rel["route"] in parameters["routes"] and rel["name"] not in parameters["keep"]:
+                    del self.rels[key]
+        elif "DETACH DELETE s" in query:
+            for name in parameters["names"]:
+                self.nodes.pop(name, None)
+            self.rels = {k: r for k, r in self.rels.items() if r["startStop"] in self.nodes and r["endStop"] in self.nodes}
+        elif "DELETE f" in query:
+            for route in parameters["routes"]:
+                self.fingerprints.pop(route, None)
+        return []
+
+    # --- transaction API ---
+    def run_tx(self, query, parameters=None):
+        rows = (parameters or {}).get("rows", [])
+        self.written_rows += len(rows)
+        for row in rows:
+            if "RouteFingerprint" in query:
+                self.fingerprints[row["route"]] = {"hash": row["hash"], "stops": row["stops"]}
+            elif "AS row" in query:
+                self.nodes[row["name"]] = dict(row)
+            elif "AS path" in query and row["startStop"] in self.nodes and row["endStop"] in self.nodes:
+                self.rels[(row["startStop"], row["endStop"], row["name"])] = dict(row)
+        return SimpleNamespace(data=lambda: [{"total": len(rows)}])
+
+
+@pytest.fixture
+def db(monkeypatch, tmp_path):
+    database = _GraphDB()
+    monkeypatch.setattr(gdm, "Neo4jConnection", lambda: database)
+    monkeypatch.setattr(batch_writer, "CHECKPOINT_DIR", str(tmp_path / "checkpoints"))
+    return database
+
+
+def _graph(routes):
+    nodes, rels = {}, []
+    for route, stops in routes.items():
+        for name in stops:
+            nodes.setdefault(name, _node(name, []))["routeList"].append(route)
+        rels.extend(_rel(a, b, route) for a, b in zip(stops, stops[1:]))
+    return list(nodes.values()), rels
+
+
+def _update(monkeypatch, db, routes):
+    nodes, rels = _graph(routes)
+    monkeypatch.setattr(tdm.BusGraphDBManager, "get_graph", lambda self: (nodes, rels))
+    manager = tdm.BusGraphDBManager(AnalysisContext(city_name="Inc"))
+    db.written_rows = 0
+    manager.update_db("Inc", incremental=True)
+    return nodes, rels
+
+
+def _expected_db(monkeypatch, tmp_path, routes):
+    fresh = _GraphDB()
+    monkeypatch.setattr(gdm, "Neo4jConnection", lambda: fresh)
+    _update(monkeypatch, fresh, routes)
+    return fresh
+
+
+def test_route_fingerprints_ignore_route_lists_of_other_routes():
+    nodes, rels = _graph({"1": ["A", "B"]})
+    before = route_fingerprints(nodes, rels)["1"]["hash"]
+    nodes, rels = _graph({"1": ["A", "B"], "2": ["B", "C"]})
+    assert route_fingerprints(nodes, rels)["1"]["hash"] == before
+
+
+def test_incremental_update_writes_only_changed_routes(monkeypatch, tmp_path, db):
+    routes = {str(i): [f"S{i}", f"S{i + 1}", f"S{i + 2}"] for i in range(20)}
+    _update(monkeypatch, db, routes)
+    full_rows = db.written_rows
+
+    _update(monkeypatch, db, routes)
+    assert db.written_rows == 0
+
+    changed = dict(routes)
+    changed["5"] = ["S5", "X", "S7"]
+    del changed["19"]
+    _update(monkeypatch, db, changed)
+    assert 0 < db.written_rows < full_rows / 4
+
+    expected = _expected_db(monkeypatch, tmp_path, changed)
+    assert db.nodes == expected.nodes
+    assert db.rels == expected.rels
+    assert db.fingerprints == expected.fingerprints
@@ -0,0 +1,181 @@
+import asyncio
+import threading
+import uuid
+
+from app.core.context.user_context import UserContext
+from app.core.services import ingest_jobs as ij
+from app.core.services.analysis_executor import AnalysisExecutor, analysis_executor
+from app.core.storage import active_datasets
+
+
+class _FakeConn:
+    def __init__(self, log, rows):
+        self.log = log
+        self.rows = rows
+
+    async def execute(self, query, *args):
+        self.log.append((" ".join(query.split()), args))
+
+    async def fetch(self, query, *args):
+        return self.rows
+
+
+class _FakePostgres:
+    def __init__(self, rows=()):
+        self.log = []
+        self.rows = list(rows)
+
+    async def get_connection(self):
+        return _FakeConn(self.log, self.rows)
+
+    async def release_connection(self, conn):
+        pass
+
+
+def _manager(postgres):
+    return ij.IngestJobManager(postgres=postgres, executor=AnalysisExecutor(1, 1), persist_interval=0)
+
+
+def test_job_reports_progress_and_registers_dataset(monkeypatch):
+    async def fake_process_async(self, ctx, on_progress=None):
+        def load():
+            on_progress("total", 3)
+            on_progress("cached", 2)
+            on_progress("failed", 1)
+            on_progress("written", 2)
+        await asyncio.to_thread(load)
+
+    monkeypatch.setattr(ij.AnalysisManager, "process_async", fake_process_async)
+    postgres = _FakePostgres()
+    manager = _manager(postgres)
+    user_id = uuid.uuid4()
+
+    async def scenario():
+        job = await manager.submit("CityX", "bus", "Bus routes — CityX", user_id=user_id)
+        snapshots = [snapshot async for snapshot in manager.subscribe(job)]
+        return job, snapshots
+
+    job, snapshots = asyncio.run(scenario())
+    try:
+        assert job.status == ij.COMPLETED
+        assert job.progress == {"total": 3, "fetched": 0, "cached": 2, "written": 2, "failed": 1}
+        assert snapshots[-1]["status"] == ij.COMPLETED
+        assert active_datasets[job.dataset_id]["user_id"] == user_id
+        assert active_datasets[job.dataset_id]["analysis_context"].graph_name == job.dataset_id
+
+        queries = [query for query, _ in postgres.log]
+        assert queries[0].startswith("INSERT INTO ingest_jobs")
+        assert any(query.startswith("INSERT INTO datasets") for query in queries)
+        statuses = [args[1] for query, args in postgres.log if query.startswith("UPDATE ingest_jobs SET status")]
+        assert statuses[0] == ij.RUNNING
+        assert statuses[-1] == ij.COMPLETED
+        assert manager.find_active("CityX", "bus", UserContext("user", user_id=user_id)) is None
+    finally:
+        active_datasets.pop(job.dataset_id, None)
+
+
+def test_failed_job_keeps_error_and_is_not_registered(monkeypatch):
+    async def failing_process_async(self, ctx, on_progress=None):
+        raise RuntimeError("parser exploded")
+
+    monkeypatch.setattr(ij.AnalysisManager, "process_async", failing_process_async)
+    manager = _manager(_FakePostgres())
+
+    async def scenario():
+        job = await manager.submit("CityY", "tram", "Tram routes — CityY", guest_token="g1")
+        assert manager.find_active("CityY", "tram", UserContext("guest", guest_token="g1")) is job
+        assert not job.owned_by(UserContext("guest", guest_token="other"))
+        await asyncio.gather(*manager._tasks)
+        return job
+
+    job = asyncio.run(scenario())
+    assert job.status == ij.FAILED
+    assert job.error == "parser exploded"
+    assert job.dataset_id not in active_datasets
+
+
+def test_ingest_does_not_take_analysis_slots(monkeypatch):
+    executors = ij.IngestJobManager().executor, analysis_executor
+    monkeypatch.setattr(analysis_executor, "max_concurrency", 1)
+    monkeypatch.setattr(analysis_executor, "max_queue", 0)
+
+    async def fake_process_async(self, ctx, on_progress=None):
+        await asyncio.sleep(0)
+
+    monkeypatch.setattr(ij.AnalysisManager, "process_async", fake_process_async)
+    manager = ij.IngestJobManager(postgres=_FakePostgres(), persist_interval=0)
+
+    async def scenario():
+        release = asyncio.Event()
+        # единственный слот анализа занят
+        analysis = asyncio.create_task(analysis_executor.run(release.wait))
+        await asyncio.sleep(0)
+        job = await manager.submit("CityW", "bus", "Bus routes — CityW")
+        await asyncio.wait_for(asyncio.gather(*manager._tasks), timeout=1)
+        release.set()
+        await analysis
+        return job
+
+    job = asyncio.run(scenario())
+    try:
+        assert executors[0] is not executors[1]
+        assert job.status == ij.COMPLETED
+    finally:
+        active_datasets.pop(job.dataset_id, None)
+
+
+def test_late_progress_write_cannot_reopen_finished_job(monkeypatch):
+    async def fake_process_async(self, ctx, on_progress=None):
+        await asyncio.to_thread(on_progress, "total", 1)
+
+    monkeypatch.setattr(ij.AnalysisManager, "process_async", fake_process_async)
+    monkeypatch.setattr(ij, "FINISHED_JOBS_KEPT", 1)
+    postgres = _FakePostgres()
+    manager = _manager(postgres)
+
+    async def scenario():
+        jobs = []
+        for city in ("CityA", "CityB"):
+            job = await manager.submit(city, "bus", f"Bus routes — {city}")
+            jobs.append(job)
+            async for _ in manager.subscribe(job):
+                pass
+        await asyncio.gather(*manager._tasks)
+        return jobs
+
+    jobs = asyncio.run(scenario())
+    try:
+        progress_updates = [
+            args for query, args in postgres.log
+            if query.startswith("UPDATE ingest_jobs SET progress")
+        ]
+        assert progress_updates
+        # фоновая запись прогресса не меняет статус и не трогает завершённую задачу
+        assert all("WHERE id = $1 AND status <> ALL($3::text[])" in query
+                   for query, _ in postgres.log if query.startswith("UPDATE ingest_jobs SET progress"))
+        assert all(set(args[2]) == set(ij.FINISHED_STATUSES) for args in progress_updates)
+        assert list(manager.jobs) == [jobs[1].id]
+        assert manager._subscribers == {}
+    finally:
+        for job in jobs:
+            active_datasets.pop(job.dataset_id, None)
+
+
+def test_restore_marks_unfinished_jobs_interrupted(monkeypatch):
+    monkeypatch.setattr(ij, "INGEST_RESUME_ON_START", False)
+    row = {
+        "id": uuid.uuid4(), "dataset_id": uuid.uuid4(), "city": "CityZ", "transport_type": "bus",
+        "name": "Bus routes — CityZ", "user_id": None, "guest_token": "g", "status": ij.RUNNING,
+        "progress": '{"total": 10, "cached": 4}', "error": None,
+    }
+    postgres = _FakePostgres(rows=[row])
+    manager = _manager(postgres)
+
+    asyncio.run(manager.restore())
+
+    query, args = postgres.log[-1]
+    assert query.startswith("UPDATE ingest_jobs")
+    assert args[0] == row["id"]
+    assert args[1] == ij.INTERRUPTED
+    assert '"cached": 4' in args[2]
+    assert manager.jobs == {}
@@ -159,3 +159,42 @@ def test_load_nodes_with_louvain_flag(monkeypatch):
 
     assert len(nodes) == 1
     _assert_base_node(nodes[0], "500", "StopE", 34.0, 63.0, expected_cluster=9)
+
+
+def test_async_prepare_metrics_runs_leiden_and_statistics(monkeypatch):
+    import asyncio
+
+    queries = []
+
+    async def fake_run(self, query, parameters=None):
+        queries.append(query)
+        return [(0.5,)]
+
+    async def fake_read_all(self, query, parameters=None):
+        if "AS source" in query:
+            return [{"source": "1", "target": "2", "weight": 1.0}]
+        return [{
+            "id": "1", "name": "A", "lon": 30.0, "lat": 60.0,
+            "leiden_community": 3, "louvain_community": None,
+            "betweenness": None, "pagerank": None,
+        }]
+
+    monkeypatch.setattr(neo4j_connection.AsyncNeo4jConnection, "__init__", lambda self: None)
+    monkeypatch.setattr(neo4j_connection.AsyncNeo4jConnection, "run", fake_run)
+    monkeypatch.setattr(neo4j_connection.AsyncNeo4jConnection, "read_all", fake_read_all)
+
+    from app.core.metric_cluster.metric_cluster_preparer import AsyncMetricClusterPreparer
+
+    ctx = AnalysisContext(metric_calculation_context=MetricCalculationContext(need_leiden_clusterization=True))
+    ctx.graph_name = "G"
+    ctx.db_graph_parameters.main_node_name = "TestNode"
+    ctx.db_graph_parameters.weight = "norm_w"
+
+    result = asyncio.run(AsyncMetricClusterPreparer(ctx).prepare_metrics())
+
+    assert "gds.leiden.write" in queries[0]
+    # статистика без повторного запуска алгоритма: модульность из результата записи
+    assert len(queries) == 1
+    assert result["nodes"] == [{"id": "1", "name": "A", "coordinates": [30.0, 60.0], "cluster_id": 3}]
+    # единственное ребро ведёт к узлу без сообщества — оно внешнее
+    assert result["statistics"] == {"modularity": 0.5, "conductance": 1.0, "coverage": 0.0}
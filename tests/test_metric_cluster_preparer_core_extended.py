@@ -36,18 +36,12 @@ class _StubDetector:
         self.detect_called = True
         self.graph_name = graph_name
 
-    def calculate_modularity(self):
-        return 0.11
-
-    def calculate_conductance(self):
-        return 0.22
-
-    def calculate_coverage(self):
-        return 0.33
+    def cluster_statistics(self, nodes, edges):
+        return {"modularity": 0.11, "conductance": 0.22, "coverage": 0.33}
 
 
 class _StubDetectorFail(_StubDetector):
-    def calculate_modularity(self):
+    def cluster_statistics(self, nodes, edges):
         raise RuntimeError("modularity exploded")
 
 
@@ -230,3 +224,125 @@ def test_prepare_metrics_louvain_only(monkeypatch):
         "conductance": 0.22,
         "coverage": 0.33,
     }
+
+
+class _StubStreamDetector(_StubDetector):
+    def __init__(self, rows):
+        super().__init__()
+        self.rows = rows
+
+    def stream_communities(self, graph_name, weight):
+        self.graph_name = graph_name
+        return self.rows
+
+    def cluster_statistics(self, nodes, edges):
+        self.nodes, self.edges = nodes, edges
+        return {"modularity": 0.4, "conductance": 0.2, "coverage": 0.8}
+
+
+class _StubStreamMetric:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def metric_stream(self, graph_name, weight):
+        return self.rows
+
+
+def test_prepare_metrics_stream_merges_rows_without_reread(monkeypatch):
+    node = {"id": "1", "name": "A", "lon": 10.0, "lat": 20.0}
+    edges = [{"source": "1", "target": "2", "weight": 1.0}]
+    stub_conn = _StubConn(edges)
+    monkeypatch.setattr(mcp_module, "Neo4jConnection", lambda: stub_conn)
+
+    detector = _StubStreamDetector([{**node, "leiden_community": 5}, {"id": "2", "name": "B", "lon": 0, "lat": 0, "leiden_community": 6}])
+    monkeypatch.setattr(mcp_module, "Leiden", lambda: detector)
+    monkeypatch.setattr(mcp_module, "Louvain", lambda: None)
+    monkeypatch.setattr(mcp_module, "Betweenness", lambda: None)
+    monkeypatch.setattr(mcp_module, "PageRank", lambda: _StubStreamMetric([{**node, "pagerank": 0.9}]))
+
+    mc = MetricCalculationContext(need_leiden_clusterization=True, need_pagerank=True)
+    result = mcp_module.MetricClusterPreparer(_make_ctx(mc), stream=True).prepare_metrics()
+
+    # узел без pagerank отбрасывается так же, как при чтении записанных свойств
+    assert result["nodes"] == [{"id": "1", "name": "A", "coordinates": [10.0, 20.0], "cluster_id": 5, "metric": 0.9}]
+    assert result["statistics"] == {"modularity": 0.4, "conductance": 0.2, "coverage": 0.8}
+    assert detector.edges == edges
+    assert [n["id"] for n in detector.nodes] == ["1", "2"]
+    # единственный дополнительный запрос — список рёбер датасета для статистики
+    assert len(stub_conn.read_queries) == 1
+    assert "AS source" in stub_conn.read_queries[0]
+    assert "leiden_community" not in stub_conn.read_queries[0]
+
+
+def test_prepare_metrics_combined_returns_records_and_statistics_per_method(monkeypatch):
+    rows = [
+        {"id": "1", "name": "A", "lon": 10.0, "lat": 20.0,
+         "leiden_community": 5, "louvain_community": 2, "betweenness": 0.5, "pagerank": 0.9},
+        {"id": "2", "name": "B", "lon": 11.0, "lat": 21.0,
+         "leiden_community": 6, "louvain_community": None, "betweenness": 0.1, "pagerank": 0.2},
+    ]
+    stub_conn = _StubConn(rows)
+    monkeypatch.setattr(mcp_module, "Neo4jConnection", lambda: stub_conn)
+
+    leiden, louvain, metric = _StubDetector(), _StubDetector(), _StubMetric()
+    monkeypatch.setattr(mcp_module, "Leiden", lambda: leiden)
+    monkeypatch.setattr(mcp_module, "Louvain", lambda: louvain)
+    monkeypatch.setattr(mcp_module, "Betweenness", lambda: metric)
+    monkeypatch.setattr(mcp_module, "PageRank", lambda: metric)
+
+    mc = MetricCalculationContext(
+        need_leiden_clusterization=True,
+        need_louvain_clusterization=True,
+        need_betweenness=True,
+        need_pagerank=True,
+        combined=True,
+    )
+    result = mcp_module.MetricClusterPreparer(_make_ctx(mc), stream=False).prepare_metrics()
+
+    # узлы и рёбра читаются по одному разу на оба метода, узел без louvain пропускается
+    assert len(stub_conn.read_queries) == 2
+    assert result["nodes"] == [{
+        "id": "1", "name": "A", "coordinates": [10.0, 20.0],
+        "leiden_community": 5, "louvain_community": 2, "betweenness": 0.5, "pagerank": 0.9,
+    }]
+    expected = {"modularity": 0.11, "conductance": 0.22, "coverage": 0.33}
+    assert result["statistics"] == {"leiden": expected, "louvain": expected}
+    assert leiden.graph_name == louvain.graph_name == "TestGraph"
+
+
+def test_betweenness_is_sampled_for_target_latency(monkeypatch):
+    from app.core.metric_cluster.betweenness_sampling import BetweennessSampling
+    from app.core.services.projection_manager import projection_manager
+
+    node = {"id": "1", "name": "A", "lon": 10.0, "lat": 20.0, "betweenness": 3.0}
+    monkeypatch.setattr(mcp_module, "Neo4jConnection", lambda: _StubConn([node]))
+    sampling = BetweennessSampling(seconds_per_source_node=1e-6)
+    monkeypatch.setattr(mcp_module, "betweenness_sampling", sampling)
+    created = {}
+
+    def make_betweenness(**kwargs):
+        created.update(kwargs)
+        return _StubMetric()
+
+    monkeypatch.setattr(mcp_module, "Betweenness", make_betweenness)
+    projection_manager.register("TestGraph", "v", 0, node_count=10_000)
+
+    mc = MetricCalculationContext(need_betweenness=True, betweenness_target_ms=1_000)
+    result = mcp_module.MetricClusterPreparer(_make_ctx(mc), stream=False).prepare_metrics()
+
+    assert created == {"sampling_size": 100, "sampling_seed": 42}
+    assert result["accuracy"] == {
+        "mode": "sampled", "sampling_size": 100, "sampling_seed": 42, "node_count": 10_000,
+    }
+    assert result["nodes"][0]["metric"] == 3.0
+    # время прогона уточняет оценку для следующих запросов
+    assert sampling.seconds_per_source_node != 1e-6
+
+
+def test_betweenness_is_exact_by_default(monkeypatch):
+    monkeypatch.setattr(mcp_module, "Betweenness", lambda: _StubMetric())
+
+    mc = MetricCalculationContext(need_betweenness=True)
+    result = mcp_module.MetricClusterPreparer(_make_ctx(mc), stream=False).prepare_metrics()
+
+    assert result["accuracy"]["mode"] == "exact"
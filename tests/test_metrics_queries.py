@@ -52,3 +52,49 @@ def test_metric_calculate_query_contains_expected_parts(monkeypatch, MetricClass
     assert re.search(rf"relationshipweightproperty\s*:\s*'{weight_prop}'", q_lower)
     # Проверяем, куда пишется результат
     assert re.search(rf"writeproperty\s*:\s*'{expected_writeprop}'", q_lower)
+
+
+@pytest.mark.parametrize("AlgorithmClass,stream_method,expected_call,expected_column", [
+    (Leiden, "stream_communities", "leiden", "leiden_community"),
+    (Louvain, "stream_communities", "louvain", "louvain_community"),
+    (PageRank, "metric_stream", "pagerank", "pagerank"),
+    (Betweenness, "metric_stream", "betweenness", "betweenness"),
+])
+def test_stream_query_returns_nodes_without_writing(monkeypatch, AlgorithmClass, stream_method, expected_call, expected_column):
+    captured = {}
+
+    def fake_read_all(self, query, parameters=None):
+        captured['query'] = query
+        return []
+
+    monkeypatch.setattr(neo4j_connection.Neo4jConnection, 'read_all', fake_read_all)
+
+    getattr(AlgorithmClass(), stream_method)("GraphS", "w")
+
+    q_lower = captured['query'].lower()
+
+    assert re.search(rf"call\s+gds\.{expected_call}\.stream", q_lower)
+    assert "writeproperty" not in q_lower
+    assert "n.location.longitude as lon" in q_lower
+    assert re.search(rf"as\s+{expected_column}\b", q_lower)
+
+
+def test_betweenness_sampling_config_in_write_and_stream_queries(monkeypatch):
+    captured = []
+
+    def fake_run(self, query, parameters=None):
+        captured.append(query)
+        return []
+
+    monkeypatch.setattr(neo4j_connection.Neo4jConnection, 'run', fake_run)
+    monkeypatch.setattr(neo4j_connection.Neo4jConnection, 'read_all', fake_run)
+
+    metric = Betweenness(sampling_size=128, sampling_seed=42)
+    metric.metric_calculate("GraphB", "w")
+    metric.metric_stream("GraphB", "w")
+    Betweenness().metric_calculate("GraphB", "w")
+
+    for query in captured[:2]:
+        assert re.search(r"samplingsize\s*:\s*128", query.lower())
+        assert re.search(r"samplingseed\s*:\s*42", query.lower())
+    assert "sampling" not in captured[2].lower()
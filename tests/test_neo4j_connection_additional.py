@@ -49,3 +49,104 @@ def test_execute_write_happy_path():
 
         result = conn.execute_write(tx_func, 5)
         assert result == ([{"x": 1}], 5)
+
+
+def test_shared_driver_is_reused_and_not_closed_by_connections():
+    import app.database.neo4j_connection as neo4j_module
+
+    driver = _DummyDriver(value={"x": 1})
+    with patch("app.database.neo4j_connection.GraphDatabase.driver", return_value=driver) as factory:
+        try:
+            assert neo4j_module.init_driver() is driver
+            assert neo4j_module.init_driver() is driver
+            first, second = Neo4jConnection(), Neo4jConnection()
+            assert first._Neo4jConnection__driver is driver
+            assert second._Neo4jConnection__driver is driver
+            factory.assert_called_once()
+            assert factory.call_args.kwargs["max_connection_pool_size"] == neo4j_module.NEO4J_MAX_POOL_SIZE
+
+            first.close()
+            assert not hasattr(driver, "closed")
+        finally:
+            neo4j_module.close_driver()
+    assert driver.closed is True
+    assert neo4j_module.get_driver() is None
+
+
+def test_pool_stats_track_sessions_in_use():
+    import app.database.neo4j_connection as neo4j_module
+
+    seen = {}
+    with patch("app.database.neo4j_connection.GraphDatabase.driver", return_value=_DummyDriver(value={"x": 1})):
+        conn = Neo4jConnection()
+        before = neo4j_module.pool_stats()
+
+        def tx_func(tx):
+            seen.update(neo4j_module.pool_stats())
+            raise RuntimeError("fail")
+
+        with pytest.raises(RuntimeError):
+            conn.execute_write(tx_func)
+
+    after = neo4j_module.pool_stats()
+    assert seen["sessions_in_use"] == before["sessions_in_use"] + 1
+    assert after["sessions_in_use"] == before["sessions_in_use"]
+    assert after["sessions_opened"] == before["sessions_opened"] + 1
+    assert after["session_errors"] == before["session_errors"] + 1
+    assert after["shared"] is False
+
+
+def test_async_connection_runs_queries_through_async_driver():
+    import asyncio
+
+    class _AsyncResult:
+        def __init__(self, records):
+            self.records = records
+
+        def __aiter__(self):
+            self._it = iter(self.records)
+            return self
+
+        async def __anext__(self):
+            try:
+                return next(self._it)
+            except StopIteration:
+                raise StopAsyncIteration
+
+    class _AsyncSession:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, exc_type, exc, tb):
+            return False
+
+        async def run(self, query, parameters=None):
+            return _AsyncResult([{"q": query, "p": parameters}])
+
+        async def execute_read(self, fn):
+            return await fn(self)
+
+    class _AsyncDriver:
+        def session(self):
+            return _AsyncSession()
+
+        async def close(self):
+            self.closed = True
+
+    from app.database.neo4j_connection import AsyncNeo4jConnection
+
+    driver = _AsyncDriver()
+
+    async def scenario():
+        conn = AsyncNeo4jConnection()
+        rows = await conn.read_all("RETURN $x", {"x": 1})
+        records = await conn.run("RETURN 2")
+        await conn.close()
+        return rows, records
+
+    with patch("app.database.neo4j_connection.AsyncGraphDatabase.driver", return_value=driver):
+        rows, records = asyncio.run(scenario())
+
+    assert rows == [{"q": "RETURN $x", "p": {"x": 1}}]
+    assert records == [{"q": "RETURN 2", "p": None}]
+    assert driver.closed is True
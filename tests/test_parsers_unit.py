@@ -1,10 +1,14 @@
 import json
+import math
 import os
+import shutil
 import time
 
 import pytest
 
 import app.core.services.parsers as parsers
+from app.core.services.route_store import route_file_name
+from app.core.services.stop_registry import STOP_TOLERANCE
 
 
 class DummyParser(parsers.AbstractTransportGraphParser):
@@ -25,6 +29,12 @@ class _Resp:
             raise parsers.requests.RequestException("boom")
 
 
+@pytest.fixture(autouse=True)
+def _fast_rate_limiter(monkeypatch):
+    # Keep unit tests from waiting on the production request budget
+    monkeypatch.setattr(parsers, "rate_limiter", parsers.AdaptiveRateLimiter(rate=1000, burst=1000))
+
+
 @pytest.fixture
 def parser(tmp_path, monkeypatch):
     # Avoid hitting network for city URLs and cache paths
@@ -35,7 +45,7 @@ def parser(tmp_path, monkeypatch):
 
 
 def test_get_route_path_sanitizes(parser):
-    path = parser._AbstractTransportGraphParser__get_route_path("Маршрут 1/2")
+    path = parser.route_store.route_path("Маршрут 1/2")
     assert os.path.basename(path) == "Маршрут_1_2.json"
 
 
@@ -167,7 +177,7 @@ def test_parse_uses_cached_routes(monkeypatch, tmp_path):
     with open(routes_index, "w", encoding="utf-8") as f:
         json.dump([["R1", "Route One", "/r1"]], f)
 
-    route_path = parser._AbstractTransportGraphParser__get_route_path("R1")
+    route_path = parser.route_store.route_path("R1")
     with open(route_path, "w", encoding="utf-8") as f:
         json.dump({
             "nodes": {
@@ -184,4 +194,192 @@ def test_parse_uses_cached_routes(monkeypatch, tmp_path):
     nodes, rels = parser.parse(use_cache=True)
     assert nodes is not None and rels is not None
     assert "S" in nodes
-    assert rels[0]["duration"] == 10
\ No newline at end of file
+    assert rels[0]["duration"] == 10
+
+def _route_pages(url, timeout=10):
+    """Fake site: two stops per direction and a map page with coordinates."""
+    if url.endswith("/map"):
+        script = (
+            '<script type="text/javascript">drawMap(['
+            '{"name":"North","lat":55.0,"long":37.0},'
+            '{"name":"South","lat":55.1,"long":37.1}])</script>'
+        )
+        return _Resp(f"<html><body>{script}</body></html>")
+    first, second = ("North", "South") if url.endswith("/A") else ("South", "North")
+    html = f'''
+    <div class="bus-stop"><a>1) {first}</a></div>
+    <div class="col-xs-12"><span>10:00</span></div>
+    <div class="bus-stop"><a>2) {second}</a></div>
+    <div class="col-xs-12"><span>10:15K</span></div>
+    '''
+    return _Resp(html)
+
+
+def _parse_fresh(monkeypatch, base_dir, **parse_kwargs):
+    monkeypatch.setattr(parsers, "BASE_CACHE_DIR", str(base_dir))
+    parser = DummyParser("Demo")
+    with open(os.path.join(parser.city_dir, "routes_index.json"), "w", encoding="utf-8") as f:
+        json.dump([["R1", "One", "/r1"], ["R2", "Two", "/r2"], ["R1", "One", "/r1"]], f)
+    return parser, parser.parse(use_cache=True, **parse_kwargs)
+
+
+def test_parse_concurrent_matches_sequential(monkeypatch, tmp_path):
+    monkeypatch.setattr(parsers.AbstractTransportGraphParser, "_AbstractTransportGraphParser__get_city_url", lambda self: "/dummy")
+    monkeypatch.setattr(parsers.session, "get", _route_pages)
+    monkeypatch.setattr(time, "sleep", lambda *a, **kw: None)
+
+    seq_parser, (seq_nodes, seq_rels) = _parse_fresh(monkeypatch, tmp_path / "seq", workers=1)
+    par_parser, (par_nodes, par_rels) = _parse_fresh(monkeypatch, tmp_path / "par", workers=4)
+
+    assert par_nodes == seq_nodes
+    assert par_rels == seq_rels
+    assert sorted(os.listdir(par_parser.city_dir)) == sorted(os.listdir(seq_parser.city_dir))
+
+
+def test_parse_with_process_pool_matches_sequential(monkeypatch, tmp_path):
+    monkeypatch.setattr(parsers.AbstractTransportGraphParser, "_AbstractTransportGraphParser__get_city_url", lambda self: "/dummy")
+    monkeypatch.setattr(parsers.session, "get", _route_pages)
+
+    _, (seq_nodes, seq_rels) = _parse_fresh(monkeypatch, tmp_path / "seq", workers=1)
+    _, (pool_nodes, pool_rels) = _parse_fresh(monkeypatch, tmp_path / "pool", parse_workers=2)
+
+    assert pool_nodes == seq_nodes
+    assert pool_rels == seq_rels
+
+
+def test_sequential_parse_skips_map_without_timetable(monkeypatch, tmp_path):
+    monkeypatch.setattr(parsers.AbstractTransportGraphParser, "_AbstractTransportGraphParser__get_city_url", lambda self: "/dummy")
+    requested = []
+
+    def empty_timetable(url, timeout=10):
+        requested.append(url)
+        return _Resp("<html></html>")
+
+    monkeypatch.setattr(parsers.session, "get", empty_timetable)
+
+    _, (nodes, rels) = _parse_fresh(monkeypatch, tmp_path, workers=1)
+
+    assert nodes == {} and rels == []
+    assert requested and not any(url.endswith("/map") for url in requested)
+
+
+def test_extract_route_pages_stage():
+    timetable, coords = parsers.extract_route_pages(
+        "streaming",
+        _route_pages("/r1/A").text,
+        None,
+        _route_pages("/r1/map").text,
+    )
+    assert [row["stopName"] for row in timetable] == ["North", "South"]
+    assert coords == {"North": (37.0, 55.0), "South": (37.1, 55.1)}
+    assert parsers.extract_route_pages("streaming", None, None, None) == (None, {})
+
+
+def test_parse_with_sqlite_store_matches_json(monkeypatch, tmp_path):
+    monkeypatch.setattr(parsers.AbstractTransportGraphParser, "_AbstractTransportGraphParser__get_city_url", lambda self: "/dummy")
+    monkeypatch.setattr(parsers.session, "get", _route_pages)
+
+    _, (json_nodes, json_rels) = _parse_fresh(monkeypatch, tmp_path / "json", workers=1)
+
+    monkeypatch.setattr(parsers, "BASE_CACHE_DIR", str(tmp_path / "sqlite"))
+    parser = DummyParser("Demo", route_store="sqlite")
+    parser.route_store.save_index([["R1", "One", "/r1"], ["R2", "Two", "/r2"], ["R1", "One", "/r1"]])
+    nodes, rels = parser.parse(use_cache=True)
+    assert nodes == json_nodes
+    assert rels == json_rels
+
+    # второй прогон читает маршруты из SQLite без обращений к сайту
+    monkeypatch.setattr(parsers.session, "get", lambda *a, **kw: pytest.fail("network"))
+    cached = DummyParser("Demo", route_store="sqlite")
+    assert cached.parse(use_cache=True) == (json_nodes, json_rels)
+
+
+def test_merge_route_data_resolves_stops_city_wide(parser):
+    def node(name, x, route):
+        return {"name": name, "routeList": [route], "xCoordinate": x, "yCoordinate": 55.0, "isCoordinateApproximate": False}
+
+    merge = parser._AbstractTransportGraphParser__merge_route_data
+    merge({
+        "nodes": {"A": node("A", 37.0, "1"), "B": node("B", 37.1, "1")},
+        "relationships": [{"startStop": "A", "endStop": "B", "name": "A -> B; route_name: 1", "route": "1", "duration": 3}],
+        "timetable": [{"stopName": "A"}, {"stopName": "B"}],
+    })
+    # "A 1" в маршруте 2 — та же остановка A, а B здесь — другая остановка с тем же названием
+    merge({
+        "nodes": {"B": node("B", 39.0, "2"), "A 1": node("A 1", 37.001, "2")},
+        "relationships": [{"startStop": "B", "endStop": "A 1", "name": "B -> A 1; route_name: 2", "route": "2", "duration": 4}],
+        "timetable": [{"stopName": "B"}, {"stopName": "A"}],
+    })
+
+    assert sorted(parser.nodes) == ["A", "B", "B 1"]
+    assert parser.nodes["A"]["routeList"] == ["1", "2"]
+    assert parser.nodes["B 1"]["name"] == "B 1"
+    assert parser.relationships[1] == {
+        "startStop": "B 1", "endStop": "A", "name": "B 1 -> A; route_name: 2", "route": "2", "duration": 4,
+    }
+
+
+CACHED_ROUTES_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache", "routes_data")
+
+
+def test_cached_city_splits_only_distant_same_name_stops(monkeypatch, tmp_path):
+    # Реальный кеш Бирска: при объединении по названию узлов 220, реестр
+    # остановок даёт 223 — три одноимённые остановки в разных местах больше
+    # не сливаются в один узел: «Николаевка» (~30 км), «По требованию»
+    # (~100 км) и «Калинники» (~0.6 км, дальше допуска). Связей столько же.
+    city_dir = tmp_path / "cache" / "routes_data" / "бирск" / "bus"
+    city_dir.mkdir(parents=True)
+    for file_name in os.listdir(os.path.join(CACHED_ROUTES_DIR, "бирск", "bus")):
+        # copyfile выставляет новое mtime, поэтому кеш не считается устаревшим
+        shutil.copyfile(os.path.join(CACHED_ROUTES_DIR, "бирск", "bus", file_name), city_dir / file_name)
+    monkeypatch.setattr(parsers.AbstractTransportGraphParser, "_AbstractTransportGraphParser__get_city_url", lambda self: "/dummy")
+    monkeypatch.setattr(parsers, "BASE_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(parsers.session, "get", lambda *a, **kw: pytest.fail("network"))
+
+    nodes, rels = DummyParser("Бирск").parse(use_cache=True)
+
+    routes = json.loads((city_dir / "routes_index.json").read_text(encoding="utf-8"))
+    by_name = set()
+    for route_number, _, _ in routes:
+        data = json.loads((city_dir / route_file_name(route_number)).read_text(encoding="utf-8"))
+        by_name.update(data["nodes"])
+    assert len(by_name) == 220
+    assert len(nodes) == 223
+    assert len(rels) == 666
+    assert set(nodes) - by_name == {"Калинники 1", "Николаевка 1", "По требованию 1"}
+    for extra in set(nodes) - by_name:
+        original = nodes[extra.rsplit(" ", 1)[0]]
+        distance = math.dist(
+            (original["xCoordinate"], original["yCoordinate"]),
+            (nodes[extra]["xCoordinate"], nodes[extra]["yCoordinate"]),
+        )
+        assert distance > STOP_TOLERANCE
+
+
+def test_parse_streams_routes_to_callback(monkeypatch, tmp_path):
+    monkeypatch.setattr(parsers.AbstractTransportGraphParser, "_AbstractTransportGraphParser__get_city_url", lambda self: "/dummy")
+    monkeypatch.setattr(parsers.session, "get", _route_pages)
+
+    chunks = []
+    _, (nodes, rels) = _parse_fresh(monkeypatch, tmp_path, on_route=lambda n, r: chunks.append((n, r)))
+
+    assert len(chunks) == 3
+    assert [rel for _, chunk in chunks for rel in chunk] == rels
+    latest = {node["name"]: node for chunk, _ in chunks for node in chunk}
+    assert latest == nodes
+
+
+def test_parse_reports_progress(monkeypatch, tmp_path):
+    monkeypatch.setattr(parsers.AbstractTransportGraphParser, "_AbstractTransportGraphParser__get_city_url", lambda self: "/dummy")
+    monkeypatch.setattr(parsers.session, "get", _route_pages)
+
+    for workers in (1, 4):
+        events = []
+        _parse_fresh(monkeypatch, tmp_path / str(workers), workers=workers,
+                     on_progress=lambda event, count: events.append((event, count)))
+        # R1 встречается в индексе дважды: второй раз берётся из кеша
+        assert events == [("total", 3), ("fetched", 1), ("fetched", 1), ("cached", 1)]
+
+    events = []
+    _parse_fresh(monkeypatch, tmp_path / "1", on_progress=lambda event, count: events.append((event, count)))
+    assert events == [("total", 3), ("cached", 1), ("cached", 1), ("cached", 1)]
@@ -0,0 +1,138 @@
+import asyncio
+
+from app.core.services.projection_manager import DROP_QUERY, SIZE_QUERY, ProjectionManager
+
+
+class _FakeConnection:
+    def __init__(self, sizes):
+        self.sizes = sizes
+        self.dropped = []
+
+    def run(self, query, parameters=None):
+        if query == DROP_QUERY:
+            self.dropped.append(parameters["name"])
+            return []
+        if query == SIZE_QUERY:
+            return [{"graphName": parameters["name"], "sizeInBytes": self.sizes[parameters["name"]]}]
+        return []
+
+
+class _FakeAsyncConnection(_FakeConnection):
+    async def run(self, query, parameters=None):
+        return _FakeConnection.run(self, query, parameters)
+
+
+def test_ensure_projects_once_per_version():
+    manager = ProjectionManager(budget_bytes=1000)
+    conn = _FakeConnection({"a": 10})
+    builds = []
+
+    def build():
+        builds.append(1)
+        return True
+
+    assert manager.ensure(conn, "a", "v1", build) is True
+    assert manager.ensure(conn, "a", "v1", build) is False
+    assert manager.ensure(conn, "a", "v2", build) is True
+    assert len(builds) == 2
+    assert manager.stats()["reused"] == 1
+
+
+def test_failed_build_is_not_registered():
+    manager = ProjectionManager(budget_bytes=1000)
+    conn = _FakeConnection({})
+
+    manager.ensure(conn, "a", "v1", lambda: False)
+
+    assert manager.stats()["projections"] == 0
+
+
+def test_least_recently_used_projection_is_evicted_over_budget():
+    manager = ProjectionManager(budget_bytes=100)
+    conn = _FakeConnection({"a": 40, "b": 40, "c": 40})
+
+    manager.ensure(conn, "a", "v", lambda: True)
+    manager.ensure(conn, "b", "v", lambda: True)
+    manager.ensure(conn, "a", "v", lambda: True)  # "b" становится самой старой
+    conn.dropped.clear()
+    manager.ensure(conn, "c", "v", lambda: True)
+
+    assert conn.dropped == ["c", "b"]
+    stats = manager.stats()
+    assert stats["projections"] == 2
+    assert stats["size_bytes"] == 80
+    assert stats["evicted"] == 1
+
+
+def test_adopted_catalog_projections_are_evicted_first():
+    manager = ProjectionManager(budget_bytes=100)
+    conn = _FakeAsyncConnection({"new": 60})
+    manager.adopt([{"graphName": "old", "sizeInBytes": 50}])
+
+    async def build():
+        return True
+
+    asyncio.run(manager.ensure_async(conn, "new", "v", build))
+
+    assert conn.dropped == ["new", "old"]
+    assert manager.stats()["projections"] == 1
+
+
+def test_drop_forgets_projection():
+    manager = ProjectionManager(budget_bytes=100)
+    conn = _FakeConnection({"a": 10})
+    manager.ensure(conn, "a", "v", lambda: True)
+
+    asyncio.run(manager.drop_async(_FakeAsyncConnection({}), "a"))
+
+    assert manager.stats()["projections"] == 0
+    assert manager.ensure(conn, "a", "v", lambda: True) is True
+
+
+def test_node_count_is_taken_from_catalog():
+    manager = ProjectionManager(budget_bytes=1000)
+    conn = _FakeConnection({"a": 10})
+    conn.run = lambda query, parameters=None: (
+        [{"graphName": "a", "sizeInBytes": 10, "nodeCount": 321}] if query == SIZE_QUERY else []
+    )
+
+    manager.ensure(conn, "a", "v", lambda: True)
+
+    assert manager.node_count("a") == 321
+    assert manager.node_count("missing") is None
+
+
+def test_rebuild_waits_for_stream_readers():
+    manager = ProjectionManager(budget_bytes=1000)
+    conn = _FakeAsyncConnection({"a": 10})
+
+    async def build():
+        return True
+
+    async def main():
+        await manager.ensure_async(conn, "a", "v1", build)
+        conn.dropped.clear()
+        manager.add_reader("a")
+        rebuild = asyncio.create_task(manager.ensure_async(conn, "a", "v2", build))
+        await asyncio.sleep(0.1)
+        dropped_while_read = list(conn.dropped)
+        manager.release_reader("a")
+        await rebuild
+        return dropped_while_read
+
+    assert asyncio.run(main()) == []
+    assert conn.dropped == ["a"]
+
+
+def test_eviction_skips_projection_with_readers():
+    manager = ProjectionManager(budget_bytes=100)
+    conn = _FakeConnection({"a": 40, "b": 40, "c": 40})
+
+    manager.ensure(conn, "a", "v", lambda: True)
+    manager.ensure(conn, "b", "v", lambda: True)
+    manager.add_reader("a")
+    conn.dropped.clear()
+    manager.ensure(conn, "c", "v", lambda: True)
+
+    assert conn.dropped == ["c", "b"]
+    manager.release_reader("a")
@@ -0,0 +1,125 @@
+import time
+
+import pytest
+
+import app.core.services.parsers as parsers
+from app.core.services import rate_limiter as rl
+
+
+class _Resp:
+    def __init__(self, status=200, from_cache=False, headers=None):
+        self.status_code = status
+        self.from_cache = from_cache
+        self.headers = headers or {}
+        self.text = ""
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise parsers.requests.HTTPError(f"status {self.status_code}")
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    calls = []
+    monkeypatch.setattr(rl.time, "sleep", lambda s: calls.append(s))
+    return calls
+
+
+def test_acquire_uses_burst_then_waits(sleeps):
+    limiter = rl.AdaptiveRateLimiter(rate=2.0, burst=2)
+    limiter.acquire()
+    limiter.acquire()
+    assert sleeps == []
+
+    limiter.acquire()
+    assert len(sleeps) == 1
+    assert sleeps[0] == pytest.approx(0.5, abs=0.05)
+    assert limiter.stats()["throttled_seconds"] == pytest.approx(sleeps[0])
+
+
+def test_acquire_respects_deadline(sleeps):
+    limiter = rl.AdaptiveRateLimiter(rate=0.5, burst=1)
+    limiter.acquire()
+    with pytest.raises(rl.DeadlineExceeded):
+        limiter.acquire(deadline=time.monotonic() + 0.1)
+    assert limiter.stats()["deadline_exceeded"] == 1
+    assert sleeps == []
+
+
+def test_aimd_adjusts_rate():
+    limiter = rl.AdaptiveRateLimiter(rate=2.0, min_rate=0.5, max_rate=2.1, increase_step=0.05)
+    limiter.on_success()
+    limiter.on_success()
+    assert limiter.rate == pytest.approx(2.1)
+    limiter.on_backoff()
+    assert limiter.rate == pytest.approx(1.05)
+    limiter.on_backoff()
+    limiter.on_backoff()
+    assert limiter.rate == 0.5
+    assert limiter.stats()["backoffs"] == 3
+
+
+def test_parse_retry_after():
+    assert rl.parse_retry_after(_Resp(headers={"Retry-After": "3"})) == 3.0
+    assert rl.parse_retry_after(_Resp(headers={"Retry-After": "Wed, 21 Oct 2015"})) is None
+    assert rl.parse_retry_after(_Resp()) is None
+
+
+def test_backoff_delay_caps_retry_after():
+    limiter = rl.AdaptiveRateLimiter(rate=1.0)
+    assert limiter.backoff_delay(0, retry_after=3.0) == 3.0
+    assert limiter.backoff_delay(0, retry_after=86400.0) == rl.MAX_BACKOFF_SECONDS
+    assert limiter.backoff_delay(10) == rl.MAX_BACKOFF_SECONDS
+
+
+def test_fetch_page_without_deadline_caps_server_retry_after(monkeypatch, sleeps):
+    limiter = rl.AdaptiveRateLimiter(rate=2.0, burst=10)
+    monkeypatch.setattr(parsers, "rate_limiter", limiter)
+    monkeypatch.setattr(parsers, "_is_cached", lambda url: False)
+    responses = iter([_Resp(429, headers={"Retry-After": "3600"}), _Resp(200)])
+    monkeypatch.setattr(parsers.session, "get", lambda url, timeout=10: next(responses))
+
+    assert parsers.fetch_page("https://example.org/page").status_code == 200
+    assert sleeps[-1] == rl.MAX_BACKOFF_SECONDS
+
+
+def test_fetch_page_skips_budget_for_cache_hits(monkeypatch, sleeps):
+    limiter = rl.AdaptiveRateLimiter(rate=1.0, burst=1)
+    monkeypatch.setattr(parsers, "rate_limiter", limiter)
+    monkeypatch.setattr(parsers, "_is_cached", lambda url: True)
+    monkeypatch.setattr(parsers.session, "get", lambda url, timeout=10: _Resp(from_cache=True))
+
+    for _ in range(5):
+        parsers.fetch_page("https://example.org/page")
+
+    stats = limiter.stats()
+    assert stats["cache_hits"] == 5
+    assert stats["network_requests"] == 0
+    assert sleeps == []
+
+
+def test_fetch_page_backs_off_and_retries(monkeypatch, sleeps):
+    limiter = rl.AdaptiveRateLimiter(rate=2.0, burst=10, min_rate=0.1)
+    monkeypatch.setattr(parsers, "rate_limiter", limiter)
+    monkeypatch.setattr(parsers, "_is_cached", lambda url: False)
+    responses = iter([_Resp(429, headers={"Retry-After": "1"}), _Resp(503), _Resp(200)])
+    monkeypatch.setattr(parsers.session, "get", lambda url, timeout=10: next(responses))
+
+    response = parsers.fetch_page("https://example.org/page")
+
+    assert response.status_code == 200
+    stats = limiter.stats()
+    assert stats["network_requests"] == 3
+    assert stats["backoffs"] == 2
+    assert sleeps[0] == 1.0
+
+
+def test_fetch_page_gives_up_at_deadline(monkeypatch, sleeps):
+    limiter = rl.AdaptiveRateLimiter(rate=1.0, burst=10)
+    monkeypatch.setattr(parsers, "rate_limiter", limiter)
+    monkeypatch.setattr(parsers, "_is_cached", lambda url: False)
+    monkeypatch.setattr(parsers.session, "get", lambda url, timeout=10: _Resp(503))
+
+    with pytest.raises(parsers.requests.RequestException):
+        parsers.fetch_page("https://example.org/page", deadline=time.monotonic() + 0.5)
+    assert limiter.stats()["deadline_exceeded"] == 1
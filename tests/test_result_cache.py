@@ -0,0 +1,160 @@
+from app.core.context.analysis_context import AnalysisContext
+from app.core.context.metric_calculation_context import MetricCalculationContext
+from app.core.services import analysis_manager as am_mod
+from app.core.services import analysis_preparer as ap_mod
+from app.core.metric_cluster import metric_cluster_preparer as mcp_mod
+from app.core.services.result_cache import AnalysisResultCache, result_cache
+from app.database import graph_db_manager as gdm
+
+
+def make_ctx(**flags):
+    ctx = AnalysisContext(metric_calculation_context=MetricCalculationContext(**flags))
+    ctx.graph_name = "dataset-1"
+    ctx.db_graph_parameters.main_node_name = "CityBusStop"
+    ctx.db_graph_parameters.main_rels_name = "CityBusRouteSegment"
+    ctx.db_graph_parameters.weight = "duration"
+    ctx.need_prepare_data = True
+    return ctx
+
+
+def test_key_depends_on_parameters_and_graph_version():
+    cache = AnalysisResultCache(max_entries=4)
+    leiden = cache.key_for(make_ctx(need_leiden_clusterization=True))
+    assert cache.key_for(make_ctx(need_leiden_clusterization=True)) == leiden
+    assert cache.key_for(make_ctx(need_louvain_clusterization=True)) != leiden
+
+    cache.put(leiden, "CityBusStop", {"nodes": [1]})
+    assert cache.get(leiden) == {"nodes": [1]}
+
+    cache.bump_graph_version("CityBusStop")
+    assert cache.get(leiden) is None
+    assert cache.key_for(make_ctx(need_leiden_clusterization=True)) != leiden
+
+
+def test_lru_evicts_oldest_entry():
+    cache = AnalysisResultCache(max_entries=2)
+    cache.put("a", "L", {"v": 1})
+    cache.put("b", "L", {"v": 2})
+    cache.get("a")
+    cache.put("c", "L", {"v": 3})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"v": 1}
+    assert cache.stats()["entries"] == 2
+
+
+def test_sqlite_tier_survives_restart_and_sees_other_process_bumps(tmp_path):
+    db_path = str(tmp_path / "results.sqlite")
+    first = AnalysisResultCache(max_entries=4, db_path=db_path)
+    key = first.key_for(make_ctx(need_pagerank=True))
+    first.put(key, "CityBusStop", {"nodes": [{"id": "1", "metric": 0.5}]})
+
+    second = AnalysisResultCache(max_entries=4, db_path=db_path)
+    assert second.key_for(make_ctx(need_pagerank=True)) == key
+    assert second.get(key) == {"nodes": [{"id": "1", "metric": 0.5}]}
+    assert second.stats()["disk_hits"] == 1
+
+    second.bump_graph_version("CityBusStop")
+    assert first.key_for(make_ctx(need_pagerank=True)) != key
+    assert first.get(key) == {"nodes": [{"id": "1", "metric": 0.5}]}  # память первого процесса
+    assert AnalysisResultCache(max_entries=4, db_path=db_path).get(key) is None
+
+
+def test_process_returns_cached_result_until_graph_changes(monkeypatch):
+    calls = {"prepare": 0, "metrics": 0}
+
+    def fake_prepare(self):
+        calls["prepare"] += 1
+
+    def fake_prepare_metrics(self):
+        calls["metrics"] += 1
+        return {"nodes": [calls["metrics"]]}
+
+    monkeypatch.setattr(ap_mod.AnalysisPreparer, "prepare", fake_prepare)
+    monkeypatch.setattr(mcp_mod.MetricClusterPreparer, "prepare_metrics", fake_prepare_metrics)
+
+    manager = am_mod.AnalysisManager()
+    assert manager.process(make_ctx(need_pagerank=True)) == {"nodes": [1]}
+    assert manager.process(make_ctx(need_pagerank=True)) == {"nodes": [1]}
+    assert calls == {"prepare": 1, "metrics": 1}
+
+    result_cache.bump_graph_version("CityBusStop")
+    assert manager.process(make_ctx(need_pagerank=True)) == {"nodes": [2]}
+    assert calls == {"prepare": 2, "metrics": 2}
+
+
+def test_update_db_bumps_graph_version(monkeypatch):
+    bumped = []
+    monkeypatch.setattr(gdm.result_cache, "bump_graph_version", bumped.append)
+
+    class _Manager(gdm.OneTypeNodeDBManager):
+        def __init__(self):
+            self.on_progress = None
+        def get_graph(self):
+            return [], []
+        def write_graph(self, nodes, relationships, relationship_workers=1):
+            pass
+        get_weight = node_geometry_identity = get_bd_all_node_query_graph = lambda self: None
+        get_bd_all_rels_query_graph = get_node_name = get_rels_name = lambda self: None
+        get_constraint_list = create_node_query = create_relationships_query = lambda self: None
+        get_main_rels_name = lambda self: "Rel"
+
+        def get_main_node_name(self):
+            return "Label"
+
+    _Manager().update_db("City", streaming=False, fresh_load=False, incremental=False)
+    assert bumped == ["Label"]
+
+
+def test_cached_result_skips_full_analysis_queue(monkeypatch):
+    import asyncio
+
+    from app.api.v1.endpoints import analysis as analysis_endpoint
+    from app.core.services.analysis_executor import AnalysisExecutor
+
+    executor = AnalysisExecutor(max_concurrency=1, max_queue=0)
+    monkeypatch.setattr(analysis_endpoint, "analysis_executor", executor)
+    ctx = make_ctx(need_pagerank=True)
+    result_cache.put(result_cache.key_for(ctx), "CityBusStop", {"nodes": ["cached"]})
+
+    async def scenario():
+        release = asyncio.Event()
+        busy = asyncio.create_task(executor.run(release.wait))
+        await asyncio.sleep(0)
+        try:
+            return await analysis_endpoint._run_analysis(ctx)
+        finally:
+            release.set()
+            await busy
+
+    assert asyncio.run(scenario()) == {"nodes": ["cached"]}
+    assert executor.rejected == 0
+
+
+def test_update_db_takes_write_lock_after_parsing():
+    from contextlib import contextmanager
+
+    events = []
+
+    class _Manager(gdm.OneTypeNodeDBManager):
+        def __init__(self):
+            self.on_progress = None
+        def get_graph(self):
+            events.append("parse")
+            return [], []
+        def write_graph(self, nodes, relationships, relationship_workers=1):
+            events.append("write")
+        get_weight = node_geometry_identity = get_bd_all_node_query_graph = lambda self: None
+        get_bd_all_rels_query_graph = get_node_name = get_rels_name = lambda self: None
+        get_constraint_list = create_node_query = create_relationships_query = lambda self: None
+        get_main_rels_name = get_main_node_name = lambda self: "Label"
+
+    @contextmanager
+    def write_lock():
+        events.append("lock")
+        yield
+        events.append("unlock")
+
+    manager = _Manager()
+    manager.write_lock = write_lock
+    manager.update_db("City", streaming=False, fresh_load=False, incremental=False)
+    assert events == ["parse", "lock", "write", "unlock"]
@@ -0,0 +1,91 @@
+import json
+import os
+import time
+
+import pytest
+
+from app.core.services import route_store as rs
+
+
+ROUTE = {
+    "routeNumber": "R 1",
+    "routeUrl": "/r1",
+    "nodes": {"S": {"name": "S", "routeList": ["R 1"]}},
+    "relationships": [],
+    "timestamp": "now",
+}
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def store(request, tmp_path):
+    city_dir = tmp_path / "cache" / "routes_data" / "demo" / "bus"
+    return rs.get_route_store(
+        "demo", "bus", 30, str(tmp_path / "cache"), str(city_dir), backend=request.param
+    )
+
+
+def test_route_roundtrip(store):
+    assert store.load_route("R 1") is None
+    assert store.is_route_fresh("R 1") is False
+
+    store.save_route("R 1", ROUTE)
+    assert store.is_route_fresh("R 1") is True
+    assert store.load_route("R 1") == ROUTE
+
+
+def test_index_roundtrip(store):
+    assert store.load_index() is None
+    store.save_index([["R 1", "One", "/r1"]])
+    assert store.load_index() == [["R 1", "One", "/r1"]]
+
+
+def test_sqlite_store_expires_old_records(tmp_path):
+    store = rs.SQLiteRouteStore("demo", "bus", 30, str(tmp_path / "routes.sqlite"))
+    store._save("R 1", ROUTE, fetched_at=time.time() - 32 * 24 * 3600)
+    assert store.is_route_fresh("R 1") is False
+    assert store.load_route("R 1") is None
+
+
+def test_unknown_backend_raises(tmp_path):
+    with pytest.raises(ValueError):
+        rs.get_route_store("demo", "bus", 30, str(tmp_path), str(tmp_path), backend="csv")
+
+
+def test_migrate_json_cache(tmp_path):
+    base = tmp_path / "cache"
+    json_store = rs.JsonRouteStore("demo", "bus", 30, str(base / "routes_data" / "demo" / "bus"))
+    json_store.save_index([["R 1", "One", "/r1"]])
+    json_store.save_route("R 1", ROUTE)
+    old = time.time() - 40 * 24 * 3600
+    stale = dict(ROUTE, routeNumber="R2")
+    json_store.save_route("R2", stale)
+    os.utime(json_store.route_path("R2"), (old, old))
+
+    db_path = str(tmp_path / "routes.sqlite")
+    assert rs.migrate_json_cache(str(base), db_path) == 2
+
+    store = rs.SQLiteRouteStore("demo", "bus", 30, db_path)
+    assert store.load_index() == [["R 1", "One", "/r1"]]
+    assert store.load_route("R 1") == ROUTE
+    # mtime переносится в fetched_at, устаревшие записи остаются устаревшими
+    assert store.load_route("R2") is None
+
+
+def test_write_json_atomic_leaves_no_temp_files(tmp_path):
+    path = tmp_path / "data.json"
+    rs.write_json_atomic(str(path), {"a": 1})
+    rs.write_json_atomic(str(path), {"a": 2})
+    assert json.loads(path.read_text(encoding="utf-8")) == {"a": 2}
+    assert os.listdir(tmp_path) == ["data.json"]
+
+
+def test_route_store_version_tracks_missing_routes(tmp_path):
+    store = rs.get_route_store("demo", "bus", 30, str(tmp_path), str(tmp_path / "demo"), backend="json")
+    assert store.version(["1"]) is None
+
+    store.save_index([["1", "One", "/1"], ["2", "Two", "/2"]])
+    missing = store.version(["1", "2"])
+    assert missing is not None
+
+    store.save_route("2", {"nodes": {}, "relationships": []})
+    assert store.version(["1", "2"])[0] != missing[0]
@@ -0,0 +1,84 @@
+from app.core.services.stop_registry import StopRegistry, route_stop_name
+
+
+def test_resolve_merges_nearby_stops_with_same_name():
+    registry = StopRegistry(tolerance=0.005)
+    assert registry.resolve("A", 37.0, 55.0) == "A"
+    assert registry.resolve("A", 37.004, 55.0) == "A"
+    # соседняя ячейка сетки
+    assert registry.resolve("A", 36.9999, 54.9999) == "A"
+    assert len(registry) == 1
+
+
+def test_resolve_splits_distant_stops_and_keeps_names_apart():
+    registry = StopRegistry(tolerance=0.005)
+    assert registry.resolve("A", 37.0, 55.0) == "A"
+    assert registry.resolve("A", 38.0, 55.0) == "A 1"
+    assert registry.resolve("B", 37.0, 55.0) == "B"
+    assert registry.resolve("A", 38.001, 55.0) == "A 1"
+    assert registry.resolve("A 1", 40.0, 55.0) == "A 1 1"
+
+
+def test_resolve_picks_nearest_candidate():
+    registry = StopRegistry(tolerance=0.005)
+    registry.resolve("A", 37.0, 55.0)
+    registry.resolve("A", 37.008, 55.0)
+    assert registry.resolve("A", 37.005, 55.0) == "A 1"
+
+
+def test_resolve_approximate_and_unknown_coordinates_by_name():
+    registry = StopRegistry()
+    assert registry.resolve("A", None, None) == "A"
+    assert registry.resolve("A", None, 55.0) == "A"
+    assert registry.resolve("A", 40.0, 50.0, is_approximate=True) == "A"
+    assert registry.resolve("B", 40.0, 50.0, is_approximate=True) == "B"
+    assert registry.resolve("B", 40.001, 50.0) == "B"
+
+
+def test_approximate_stop_takes_name_of_later_exact_place():
+    registry = StopRegistry()
+    assert registry.resolve("A", 37.0, 55.0, is_approximate=True) == "A"
+    # точная координата из другого маршрута не даёт второго узла
+    assert registry.resolve("A", 37.3, 55.0) == "A"
+    assert registry.resolve("A", 37.3, 55.001, is_approximate=True) == "A"
+    assert len(registry) == 1
+
+
+def test_seed_makes_names_independent_of_route_order():
+    stops = [("A", 37.0, 55.0, False), ("A", 38.0, 55.0, False), ("A", 38.0, 55.0, True), ("B", 37.0, 55.0, False)]
+    forward, backward = StopRegistry(), StopRegistry()
+    forward.seed(stops)
+    backward.seed(reversed(stops))
+    for name, x, y, _ in stops:
+        assert forward.resolve(name, x, y) == backward.resolve(name, x, y)
+    assert forward.resolve("A", 38.0, 55.0) == "A 1"
+
+
+def test_saved_registry_keeps_names_for_known_places(tmp_path):
+    path = tmp_path / "stops.json"
+    registry = StopRegistry()
+    registry.resolve("A", 38.0, 55.0)
+    registry.resolve("A", 37.0, 55.0)
+    registry.resolve("C", None, None)
+    registry.save(path)
+
+    loaded = StopRegistry.load(path)
+    assert loaded.resolve("A", 37.0, 55.0) == "A 1"
+    assert loaded.resolve("A", 38.0, 55.0) == "A"
+    assert loaded.resolve("A", 39.0, 55.0) == "A 2"
+    assert loaded.resolve("C", 40.0, 55.0) == "C"
+    assert len(loaded) == 4
+
+
+def test_load_ignores_missing_or_broken_file(tmp_path):
+    assert len(StopRegistry.load(tmp_path / "missing.json")) == 0
+    (tmp_path / "broken.json").write_text("{", encoding="utf-8")
+    assert len(StopRegistry.load(tmp_path / "broken.json")) == 0
+
+
+def test_route_stop_name_strips_route_local_suffix():
+    stops = {"A", "Школа 5"}
+    assert route_stop_name("A 1", stops) == "A"
+    assert route_stop_name("Школа 5", stops) == "Школа 5"
+    assert route_stop_name("Школа 5 1", stops) == "Школа 5"
+    assert route_stop_name("C 2", stops) == "C 2"
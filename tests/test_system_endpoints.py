@@ -0,0 +1,24 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.v1.endpoints import system
+from app.core.context.user_context import UserContext
+
+
+def _client(user_type):
+    app = FastAPI()
+    app.include_router(system.router, prefix="/v1/system")
+    app.dependency_overrides[system.user_manager.get_context] = lambda: UserContext(type=user_type)
+    return TestClient(app)
+
+
+def test_system_endpoints_reject_anonymous():
+    client = _client("anonymous")
+    for path in ("neo4j-pool", "analysis-queue", "ingest-queue", "result-cache", "projections", "coordination"):
+        assert client.get(f"/v1/system/{path}").status_code == 401
+
+
+def test_system_endpoints_allow_token_holders():
+    for user_type in ("user", "guest"):
+        response = _client(user_type).get("/v1/system/result-cache")
+        assert response.status_code == 200